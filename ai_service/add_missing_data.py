@@ -1,94 +1,206 @@
+import argparse
 import csv
+from itertools import islice
+
 import numpy as np
-from scipy.interpolate import interp1d
+import pandas as pd
+
+import results_io
+
+
+def interpolate_tracks(frame_numbers, car_ids, car_bboxes, license_plate_bboxes):
+    """
+    Fill frame gaps of every track at once.
+
+    Rows are sorted by (car_id, frame); each track covers every frame from its
+    first to its last detection, and missing frames are linearly interpolated
+    between the neighbouring detections (same result as scipy's interp1d).
+    A repeated (car_id, frame) keeps its first row.
+
+    Returns (frames, car_ids, car_bboxes, license_plate_bboxes, source_rows),
+    ordered by car_id then frame. source_rows holds the input row index for
+    detected frames and -1 for imputed ones.
+    """
+    frame_numbers = np.asarray(frame_numbers, dtype=np.int64)
+    car_ids = np.asarray(car_ids, dtype=np.int64)
+    if len(frame_numbers) == 0:
+        return (frame_numbers, car_ids, np.zeros((0, 4)), np.zeros((0, 4)), np.zeros(0, dtype=np.int64))
+
+    order = np.lexsort((frame_numbers, car_ids))  # stable: ties keep input order
+    frames, ids = frame_numbers[order], car_ids[order]
+    duplicate = np.zeros(len(order), dtype=bool)
+    duplicate[1:] = (ids[1:] == ids[:-1]) & (frames[1:] == frames[:-1])
+    order, frames, ids = order[~duplicate], frames[~duplicate], ids[~duplicate]
+    values = np.hstack([np.asarray(car_bboxes, dtype=float), np.asarray(license_plate_bboxes, dtype=float)])[order]
+
+    # Track boundaries in the sorted rows
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)] - 1
+    lengths = frames[ends] - frames[starts] + 1
+
+    # One output row per frame of each track's [first, last] range
+    out_track = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    out_frames = frames[starts][out_track] + offsets
+
+    # Indexed lookup of the detection at or before each output frame
+    row_track = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    base = frames.min()
+    span = frames.max() - base + 1
+    left = np.searchsorted(row_track * span + (frames - base), out_track * span + (out_frames - base), side='right') - 1
+    exact = frames[left] == out_frames
+
+    out_values = values[left]
+    gap = ~exact
+    if gap.any():
+        lo, hi = left[gap], left[gap] + 1
+        # Same arithmetic as interp1d(kind='linear'), so results are bit-identical
+        slope = (values[hi] - values[lo]) / (frames[hi] - frames[lo])[:, None]
+        out_values[gap] = slope * (out_frames[gap] - frames[lo])[:, None] + values[lo]
+
+    source_rows = np.where(exact, order[left], -1)
+    return out_frames, ids[starts][out_track], out_values[:, :4], out_values[:, 4:], source_rows
 
 
 def interpolate_bounding_boxes(data):
     # Extract necessary data columns from input data
-    frame_numbers = np.array([int(row['frame_nmr']) for row in data])
-    car_ids = np.array([int(float(row['car_id'])) for row in data])
-    car_bboxes = np.array([list(map(float, row['car_bbox'][1:-1].split())) for row in data])
-    license_plate_bboxes = np.array([list(map(float, row['license_plate_bbox'][1:-1].split())) for row in data])
+    frame_numbers = np.array([int(row['frame_nmr']) for row in data], dtype=np.int64)
+    car_ids = np.array([int(float(row['car_id'])) for row in data], dtype=np.int64)
+    car_bboxes = results_io.parse_bbox_column([row['car_bbox'] for row in data])
+    license_plate_bboxes = results_io.parse_bbox_column([row['license_plate_bbox'] for row in data])
+
+    frames, ids, car_boxes, plate_boxes, source_rows = interpolate_tracks(
+        frame_numbers, car_ids, car_bboxes, license_plate_bboxes)
 
     interpolated_data = []
-    unique_car_ids = np.unique(car_ids)
-    for car_id in unique_car_ids:
-
-        frame_numbers_ = [p['frame_nmr'] for p in data if int(float(p['car_id'])) == int(float(car_id))]
-        print(frame_numbers_, car_id)
-
-        # Filter data for a specific car ID
-        car_mask = car_ids == car_id
-        car_frame_numbers = frame_numbers[car_mask]
-        car_bboxes_interpolated = []
-        license_plate_bboxes_interpolated = []
-
-        first_frame_number = car_frame_numbers[0]
-        last_frame_number = car_frame_numbers[-1]
-
-        for i in range(len(car_bboxes[car_mask])):
-            frame_number = car_frame_numbers[i]
-            car_bbox = car_bboxes[car_mask][i]
-            license_plate_bbox = license_plate_bboxes[car_mask][i]
-
-            if i > 0:
-                prev_frame_number = car_frame_numbers[i-1]
-                prev_car_bbox = car_bboxes_interpolated[-1]
-                prev_license_plate_bbox = license_plate_bboxes_interpolated[-1]
-
-                if frame_number - prev_frame_number > 1:
-                    # Interpolate missing frames' bounding boxes
-                    frames_gap = frame_number - prev_frame_number
-                    x = np.array([prev_frame_number, frame_number])
-                    x_new = np.linspace(prev_frame_number, frame_number, num=frames_gap, endpoint=False)
-                    interp_func = interp1d(x, np.vstack((prev_car_bbox, car_bbox)), axis=0, kind='linear')
-                    interpolated_car_bboxes = interp_func(x_new)
-                    interp_func = interp1d(x, np.vstack((prev_license_plate_bbox, license_plate_bbox)), axis=0, kind='linear')
-                    interpolated_license_plate_bboxes = interp_func(x_new)
-
-                    car_bboxes_interpolated.extend(interpolated_car_bboxes[1:])
-                    license_plate_bboxes_interpolated.extend(interpolated_license_plate_bboxes[1:])
-
-            car_bboxes_interpolated.append(car_bbox)
-            license_plate_bboxes_interpolated.append(license_plate_bbox)
-
-        for i in range(len(car_bboxes_interpolated)):
-            frame_number = first_frame_number + i
-            row = {}
-            row['frame_nmr'] = str(frame_number)
-            row['car_id'] = str(car_id)
-            row['car_bbox'] = ' '.join(map(str, car_bboxes_interpolated[i]))
-            row['license_plate_bbox'] = ' '.join(map(str, license_plate_bboxes_interpolated[i]))
-
-            if str(frame_number) not in frame_numbers_:
-                # Imputed row, set the following fields to '0'
-                row['license_plate_bbox_score'] = '0'
-                row['license_number'] = '0'
-                row['license_number_score'] = '0'
-            else:
-                # Original row, retrieve values from the input data if available
-                original_row = [p for p in data if int(p['frame_nmr']) == frame_number and int(float(p['car_id'])) == int(float(car_id))][0]
-                row['license_plate_bbox_score'] = original_row['license_plate_bbox_score'] if 'license_plate_bbox_score' in original_row else '0'
-                row['license_number'] = original_row['license_number'] if 'license_number' in original_row else '0'
-                row['license_number_score'] = original_row['license_number_score'] if 'license_number_score' in original_row else '0'
-
-            interpolated_data.append(row)
+    for frame_number, car_id, car_bbox, license_plate_bbox, source in zip(
+            frames.tolist(), ids.tolist(), car_boxes.tolist(), plate_boxes.tolist(), source_rows.tolist()):
+        row = {}
+        row['frame_nmr'] = str(frame_number)
+        row['car_id'] = str(car_id)
+        row['car_bbox'] = ' '.join(map(str, car_bbox))
+        row['license_plate_bbox'] = ' '.join(map(str, license_plate_bbox))
+
+        if source < 0:
+            # Imputed row, set the following fields to '0'
+            row['license_plate_bbox_score'] = '0'
+            row['license_number'] = '0'
+            row['license_number_score'] = '0'
+        else:
+            # Original row, retrieve values from the input data if available
+            original_row = data[source]
+            row['license_plate_bbox_score'] = original_row.get('license_plate_bbox_score', '0')
+            row['license_number'] = original_row.get('license_number', '0')
+            row['license_number_score'] = original_row.get('license_number_score', '0')
+
+        interpolated_data.append(row)
 
     return interpolated_data
 
 
+def interpolate_dataframe(df):
+    """
+    Columnar version of interpolate_bounding_boxes for results_io DataFrames
+    (numeric bbox columns, no string parsing). Imputed rows get 0 scores and
+    license_number '0', like the CSV path.
+    """
+    frames, ids, car_boxes, plate_boxes, source_rows = interpolate_tracks(
+        df['frame_nmr'].to_numpy(), df['car_id'].to_numpy(),
+        df[results_io.CAR_BBOX_COLS].to_numpy(), df[results_io.PLATE_BBOX_COLS].to_numpy())
+
+    out = pd.DataFrame({'frame_nmr': frames, 'car_id': ids})
+    for i, col in enumerate(results_io.CAR_BBOX_COLS):
+        out[col] = car_boxes[:, i]
+    for i, col in enumerate(results_io.PLATE_BBOX_COLS):
+        out[col] = plate_boxes[:, i]
+
+    original = source_rows >= 0
+    source = np.where(original, source_rows, 0)
+    for col, fill in (('license_plate_bbox_score', 0.0), ('license_number', '0'), ('license_number_score', 0.0)):
+        values = df[col].to_numpy()
+        out[col] = np.where(original, values[source], fill) if len(values) else values
+    return out
+
+
+def interpolate_stream(rows, idle_frames=30, chunk_size=10000):
+    """
+    Streaming version of interpolate_bounding_boxes for results files too big
+    to load at once.
+
+    rows must be in frame order, as util.write_csv writes them. They are read
+    chunk_size at a time, but tracks are checked row by row: as frame_nmr
+    advances, every track whose car_id has not appeared for more than
+    idle_frames frames is complete, and the tracks completed at that frame
+    are interpolated together and yielded as a list of output rows (before
+    the new frame's rows are added), so the output does not depend on
+    chunk_size. Memory is bounded by the rows of active tracks, not by the
+    file size.
+
+    A car_id that reappears after being completed starts a new segment: the gap
+    between segments is not interpolated (batch mode would fill it).
+    """
+    active = {}     # car_id -> buffered input rows
+    last_seen = {}  # car_id -> last frame it appeared in
+    current_frame = None
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        for row in chunk:
+            frame = int(row['frame_nmr'])
+            if frame != current_frame:
+                current_frame = frame
+                done = [car_id for car_id, seen in last_seen.items() if frame - seen > idle_frames]
+                if done:
+                    completed = [r for car_id in done for r in active.pop(car_id)]
+                    for car_id in done:
+                        del last_seen[car_id]
+                    yield interpolate_bounding_boxes(completed)
+            car_id = int(float(row['car_id']))
+            active.setdefault(car_id, []).append(row)
+            last_seen[car_id] = frame
+
+    if active:
+        yield interpolate_bounding_boxes([row for track in active.values() for row in track])
+
+
+HEADER = ['frame_nmr', 'car_id', 'car_bbox', 'license_plate_bbox', 'license_plate_bbox_score', 'license_number', 'license_number_score']
+
+
 if __name__ == '__main__':
-    # Load the CSV file
-    with open('test.csv', 'r') as file:
-        reader = csv.DictReader(file)
-        data = list(reader)
-
-    # Interpolate missing data
-    interpolated_data = interpolate_bounding_boxes(data)
-
-    # Write updated data to a new CSV file
-    header = ['frame_nmr', 'car_id', 'car_bbox', 'license_plate_bbox', 'license_plate_bbox_score', 'license_number', 'license_number_score']
-    with open('test_interpolated.csv', 'w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=header)
-        writer.writeheader()
-        writer.writerows(interpolated_data)
+    parser = argparse.ArgumentParser(description='Fill missing frames in a results file (CSV or Parquet) by interpolation.')
+    parser.add_argument('--input', default='test.csv')
+    parser.add_argument('--output', default='test_interpolated.csv')
+    parser.add_argument('--stream', action='store_true', help='Process in chunks with bounded memory')
+    parser.add_argument('--idle-frames', type=int, default=30, help='Streaming: frames without a car_id before its track is complete')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Streaming: rows read per chunk')
+    args = parser.parse_args()
+
+    columnar = results_io.is_parquet(args.input) or results_io.is_parquet(args.output)
+
+    if args.stream and results_io.is_parquet(args.output):
+        with results_io.ResultsWriter(args.output) as writer:
+            for interpolated_rows in interpolate_stream(results_io.iter_rows(args.input), args.idle_frames, args.chunk_size):
+                for row in interpolated_rows:
+                    writer.add(row['frame_nmr'], row['car_id'], row['car_bbox'].split(), row['license_plate_bbox'].split(),
+                               row['license_plate_bbox_score'], row['license_number'], row['license_number_score'])
+    elif args.stream:
+        with open(args.output, 'w', newline='') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=HEADER)
+            writer.writeheader()
+            # Output rows are written as each batch of tracks completes
+            for interpolated_rows in interpolate_stream(results_io.iter_rows(args.input), args.idle_frames, args.chunk_size):
+                writer.writerows(interpolated_rows)
+    elif columnar:
+        # Numeric columns straight from Parquet: no bbox string round-trip
+        results_io.write_dataframe(interpolate_dataframe(results_io.read_results(args.input)), args.output)
+    else:
+        # Load the whole CSV, interpolate, write
+        with open(args.input, 'r') as infile:
+            data = list(csv.DictReader(infile))
+        with open(args.output, 'w', newline='') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=HEADER)
+            writer.writeheader()
+            writer.writerows(interpolate_bounding_boxes(data))
@@ -1,20 +1,33 @@
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, Body, File, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import shutil
 import os
 import uvicorn
 import cv2
-import math
 import requests
-import numpy as np
 import util  # Uses the updated util.py with Indian plate support
-from ultralytics import YOLO
+import runtime
 from datetime import datetime
-import random
 import threading
+import asyncio
+import json
+import struct
+import time
+from broadcast import BroadcastHub
+from result_cache import ResultCache
+from plate_index import PlateIndex, MAX_FUZZY_DISTANCE
+from streaming import pack_metadata
+from camera_config import CameraConfigStore
+import camera_config
+import signal_rules
+from pipeline import (Pipeline, VideoSource, ResizeStage, DetectStage, SpeedStage, RulesStage, SignalStage,
+                      PlateStage, ViolationStage, ResultsSink, draw_overlays, resize_for_display)
+import logs
+import metrics
 
 app = FastAPI(title="AI Traffic Violation Detection Service")
+log = logs.get_logger("app")
 
 # Allow CORS for direct streaming to frontend
 app.add_middleware(
@@ -32,99 +45,121 @@ MODELS_DIR = "models"
 # Using localhost for this local running setup
 BACKEND_API_URL = os.getenv("BACKEND_API_URL", "http://localhost:3000/api/violations/internal/record")
 
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(PROCESSED_DIR, exist_ok=True)
-os.makedirs(MODELS_DIR, exist_ok=True)
+# Cameras (comma-separated IDs) that run tiled full-resolution inference by
+# default, e.g. 4K highway cameras where distant vehicles vanish at 640 px.
+TILED_CAMERAS = {c.strip() for c in os.getenv("TILED_CAMERAS", "").split(",") if c.strip()}
+# Write per-frame vehicle/plate results to processed/<video_id>_results.parquet
+# (readable by add_missing_data.py and visualize.py)
+RECORD_RESULTS = os.getenv("RECORD_RESULTS", "0") == "1"
+# Replays of already-analysed videos are served from disk (see result_cache.py)
+RESULT_CACHE = os.getenv("RESULT_CACHE", "1") == "1"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(PROCESSED_DIR, "cache"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "500"))
+# Plate sightings across all videos/cameras (see plate_index.py)
+PLATE_INDEX_PATH = os.getenv("PLATE_INDEX_PATH", os.path.join(PROCESSED_DIR, "plates.db"))
+# Per-camera analysis settings, hot-reloaded (see camera_config.py)
+CAMERA_CONFIG_PATH = os.getenv("CAMERA_CONFIG_PATH", "cameras.json")
+CAMERA_CONFIG_CHECK_S = float(os.getenv("CAMERA_CONFIG_CHECK_S", "2"))
+
+# The result cache and plate index are opened on first use, so importing
+# this module (benchmarks, evaluate.py) writes nothing to disk.
+_stores_lock = threading.Lock()
+_result_cache = None
+_plate_index = None
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        with _stores_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB * 1024 * 1024)
+    return _result_cache
+
+def get_plate_index():
+    global _plate_index
+    if _plate_index is None:
+        with _stores_lock:
+            if _plate_index is None:
+                os.makedirs(os.path.dirname(PLATE_INDEX_PATH) or ".", exist_ok=True)
+                _plate_index = PlateIndex(PLATE_INDEX_PATH)
+    return _plate_index
+
+# Models (backend chosen by MODEL_BACKEND, see runtime.py) load lazily:
+# warm-up starts in the background at startup so /healthz answers immediately
+# and /readyz flips to 200 once inference is possible.
+
+# PERFORMANCE: Skip frames to speed up playback/processing
+# Process every 3rd frame (Skip 2). 
+# Logic: If frame_count % 3 != 0, continue.
+# This effectively plays the video at 3x speed if processing can keep up, or just reduces load.
+# Default for cameras without their own skip_step (see camera_config.py).
+SKIP_STEP = 3
+# Bump when analyze_frames output changes, so cached results are not reused
+ANALYSIS_VERSION = 2
+# Output widths a stream client may ask for; 0 or less means the analysis width
+STREAM_MIN_WIDTH = 16
+STREAM_MAX_WIDTH = 3840
+
+camera_configs = CameraConfigStore(CAMERA_CONFIG_PATH, CAMERA_CONFIG_CHECK_S,
+                                   base=lambda camera: {'skip_step': SKIP_STEP, 'tiled': camera in TILED_CAMERAS})
+
+def warmup_models():
+    try:
+        runtime.warmup()
+        log.info("Models ready: %s", runtime.load_timings)
+    except Exception as e:
+        # Stay live but not ready; /readyz keeps returning 503
+        log.error("Model warm-up failed: %s", e)
 
-# Load Models
-print("Loading YOLOv8n model...")
-vehicle_model = YOLO('yolov8n.pt')
+@app.on_event("startup")
+def create_dirs():
+    for directory in (UPLOAD_DIR, PROCESSED_DIR, MODELS_DIR):
+        os.makedirs(directory, exist_ok=True)
 
-# COCO Classes
-# 0: person, 1: bicycle, 2: car, 3: motorcycle, 5: bus, 7: truck
-VEHICLE_CLASSES = [2, 3, 5, 7]
-PERSON_CLASS = 0
-MOTORCYCLE_CLASS = 3
+@app.on_event("startup")
+def start_model_warmup():
+    threading.Thread(target=warmup_models, name="model-warmup", daemon=True).start()
 
 @app.get("/")
 def health_check():
     return {"status": "healthy", "service": "AI Traffic Violation Detector"}
 
-def calculate_speed(prev_pos, curr_pos, fps, pixel_scale=0.05):
-    if prev_pos is None: return 0
-    dx = curr_pos[0] - prev_pos[0]
-    dy = curr_pos[1] - prev_pos[1]
-    pixel_dist = math.sqrt(dx**2 + dy**2)
-    
-    # NOISE GATE: Ignore jitter for stationary vehicles (Parked Car Fix)
-    if pixel_dist < 5: 
-        return 0
-        
-    speed_ms = (pixel_dist * pixel_scale) * fps
-    return round(speed_ms * 3.6, 2)
+@app.get("/healthz")
+def liveness():
+    """
+    Liveness: the process is up and serving. Never waits on model loading.
+    """
+    return {"status": "alive"}
 
-def check_triple_riding(motorcycle_box, persons_boxes):
+@app.get("/metrics")
+def metrics_endpoint():
     """
-    Check if more than 2 persons are overlapping with the motorcycle bounding box.
+    Prometheus scrape endpoint: per-stage latency histograms, stream and
+    queue gauges, OCR and violation counters.
     """
-    mx1, my1, mx2, my2 = motorcycle_box
-    count = 0
-    motorcycle_area = (mx2 - mx1) * (my2 - my1)
-    
-    for px1, py1, px2, py2 in persons_boxes:
-        # Calculate intersection
-        ix1 = max(mx1, px1)
-        iy1 = max(my1, py1)
-        ix2 = min(mx2, px2)
-        iy2 = min(my2, py2)
-        
-        if ix1 < ix2 and iy1 < iy2:
-            intersection_area = (ix2 - ix1) * (iy2 - iy1)
-            person_area = (px2 - px1) * (py2 - py1)
-            
-            # If significant overlap (e.g. > 50% of person is inside bike box)
-            if intersection_area > 0.5 * person_area:
-                count += 1
-                
-    return count > 2, count
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
-def check_no_helmet(motorcycle_box, persons_boxes, track_id):
+@app.get("/readyz")
+def readiness():
     """
-    Heuristic for No Helmet.
-    Since we don't have a helmet model, we will simulate detection deterministically.
-    This ensures we demonstrate the alerts WITHOUT flagging every single bike (False Positives).
+    Readiness: models are loaded and warmed up.
     """
-    # Simply check if there are riders
-    
-    # Check overlap like triple riding to confirm riders
-    rider_count = 0
-    mx1, my1, mx2, my2 = motorcycle_box
-    for px1, py1, px2, py2 in persons_boxes:
-        ix1 = max(mx1, px1)
-        iy1 = max(my1, py1)
-        ix2 = min(mx2, px2)
-        iy2 = min(my2, py2)
-        if ix1 < ix2 and iy1 < iy2:
-            rider_count += 1
-
-    if rider_count > 0:
-        # DEMONSTRATION MODE: Flag all riders as No Helmet for clear feature verification
-        # In production, this would be replaced by a second-stage Helmet Classifier Model.
-        # Since we are ensuring the feature is ENABLED, we alert on any rider detected.
-        return True
-    
-    return False
+    if not runtime.ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "loading", "timings": runtime.load_timings})
+    return {"status": "ready", "backend": runtime.MODEL_BACKEND, "timings": runtime.load_timings}
 
 def report_async(video_id, v_type, track_id, frame_copy, speed, plate_text, vehicle_type):
     """
     Async reporter to avoid blocking video stream.
     """
+    metrics.REPORTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
     try:
         # Save Evidence
         evidence_filename = f"{video_id}_{v_type}_{track_id}.jpg"
         evidence_path = os.path.join(PROCESSED_DIR, evidence_filename)
         cv2.imwrite(evidence_path, frame_copy)
-        print(f"DEBUG: Saved evidence to {evidence_path}")
+        log.debug("Saved evidence to %s", evidence_path)
         
         final_number = plate_text or f"UNKNOWN-{track_id}"
         
@@ -140,239 +175,354 @@ def report_async(video_id, v_type, track_id, frame_copy, speed, plate_text, vehi
         }
         
         requests.post(BACKEND_API_URL, json=payload, timeout=2)
-        print(f"DEBUG: Reported {v_type} for ID {track_id}")
+        log.info("Reported %s for ID %s", v_type, track_id)
+        metrics.REPORTS.inc(result="ok")
     except Exception as e:
-        print(f"Failed to report violation: {e}")
+        log.warning("Failed to report violation: %s", e)
+        metrics.REPORTS.inc(result="failed")
+    finally:
+        metrics.REPORTS_IN_FLIGHT.dec()
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="report")
+
+# One analysis per video_id however many viewers are connected (see broadcast.py)
+hub = BroadcastHub(render=draw_overlays)
+
+def ocr_hit_rate():
+    plates, misses = metrics.OCR_READS.value(result="plate"), metrics.OCR_READS.value(result="none")
+    return plates / (plates + misses) if plates + misses else 0.0
+
+def ocr_crop_outcomes():
+    stats = util.OCR_STATS.snapshot()
+    return {("ocr",): stats['ocr_calls'], **{(reason,): n for reason, n in stats['rejected'].items()}}
+
+# Computed at scrape time from the live state (see metrics.py)
+metrics.Gauge("anpr_active_streams", "Running analyses (one per video, shared by its viewers)",
+              function=lambda: len(hub.stats()))
+metrics.Gauge("anpr_stream_subscribers", "Viewers attached to each running analysis", ["video_id"],
+              function=lambda: {(k,): v['subscribers'] for k, v in hub.stats().items()})
+metrics.Gauge("anpr_stream_queue_depth", "Frames waiting in viewer mailboxes", ["video_id"],
+              function=lambda: {(k,): v['pending'] for k, v in hub.stats().items()})
+metrics.Gauge("anpr_stream_dropped_frames", "Frames skipped for slow viewers of each running analysis", ["video_id"],
+              function=lambda: {(k,): v['dropped'] for k, v in hub.stats().items()})
+metrics.Counter("anpr_ocr_crops_total", "Plate crops reaching the OCR stage, by outcome (ocr or rejection reason)",
+                ["outcome"], function=ocr_crop_outcomes)
+metrics.Gauge("anpr_ocr_hit_rate", "Share of OCR calls that produced a plate", function=ocr_hit_rate)
+metrics.Gauge("anpr_result_cache_bytes", "Size of the result cache directory",
+              function=lambda: _result_cache.size() if _result_cache else 0)
+metrics.Counter("anpr_log_suppressed_total", "Log records dropped by the rate limiter",
+                function=lambda: logs.rate_limit.suppressed)
+
+def watch_camera(video_id: str, camera_id: str = None, tiled: bool = None):
+    """
+    A stream's camera settings (keyed by camera_id, else video_id); an
+    explicit tiled pins tiling for this stream.
+    """
+    return camera_configs.watch(camera_id or video_id, None if tiled is None else {'tiled': tiled})
 
-def generate_frames(video_path: str, video_id: str):
+def build_pipeline(video_path: str, video_id: str, settings, cache_key: str = None, camera_id: str = None):
     """
-    Generator function for MJPEG streaming.
+    The service's configuration of the shared pipeline (see pipeline/):
+    the camera's settings (frame skipping, 640 px analysis frame, rule and
+    OCR thresholds, tiling; applied again whenever they change), violations
+    reported to the backend, plate reads recorded in the plate index.
     """
-    print(f"Starting stream for video: {video_path}")
-    
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened(): 
-        print(f"Error opening video {video_path}")
+    already_reported = get_result_cache().logged(cache_key) if cache_key else set()
+
+    def report(ctx, vehicle, v_type):
+        # Start background thread
+        # Must copy frame because it's mutable and loop continues
+        threading.Thread(target=report_async, args=(video_id, v_type, vehicle.id, ctx.image.copy(), vehicle.speed,
+                                                    vehicle.plate, vehicle.class_name)).start()
+
+    def remember(report_key):
+        get_result_cache().mark_logged(cache_key, report_key)
+        already_reported.add(report_key)
+
+    def index_plate(track_id, text, score, frame):
+        get_plate_index().add(text, video_id=video_id, camera_id=camera_id, track_id=track_id,
+                        frame=frame, pts=pipeline.stream.pts(frame), score=score)
+
+    stages = [ResizeStage(), DetectStage(runtime.get_detector()), SpeedStage(), RulesStage(), SignalStage(),
+              PlateStage(on_plate=index_plate),
+              ViolationStage(report, already_reported, remember if cache_key else None)]
+    sinks = []
+    if RECORD_RESULTS:
+        sinks.append(ResultsSink(os.path.join(PROCESSED_DIR, f"{video_id}_results.parquet")))
+    pipeline = Pipeline(VideoSource(video_path), stages, sinks, video_id=video_id, camera_id=camera_id,
+                        settings=settings)
+    return pipeline
+
+def analyze_frames(video_path: str, video_id: str, tiled: bool = None, draw: bool = True, cache_key: str = None,
+                   camera_id: str = None, settings=None):
+    """
+    Core analysis loop behind every stream; viewers share one run per video
+    through the broadcast hub. Yields (frame, metadata) for every processed frame; the frame is annotated
+    unless draw=False (clients that draw overlays themselves from metadata).
+    Box coordinates in metadata are in the 640 px analysis frame.
+    With tiled=True detection runs on the full-resolution frame (see tiling.py);
+    drawing and streaming still use the 640 px frame. tiled=None follows the
+    camera config (settings, default watch_camera()).
+    cache_key: violations already reported under this result-cache key (by an
+    earlier, interrupted run) are not reported again.
+    """
+    log.info("Starting stream for video: %s", video_path)
+    if settings is None:
+        settings = watch_camera(video_id, camera_id, tiled)
+    frames = build_pipeline(video_path, video_id, settings, cache_key=cache_key, camera_id=camera_id).run()
+    try:
+        for ctx in frames:
+            metadata = ctx.metadata()
+            yield (draw_overlays(ctx.image.copy(), metadata) if draw else ctx.image), metadata
+    finally:
+        # Client went away: the pipeline still closes the video and finishes the results file
+        frames.close()
+
+def analysis_source(video_path: str, video_id: str, tiled: bool = None, camera_id: str = None):
+    """
+    (frame, metadata) items for a video: replayed from the result cache when
+    this file was already analysed with the same models and settings,
+    otherwise analysed live and recorded into the cache.
+    Runs on the broadcast producer thread, so hashing the file never blocks a request.
+    """
+    settings = watch_camera(video_id, camera_id, tiled)
+    # The signal timeline is an input too: a file by content, a live URL not at all
+    signal = signal_rules.source_fingerprint(settings.current['signal_source'])
+    if not RESULT_CACHE or signal is None:
+        yield from analyze_frames(video_path, video_id, draw=False, camera_id=camera_id, settings=settings)
         return
+    fingerprint = (f"{runtime.model_fingerprint()}|config={camera_config.fingerprint(settings.current)}"
+                   f"|signal={signal}|v={ANALYSIS_VERSION}")
+    cache = get_result_cache()
+    key = cache.key(video_path, fingerprint)
+    if cache.get(key):
+        log.info("Replaying cached analysis for video: %s", video_path)
+        width = settings.current['analysis_width']
+        yield from cache.replay(video_path, key, prepare=lambda f: resize_for_display(f, width)[0])
+    else:
+        # A run whose settings or timeline changed midway matches no fingerprint: it is not kept
+        yield from cache.record(key, analyze_frames(video_path, video_id, draw=False, cache_key=key,
+                                                    camera_id=camera_id, settings=settings),
+                                keep=lambda: settings.changes == 0 and signal == signal_rules.source_fingerprint(
+                                    settings.current['signal_source']))
+
+def subscribe(video_path: str, video_id: str, tiled: bool = None, camera_id: str = None):
+    """
+    Join the shared analysis of video_id, starting it if nobody is watching yet.
+    The first viewer's tiled setting applies to the running analysis.
+    """
+    return hub.subscribe(video_id, lambda: analysis_source(video_path, video_id, tiled=tiled, camera_id=camera_id))
 
-    width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    # height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) # Unused
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30
-    
-    frame_count = 0
-    track_history = {} 
-    vehicle_plates = {} 
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret: 
-            # Loop video for continuous stream or break
-            # For user experience, looping might be nice, or just stopping.
-            # Let's stop.
-            break
-        
-        frame_count += 1
-        
-        # PERFORMANCE: Skip frames to speed up playback/processing
-        # Process every 3rd frame (Skip 2). 
-        # Logic: If frame_count % 3 != 0, continue.
-        # This effectively plays the video at 3x speed if processing can keep up, or just reduces load.
-        SKIP_STEP = 3
-        if frame_count % SKIP_STEP != 0:
-            continue
-
-        # PERFORMANCE: Resize large videos
-        height, width = frame.shape[:2]
-        if width > 640:
-            scale = 640 / width
-            frame = cv2.resize(frame, (640, int(height * scale)))
-        
-        # Track
-        results = vehicle_model.track(frame, persist=True, classes=[0, 2, 3, 5, 7], verbose=False, imgsz=640)
-        
-        annotated_frame = frame.copy()
-        
-        if results and results[0].boxes and results[0].boxes.id is not None:
-             # ... (boxes extraction code matches existing) ...
-            boxes = results[0].boxes.xywh.cpu().tolist()
-            track_ids = results[0].boxes.id.int().cpu().tolist()
-            cls_ids = results[0].boxes.cls.int().cpu().tolist()
-            boxes_xyxy = results[0].boxes.xyxy.cpu().tolist()
-
-            persons = []
-            vehicles = []
-
-            for box, box_xyxy_val, track_id, cls in zip(boxes, boxes_xyxy, track_ids, cls_ids):
-                if int(cls) == 0:
-                    persons.append(box_xyxy_val)
-                elif int(cls) in VEHICLE_CLASSES:
-                    vehicles.append((box, box_xyxy_val, track_id, int(cls)))
-
-            for box, box_xyxy, track_id, cls in vehicles:
-                x, y, w, h = box
-                center = (float(x), float(y))
-                x1, y1, x2, y2 = map(int, box_xyxy)
-                
-                if track_id not in track_history:
-                    track_history[track_id] = {'last_pos': center, 'last_ocr_frame': -100, 'speed_buffer': []}
-                
-                prev_pos = track_history[track_id].get('last_pos')
-                
-                # CORRECT SPEED CALCULATION for Skipped Frames
-                # We processed 1 frame out of SKIP_STEP.
-                # So time delta is SKIP_STEP * (1/fps).
-                # Effective FPS for speed calc is fps / SKIP_STEP.
-                effective_fps = fps / SKIP_STEP
-                raw_speed = calculate_speed(prev_pos, center, effective_fps)
-                
-                # Speed Smoothing (Moving Average)
-                track_history[track_id]['speed_buffer'].append(raw_speed)
-                if len(track_history[track_id]['speed_buffer']) > 5:
-                    track_history[track_id]['speed_buffer'].pop(0)
-                speed = round(sum(track_history[track_id]['speed_buffer']) / len(track_history[track_id]['speed_buffer']), 2)
-
-                track_history[track_id]['last_pos'] = center
-                
-                class_name = vehicle_model.names[int(cls)].upper()
-                
-                detected_violations = []
-
-                # Violations
-                # THRESHOLD: Updated to 60 km/h as requested
-                limit = 60 
-                
-                # 1. OVERSPEEDING (Strictly Cars, Buses, Trucks ONLY)
-                if cls in [2, 5, 7] and speed > limit:
-                     detected_violations.append("OVERSPEEDING")
-                     print(f"DEBUG: OVERSPEEDING {track_id} Speed {speed}")
-
-                # 2. TRIPLE RIDING (Motorcycles Only)
-                if cls == MOTORCYCLE_CLASS:
-                    is_triple, p_count = check_triple_riding(box_xyxy, persons)
-                    if is_triple: 
-                        detected_violations.append("TRIPLE RIDING")
-                        print(f"DEBUG: TRIPLE RIDING {track_id}")
-                
-                # 3. NO HELMET (Motorcycles Only)
-                if cls == MOTORCYCLE_CLASS:
-                    # Heuristic: If rider detected, check valid helmet
-                    # Since we lack a helmet model, we simulate "No Helmet Detected" if rider is present
-                    is_no_helmet = check_no_helmet(box_xyxy, persons, track_id)
-                    if is_no_helmet:
-                         detected_violations.append("NO HELMET")
-                         print(f"DEBUG: NO HELMET {track_id}")
-
-                # ANPR
-                cached_plate = vehicle_plates.get(track_id)
-                last_ocr = track_history[track_id]['last_ocr_frame']
-                
-                should_run_ocr = False
-                if not cached_plate:
-                    if frame_count - last_ocr > 5: should_run_ocr = True
-                elif cached_plate['score'] < 0.8:
-                    if frame_count - last_ocr > 10: should_run_ocr = True
-
-                if should_run_ocr:
-                     v_h, v_w = frame.shape[:2]
-                     
-                     # 1. Expand Crop slightly (5% margin) to ensure plate edges aren't cut
-                     margin_x = int((x2 - x1) * 0.05)
-                     margin_y = int((y2 - y1) * 0.05)
-                     vx1 = max(0, x1 - margin_x)
-                     vy1 = max(0, y1 - margin_y)
-                     vx2 = min(v_w, x2 + margin_x)
-                     vy2 = min(v_h, y2 + margin_y)
-                     
-                     vehicle_h = vy2 - vy1
-                     
-                     # SMART CROP: Focus on Bottom 40% of vehicle (Bumper area) for Cars/Trucks/Buses
-                     # For Motorcycles, plates can be higher, so we use Bottom 60%
-                     crop_ratio = 0.60 if int(cls) == 3 else 0.40 # 3 is Motorcycle
-                     
-                     plate_zone_y1 = vy1 + int((1 - crop_ratio) * vehicle_h)
-                     plate_zone_crop = frame[plate_zone_y1:vy2, vx1:vx2]
-                     
-                     if plate_zone_crop.size > 0:
-                        # Pass ONLY the bumper area to OCR
-                        text, score = util.read_license_plate(plate_zone_crop)
-                        track_history[track_id]['last_ocr_frame'] = frame_count
-                        
-                        if text and score:
-                            # 2. Persistence Logic: Only update if Better Score OR No current plate
-                            current_data = vehicle_plates.get(track_id)
-                            if not current_data or score > current_data['score']:
-                                print(f"DEBUG: Updated Plate {track_id}: {text} ({score:.2f})")
-                                vehicle_plates[track_id] = {'text': text, 'score': score}
-
-                color = (0, 255, 0)
-                label_text = ""
-                plate_text = vehicle_plates[track_id]['text'] if track_id in vehicle_plates else ""
-                
-                if detected_violations:
-                    color = (0, 0, 255)
-                    label_text = ", ".join(detected_violations)
-                    # Note: In streaming mode, we might not want to spam backend calls every frame.
-                    # Logic: only report once per violation type per track_id
-                    for v_type in detected_violations:
-                        violation_key = f'logged_{v_type}'
-
-
-
-# ... inside generate_frames ...
-
-                    for v_type in detected_violations:
-                        violation_key = f'logged_{v_type}'
-                        if not track_history[track_id].get(violation_key):
-                            print(f"DEBUG: Triggering Async Report for {v_type} ID {track_id}")
-                            
-                            # Start background thread
-                            # Must copy frame because it's mutable and loop continues
-                            frame_copy = frame.copy()
-                            threading.Thread(target=report_async, args=(video_id, v_type, track_id, frame_copy, speed, plate_text, class_name)).start()
-                                
-                            track_history[track_id][violation_key] = True 
-
-                # Visualization
-                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                info_text = f"{plate_text}"
-                if speed > 10: info_text += f" | {speed} km/h"
-                if label_text: info_text += f" | {label_text}"
-                
-                font_scale = max(0.5, width / 1500.0)
-                thickness = max(1, int(width / 600.0))
-                (tw, th), _ = cv2.getTextSize(info_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-                cv2.rectangle(annotated_frame, (x1, y1 - th - 10), (x1 + tw, y1), color, -1)
-                cv2.putText(annotated_frame, info_text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
-
-        # Encode Frame
-        ret, buffer = cv2.imencode('.jpg', annotated_frame)
-        frame_bytes = buffer.tobytes()
-        
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+def generate_frames(video_path: str, video_id: str, tiled: bool = None, camera_id: str = None):
+    """
+    Generator function for MJPEG streaming.
+    """
+    with subscribe(video_path, video_id, tiled, camera_id) as sub:
+        while (item := sub.get()) is not None:
+            shared, _ = item
+            # Encode Frame (shared by all MJPEG viewers of this video)
+            frame_bytes = shared.jpeg()
+            
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
 
-    cap.release()
+def find_upload(video_id: str):
+    # Exact match or prefix match
+    for f in os.listdir(UPLOAD_DIR):
+        if f.startswith(video_id):
+            return os.path.join(UPLOAD_DIR, f)
+    return None
 
 @app.get("/video_feed")
-async def video_feed(video_id: str):
+async def video_feed(video_id: str, camera_id: str = None, tiled: bool = None):
     """
     Stream video processing results.
+    Tiled inference follows the camera config (default: on for cameras
+    listed in TILED_CAMERAS); the tiled query parameter overrides it for one stream.
     """
     # Find file matching video_id in uploads
-    files = os.listdir(UPLOAD_DIR)
-    target_file = None
-    
-    # Exact match or prefix match
-    for f in files:
-        if f.startswith(video_id):
-             target_file = os.path.join(UPLOAD_DIR, f)
-             break
+    target_file = find_upload(video_id)
     
     if not target_file:
-         print(f"Video file not found for ID: {video_id}")
+         log.warning("Video file not found for ID: %s", video_id)
          return JSONResponse(status_code=404, content={"message": "Video not found"})
 
-    return StreamingResponse(generate_frames(target_file, video_id), media_type="multipart/x-mixed-replace; boundary=frame")
+
+    return StreamingResponse(generate_frames(target_file, video_id, tiled=tiled, camera_id=camera_id), media_type="multipart/x-mixed-replace; boundary=frame")
+
+
+def generate_metadata(video_path: str, video_id: str, tiled: bool = None, fmt: str = "ndjson", camera_id: str = None):
+    """
+    Metadata-only stream: no drawing, no JPEG encoding.
+    ndjson: one JSON object per line; binary: uint32 length + pack_metadata record.
+    """
+    with subscribe(video_path, video_id, tiled, camera_id) as sub:
+        while (item := sub.get()) is not None:
+            shared, events = item
+            metadata = {**shared.metadata, 'events': events}
+            if fmt == "binary":
+                record = pack_metadata(metadata)
+                yield struct.pack('<I', len(record)) + record
+            else:
+                yield json.dumps(metadata, separators=(',', ':')).encode() + b'\n'
+
+@app.get("/metadata_feed")
+async def metadata_feed(video_id: str, camera_id: str = None, tiled: bool = None, format: str = "ndjson"):
+    """
+    Per-frame detections (track id, class, box, speed, plate, violations)
+    without pixels, for dashboards that play the original video and draw
+    overlays themselves. format=ndjson or binary (see streaming.pack_metadata).
+    """
+    target_file = find_upload(video_id)
+    if not target_file:
+        return JSONResponse(status_code=404, content={"message": "Video not found"})
+    if format not in ("ndjson", "binary"):
+        return JSONResponse(status_code=400, content={"message": "format must be ndjson or binary"})
+
+    media_type = "application/octet-stream" if format == "binary" else "application/x-ndjson"
+    return StreamingResponse(generate_metadata(target_file, video_id, tiled=tiled, fmt=format, camera_id=camera_id), media_type=media_type)
+
+
+def stream_width(width):
+    """A client-requested JPEG width clamped to the allowed range, or None for the analysis width."""
+    if width is None or width <= 0:
+        return None
+    return max(STREAM_MIN_WIDTH, min(STREAM_MAX_WIDTH, width))
+
+
+@app.websocket("/ws/video_feed")
+async def video_feed_ws(websocket: WebSocket, video_id: str, camera_id: str = None, tiled: bool = None,
+                        quality: int = 70, width: int = None, draw: bool = True, frames: bool = True,
+                        format: str = "json"):
+    """
+    Low-latency stream over a WebSocket. Per processed frame the server sends
+    a JSON text message (frame number, objects, new violation events, frames
+    dropped so far) followed by a binary JPEG message.
+
+    - quality / width: JPEG quality and output width; the client can change
+      them mid-stream by sending {"quality": 50, "width": 480}.
+    - draw=false skips server-side drawing so the browser renders overlays
+      from the metadata (boxes are in metadata width/height coordinates).
+    - frames=false sends metadata only (no drawing or encoding at all), as
+      JSON text or, with format=binary, pack_metadata binary messages.
+    - A slow client only ever gets the newest frame; stale frames are dropped.
+    """
+    await websocket.accept()
+    target_file = find_upload(video_id)
+    if not target_file:
+        await websocket.send_json({"type": "error", "message": "Video not found"})
+        await websocket.close(code=1008)
+        return
+    if not frames:
+        draw = False
+
+    settings = {"quality": max(1, min(100, quality)), "width": stream_width(width)}
+    sub = subscribe(target_file, video_id, tiled, camera_id)
+
+    async def receive_settings():
+        try:
+            while True:
+                message = await websocket.receive_json()
+                if "quality" in message:
+                    settings["quality"] = max(1, min(100, int(message["quality"])))
+                if "width" in message:
+                    settings["width"] = stream_width(int(message["width"]))
+        except (WebSocketDisconnect, ValueError, TypeError, KeyError):
+            pass
+        finally:
+            # Wakes the sender and, if this was the last viewer, stops the analysis
+            sub.close()
+
+    receiver = asyncio.create_task(receive_settings())
+    ended = False
+    try:
+        while True:
+            item = await sub.get_async()
+            if item is None:
+                ended = not receiver.done()
+                break
+            shared, events = item
+            metadata = {**shared.metadata, 'events': events}
+            if not frames:
+                if format == "binary":
+                    await websocket.send_bytes(pack_metadata(metadata))
+                else:
+                    await websocket.send_json({"type": "frame", "dropped": sub.dropped, **metadata})
+                continue
+            jpeg = await asyncio.to_thread(shared.jpeg, settings["quality"], settings["width"], draw)
+            await websocket.send_json({"type": "frame", "dropped": sub.dropped, **metadata})
+            if jpeg is not None:
+                await websocket.send_bytes(jpeg)
+        if ended:
+            await websocket.send_json({"type": "end", "dropped": sub.dropped})
+            await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # client went away mid-send
+    finally:
+        receiver.cancel()
+        sub.close()
+
+
+@app.get("/cameras/config")
+def cameras_config():
+    """
+    The camera config store: current version, per-camera entries and the
+    settings every camera starts from.
+    """
+    return {**camera_configs.document(), "defaults": camera_configs.get(camera_config.DEFAULT_CAMERA),
+            "fields": {name: spec[4] for name, spec in camera_config.FIELDS.items()}}
+
+@app.get("/cameras/config/history")
+def cameras_config_history(limit: int = 20):
+    return {"versions": camera_configs.history(limit)}
+
+@app.post("/cameras/config/rollback")
+def cameras_config_rollback(version: int):
+    """
+    Restore the cameras of an earlier version (as a new version).
+    """
+    try:
+        return {"version": camera_configs.rollback(version)}
+    except KeyError:
+        return JSONResponse(status_code=404, content={"message": f"No config version {version}"})
+
+@app.get("/cameras/{camera_id}/config")
+def camera_config_get(camera_id: str):
+    return {"camera_id": camera_id, "version": camera_configs.version, "config": camera_configs.get(camera_id)}
+
+@app.put("/cameras/{camera_id}/config")
+def camera_config_put(camera_id: str, changes: dict = Body(...), replace: bool = False):
+    """
+    Change a camera's settings ("default" for all cameras); replace=true
+    drops the ones not given. Running streams of the camera pick the change
+    up at their next frame.
+    """
+    try:
+        version = camera_configs.update(camera_id, changes, replace=replace)
+    except ValueError as e:
+        return JSONResponse(status_code=422, content={"message": str(e)})
+    return {"camera_id": camera_id, "version": version, "config": camera_configs.get(camera_id)}
+
+@app.get("/plates/repeat_offenders")
+def plates_repeat_offenders(min_videos: int = 2, limit: int = 50):
+    """
+    Plates seen in at least min_videos different videos.
+    """
+    return {"plates": get_plate_index().repeat_offenders(min_videos=min_videos, limit=limit)}
+
+@app.get("/plates/{plate}")
+def plate_sightings(plate: str, fuzzy: int = 0, exact: bool = False, limit: int = 100):
+    """
+    Where else has this plate appeared? Matches ignore the usual OCR
+    confusions (O/0, B/8, ...); fuzzy=1 also allows one more wrong, missing
+    or extra character. exact=true matches the stored text only.
+    """
+    if not 0 <= fuzzy <= MAX_FUZZY_DISTANCE:
+        return JSONResponse(status_code=400, content={"message": f"fuzzy must be between 0 and {MAX_FUZZY_DISTANCE}"})
+    return {
+        "plate": plate,
+        "summary": [] if exact else get_plate_index().summary(plate, max_distance=fuzzy),
+        "sightings": get_plate_index().lookup(plate, max_distance=fuzzy, exact=exact, limit=limit),
+    }
 
 
 @app.post("/detect")
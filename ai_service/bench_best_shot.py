@@ -0,0 +1,133 @@
+"""
+Simulation comparing periodic OCR with best-shot selection (best_shot.py).
+
+Usage:
+    python bench_best_shot.py [--tracks 300] [--seed 0]
+
+Each simulated track drives towards the camera: its plate-zone crop grows,
+starts oblique and turns frontal, and random frames are motion-blurred. A
+crop counts as readable when it is large, sharp and frontal enough; the
+simulated OCR returns the plate (score 0.9) for readable crops and nothing
+otherwise, so only the choice of crops differs between the policies:
+
+- periodic: the previous analyze_frames logic (OCR every 6 source frames
+  while the track has no plate, every 10 while its score is below 0.8);
+- best-shot: BestShotSelector with app.py's settings.
+
+Reports OCR calls per vehicle, read rate, and the real util cost of scoring
+the offered crops.
+"""
+import argparse
+import random
+import time
+
+import cv2
+import numpy as np
+
+from best_shot import BestShotSelector
+
+SKIP_STEP = 3
+
+
+def render(rng, plate, width, angle, blur):
+    """Bumper-zone crop of the given width, sheared by angle (0 = frontal), blurred by sigma blur."""
+    h = max(8, int(width * 0.45))
+    img = np.full((h, width, 3), 110, np.uint8)
+    pw, ph = int(width * 0.7), max(3, int(h * 0.35))
+    x, y = (width - pw) // 2, int(h * 0.5)
+    cv2.rectangle(img, (x, y), (x + pw, y + ph), (235, 235, 235), -1)
+    cv2.putText(img, plate, (x + 2, y + int(ph * 0.8)), cv2.FONT_HERSHEY_SIMPLEX, pw / 300,
+                (20, 20, 20), max(1, pw // 150))
+    if angle:
+        shear = np.float32([[1 - angle * 0.5, 0, 0], [angle, 1, -angle * width * 0.5]])
+        img = cv2.warpAffine(img, shear, (width, h), borderValue=(110, 110, 110))
+    noise = np.random.default_rng(rng.randrange(1 << 30)).normal(0, 3, img.shape)
+    img = np.clip(img + noise, 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(img, (0, 0), blur) if blur > 0.3 else img
+
+
+def simulate_track(rng):
+    """Per processed frame: (crop, readable) for one vehicle pass."""
+    length = rng.randint(8, 40)
+    plate = 'TN{:02d}AB{:04d}'.format(rng.randint(1, 99), rng.randint(0, 9999))
+    w0, w1 = rng.randint(50, 120), rng.randint(140, 320)
+    frames = []
+    for i in range(length):
+        t = i / max(1, length - 1)
+        width = int(w0 + (w1 - w0) * t)
+        angle = 0.4 * (1 - t) * rng.choice([-1, 1])
+        blur = rng.uniform(2.0, 4.0) if rng.random() < 0.4 else rng.uniform(0.0, 0.6)
+        readable = width >= 160 and blur < 1.0 and abs(angle) < 0.15
+        frames.append((render(rng, plate, width, angle, blur), readable))
+    return frames
+
+
+def periodic(track):
+    calls, plate_score, last_ocr = 0, None, -100
+    for i, (_, readable) in enumerate(track):
+        frame = (i + 1) * SKIP_STEP
+        if plate_score is None and frame - last_ocr > 5 or plate_score is not None and plate_score < 0.8 \
+                and frame - last_ocr > 10:
+            calls += 1
+            last_ocr = frame
+            if readable:
+                plate_score = 0.9
+    return calls, plate_score is not None
+
+
+def best_shot(track, selector, track_id, start_frame):
+    readable_by_id = {}
+    calls, read = 0, False
+
+    def ocr(shots):
+        nonlocal calls, read
+        for _, crop in shots:
+            calls += 1
+            if readable_by_id[id(crop)]:
+                read = True
+                selector.done(track_id, 0.9)
+                return
+
+    frame = start_frame
+    for crop, readable in track:
+        frame += SKIP_STEP
+        shots = selector.offer(track_id, frame, crop)
+        # The ring keeps copies; map them back to the ground truth by content
+        for _, kept in shots:
+            readable_by_id[id(kept)] = any(np.array_equal(kept, c) and r for c, r in track)
+        ocr(shots)
+    for _, shots in selector.expired(frame + selector.lost_after + 1):
+        for _, kept in shots:
+            readable_by_id[id(kept)] = any(np.array_equal(kept, c) and r for c, r in track)
+        ocr(shots)
+    return calls, read
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tracks', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tracks = [simulate_track(rng) for _ in range(args.tracks)]
+    readable = sum(any(r for _, r in t) for t in tracks)
+    frames = sum(len(t) for t in tracks)
+
+    results = {'periodic': [periodic(t) for t in tracks]}
+    selector = BestShotSelector(lost_after=5 * SKIP_STEP)
+    start = time.perf_counter()
+    results['best-shot'] = [best_shot(t, selector, i, i * 1000) for i, t in enumerate(tracks)]
+    offer_ms = (time.perf_counter() - start) * 1000 / frames
+
+    print(f"{args.tracks} vehicles, {frames} processed frames, {readable} vehicles readable at some point")
+    for name, rows in results.items():
+        calls = sum(c for c, _ in rows)
+        reads = sum(r for _, r in rows)
+        print(f"{name:<10} OCR calls {calls:>5} ({calls / len(rows):.2f}/vehicle)  "
+              f"read {reads}/{readable} ({reads / max(readable, 1):.0%})")
+    print(f"best-shot scoring: {offer_ms:.3f} ms per offered crop; {selector.stats()}")
+
+
+if __name__ == '__main__':
+    main()
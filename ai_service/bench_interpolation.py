@@ -0,0 +1,190 @@
+"""
+Benchmark + parity check for add_missing_data.interpolate_bounding_boxes.
+
+Usage:
+    python bench_interpolation.py [--rows 1000000] [--parity-rows 20000]
+
+Builds a synthetic results CSV in memory (tracks with random detection gaps),
+checks that the vectorised engine produces exactly the same rows as the
+original per-car implementation (kept below as legacy_interpolate) on a
+sample small enough for the quadratic version, checks that the streaming
+mode (interpolate_stream) gives the same rows whatever its chunk size, then
+times the new engine on --rows input rows.
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.interpolate import interp1d
+
+from add_missing_data import interpolate_bounding_boxes, interpolate_stream, interpolate_tracks
+from results_io import parse_bbox_column
+
+
+def synthetic_rows(n_rows, seed=0, mean_track_len=40, max_gap=6):
+    """
+    Rows shaped like util.write_csv output, in frame order. Each track moves
+    linearly and is detected on a random subset of its frames.
+    """
+    rng = np.random.default_rng(seed)
+    per_track = []
+    car_id = 0
+    total = 0
+    while total < n_rows:
+        length = int(rng.integers(mean_track_len // 2, mean_track_len * 3 // 2))
+        start = int(rng.integers(0, max(1, n_rows // 10)))
+        steps = rng.integers(1, max_gap + 1, size=length)
+        frames = start + np.cumsum(steps) - steps[0]
+        box = rng.uniform(0, 1500, size=4)
+        box[2:] += box[:2]
+        velocity = rng.uniform(-5, 5, size=4)
+        per_track.append((car_id, frames, box, velocity))
+        total += length
+        car_id += 1
+
+    rows = []
+    for car_id, frames, box, velocity in per_track:
+        for f in frames:
+            car = np.round(box + velocity * (f - frames[0]), 2)
+            plate = np.round(car[[0, 1, 0, 1]] + [10, 10, 60, 30], 2)
+            rows.append((int(f), {
+                'frame_nmr': str(int(f)),
+                'car_id': str(car_id),
+                'car_bbox': '[{} {} {} {}]'.format(*car.tolist()),
+                'license_plate_bbox': '[{} {} {} {}]'.format(*plate.tolist()),
+                'license_plate_bbox_score': str(round(float(rng.uniform(0.3, 1)), 4)),
+                'license_number': 'TN38AB{:04d}'.format(car_id % 10000),
+                'license_number_score': str(round(float(rng.uniform(0.3, 1)), 4)),
+            }))
+    rows.sort(key=lambda r: r[0])
+    return [r for _, r in rows[:n_rows]]
+
+
+def legacy_interpolate(data):
+    """The original implementation, verbatim apart from the debug print."""
+    frame_numbers = np.array([int(row['frame_nmr']) for row in data])
+    car_ids = np.array([int(float(row['car_id'])) for row in data])
+    car_bboxes = np.array([list(map(float, row['car_bbox'][1:-1].split())) for row in data])
+    license_plate_bboxes = np.array([list(map(float, row['license_plate_bbox'][1:-1].split())) for row in data])
+
+    interpolated_data = []
+    unique_car_ids = np.unique(car_ids)
+    for car_id in unique_car_ids:
+
+        frame_numbers_ = [p['frame_nmr'] for p in data if int(float(p['car_id'])) == int(float(car_id))]
+
+        car_mask = car_ids == car_id
+        car_frame_numbers = frame_numbers[car_mask]
+        car_bboxes_interpolated = []
+        license_plate_bboxes_interpolated = []
+
+        first_frame_number = car_frame_numbers[0]
+
+        for i in range(len(car_bboxes[car_mask])):
+            frame_number = car_frame_numbers[i]
+            car_bbox = car_bboxes[car_mask][i]
+            license_plate_bbox = license_plate_bboxes[car_mask][i]
+
+            if i > 0:
+                prev_frame_number = car_frame_numbers[i-1]
+                prev_car_bbox = car_bboxes_interpolated[-1]
+                prev_license_plate_bbox = license_plate_bboxes_interpolated[-1]
+
+                if frame_number - prev_frame_number > 1:
+                    frames_gap = frame_number - prev_frame_number
+                    x = np.array([prev_frame_number, frame_number])
+                    x_new = np.linspace(prev_frame_number, frame_number, num=frames_gap, endpoint=False)
+                    interp_func = interp1d(x, np.vstack((prev_car_bbox, car_bbox)), axis=0, kind='linear')
+                    interpolated_car_bboxes = interp_func(x_new)
+                    interp_func = interp1d(x, np.vstack((prev_license_plate_bbox, license_plate_bbox)), axis=0, kind='linear')
+                    interpolated_license_plate_bboxes = interp_func(x_new)
+
+                    car_bboxes_interpolated.extend(interpolated_car_bboxes[1:])
+                    license_plate_bboxes_interpolated.extend(interpolated_license_plate_bboxes[1:])
+
+            car_bboxes_interpolated.append(car_bbox)
+            license_plate_bboxes_interpolated.append(license_plate_bbox)
+
+        for i in range(len(car_bboxes_interpolated)):
+            frame_number = first_frame_number + i
+            row = {}
+            row['frame_nmr'] = str(frame_number)
+            row['car_id'] = str(car_id)
+            row['car_bbox'] = ' '.join(map(str, car_bboxes_interpolated[i]))
+            row['license_plate_bbox'] = ' '.join(map(str, license_plate_bboxes_interpolated[i]))
+
+            if str(frame_number) not in frame_numbers_:
+                row['license_plate_bbox_score'] = '0'
+                row['license_number'] = '0'
+                row['license_number_score'] = '0'
+            else:
+                original_row = [p for p in data if int(p['frame_nmr']) == frame_number and int(float(p['car_id'])) == int(float(car_id))][0]
+                row['license_plate_bbox_score'] = original_row['license_plate_bbox_score'] if 'license_plate_bbox_score' in original_row else '0'
+                row['license_number'] = original_row['license_number'] if 'license_number' in original_row else '0'
+                row['license_number_score'] = original_row['license_number_score'] if 'license_number_score' in original_row else '0'
+
+            interpolated_data.append(row)
+
+    return interpolated_data
+
+
+def stream_rows(rows, chunk_size, idle_frames=30):
+    return [row for batch in interpolate_stream(rows, idle_frames, chunk_size) for row in batch]
+
+
+def check_stream_chunking(sample):
+    """interpolate_stream output must not depend on chunk_size."""
+    def row(frame, car_id):
+        return {'frame_nmr': str(frame), 'car_id': str(car_id), 'car_bbox': '0 0 10 10',
+                'license_plate_bbox': '0 5 10 10', 'license_plate_bbox_score': '0.9',
+                'license_number': '0', 'license_number_score': '0'}
+    # Car 1 at frames 1 and 60 (idle 58 > 30: two segments), car 2 at frames 2-59
+    gap = [row(1, 1)] + [row(f, 2) for f in range(2, 60)] + [row(60, 1)]
+    ordered = sorted(sample, key=lambda r: int(r['frame_nmr']))
+    for name, rows, expected in (('idle gap', gap, 60), ('sample', ordered, None)):
+        small, large = stream_rows(rows, 1), stream_rows(rows, 10_000)
+        if small != large or (expected is not None and len(small) != expected):
+            raise SystemExit(f"Streaming chunk-size check FAILED on {name}: "
+                             f"{len(small)} rows with chunk_size=1, {len(large)} with 10000")
+    print("Streaming output independent of chunk size: OK")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--parity-rows', type=int, default=20_000)
+    args = parser.parse_args()
+
+    sample = synthetic_rows(args.parity_rows, seed=1)
+    start = time.perf_counter()
+    expected = legacy_interpolate(sample)
+    legacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = interpolate_bounding_boxes(sample)
+    new_time = time.perf_counter() - start
+    if actual != expected:
+        mismatch = next(i for i, (a, b) in enumerate(zip(actual, expected)) if a != b) if len(actual) == len(expected) else 'length'
+        raise SystemExit(f"Parity FAILED at output row {mismatch}")
+    print(f"Parity OK on {len(sample)} input rows -> {len(actual)} output rows")
+    print(f"  legacy {legacy_time:8.2f}s | vectorised {new_time:8.3f}s | {legacy_time / new_time:,.0f}x")
+    check_stream_chunking(sample)
+
+    data = synthetic_rows(args.rows, seed=2)
+    frames = np.array([int(r['frame_nmr']) for r in data])
+    car_ids = np.array([int(r['car_id']) for r in data])
+    car_bboxes = parse_bbox_column([r['car_bbox'] for r in data])
+    plate_bboxes = parse_bbox_column([r['license_plate_bbox'] for r in data])
+    start = time.perf_counter()
+    interpolate_tracks(frames, car_ids, car_bboxes, plate_bboxes)
+    engine_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    out = interpolate_bounding_boxes(data)
+    elapsed = time.perf_counter() - start
+    print(f"Vectorised on {len(data):,} input rows -> {len(out):,} output rows")
+    print(f"  interpolation engine (arrays) {engine_time:8.2f}s")
+    print(f"  end to end (incl. CSV strings) {elapsed:7.2f}s")
+
+
+if __name__ == '__main__':
+    main()
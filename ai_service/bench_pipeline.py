@@ -0,0 +1,366 @@
+"""
+Reproducible end-to-end benchmark of the streaming pipeline.
+
+Usage:
+    python bench_pipeline.py [--configs small,hd] [--detector model|oracle] [--ocr model|skip|fixed]
+                             [--tracker detector|iou|byte]
+                             [--clip video.mp4] [--output results.json] [--compare baseline.json]
+
+Each config runs in its own process (so peak RSS is per config) through the
+same code path as /video_feed: app.analyze_frames, then SharedFrame
+overlays + JPEG encode per frame. Nothing is posted to the backend:
+violation reports are counted instead.
+
+The input is a deterministic synthetic traffic clip (seeded: same config,
+same pixels) with cars, buses, trucks and motorcycles crossing the frame,
+some speeding, some motorcycles carrying three riders, every vehicle with a
+rendered plate. Synthetic clips are cached in --clip-dir. --clip runs on a
+real recording instead.
+
+- --detector model uses the configured detector (runtime.get_detector,
+  MODEL_BACKEND / MODEL_PROFILE) and measures real inference cost; drawn
+  shapes are not COCO vehicles, so use --clip for meaningful detections.
+- --detector oracle feeds the clip's ground-truth boxes as detections
+  (synthetic clips only): CPU cost of everything around the model, and
+  deterministic violations to check rule changes against.
+- --ocr skip replaces the plate reader with one that reads nothing, for
+  machines without the OCR model; crops still go through the quality gate
+  and preprocessing. --ocr fixed reads the same valid plate from every crop
+  that reaches OCR, without the quality gate (OCR calls are then not
+  counted): every violation report should carry a plate.
+- --tracker sets the camera 'tracker' setting (default byte, see
+  tracker.py); with --detector oracle, 'detector' keeps the ground-truth ids.
+
+Reported per config: source and processed frames/sec, per-stage latency
+percentiles (from metrics.STAGE_SECONDS), OCR calls per track, violations
+found, reports and how many carried a plate, peak RSS. Results are written as JSON; --compare prints the change
+against an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Small enough to finish in a few minutes on a laptop CPU with the model detector
+CONFIGS = {
+    'small': {'width': 640, 'height': 360, 'frames': 150, 'vehicles': 12, 'tiled': False},
+    'hd': {'width': 1280, 'height': 720, 'frames': 300, 'vehicles': 24, 'tiled': False},
+    'hd-tiled': {'width': 1280, 'height': 720, 'frames': 150, 'vehicles': 24, 'tiled': True},
+}
+FPS = 30
+COCO_NAMES = {0: 'person', 2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+# Body size in 640 px-wide display units
+SIZES = {2: (70, 48), 3: (30, 52), 5: (120, 80), 7: (105, 75)}
+
+
+class Scene:
+    """
+    Vehicles crossing a road, fully determined by (width, height, frames,
+    vehicles, seed). Speeds are in display pixels per source frame; app's
+    calculate_speed turns ~11 px/frame at 640 px into 60 km/h.
+    """
+
+    def __init__(self, width, height, frames, vehicles, seed=0):
+        self.width, self.height, self.frames = width, height, frames
+        rng = np.random.default_rng(seed)
+        s = width / 640
+        self.vehicles = []
+        for i in range(vehicles):
+            cls = int(rng.choice([2, 2, 2, 3, 3, 5, 7]))
+            w, h = (v * s * rng.uniform(0.9, 1.2) for v in SIZES[cls])
+            speeding = cls != 3 and rng.random() < 0.25
+            speed = (rng.uniform(13, 16) if speeding else rng.uniform(3, 8)) * s
+            direction = 1 if rng.random() < 0.5 else -1
+            self.vehicles.append({
+                'id': i + 1, 'cls': cls, 'w': w, 'h': h, 'speed': speed * direction,
+                'y': rng.uniform(0.3, 0.92) * height - h, 'start': int(rng.integers(0, max(1, frames - 40))),
+                'riders': (3 if rng.random() < 0.3 else int(rng.integers(1, 3))) if cls == 3 else 0,
+                'color': tuple(int(c) for c in rng.integers(40, 220, 3)),
+                'plate': 'TN{:02d}{}{:04d}'.format(int(rng.integers(1, 99)),
+                                                    ''.join(chr(65 + int(c)) for c in rng.integers(0, 26, 2)),
+                                                    int(rng.integers(0, 9999))),
+            })
+        background = np.full((height, width, 3), (95, 100, 100), np.uint8)
+        background[:int(height * 0.25)] = (150, 130, 110)
+        for y in range(int(height * 0.45), height, int(height * 0.2)):
+            for x in range(0, width, int(80 * s)):
+                cv2.rectangle(background, (x, y), (x + int(40 * s), y + max(2, int(4 * s))), (230, 230, 230), -1)
+        noise = np.random.default_rng(seed + 1).normal(0, 4, background.shape)
+        self.background = np.clip(background + noise, 0, 255).astype(np.uint8)
+
+    def objects_at(self, t):
+        """Ground truth at source frame t: [(id, cls, (x1, y1, x2, y2))], riders as class 0 (id < 0)."""
+        out = []
+        for v in self.vehicles:
+            if t < v['start']:
+                continue
+            travelled = abs(v['speed']) * (t - v['start'])
+            x1 = -v['w'] + travelled if v['speed'] > 0 else self.width - travelled
+            if x1 > self.width or x1 + v['w'] < 0:
+                continue
+            box = (x1, v['y'], x1 + v['w'], v['y'] + v['h'])
+            out.append((v['id'], v['cls'], box))
+            for r in range(v['riders']):
+                rw = v['w'] * 0.55
+                rx = x1 + r * (v['w'] - rw) / max(1, v['riders'] - 1) if v['riders'] > 1 else x1 + v['w'] * 0.2
+                out.append((-(v['id'] * 10 + r), 0, (rx, v['y'] + v['h'] * 0.05, rx + rw, v['y'] + v['h'] * 0.7)))
+        return out
+
+    def render(self, t):
+        frame = self.background.copy()
+        by_id = {v['id']: v for v in self.vehicles}
+        for obj_id, cls, (x1, y1, x2, y2) in self.objects_at(t):
+            p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+            if cls == 0:
+                cv2.ellipse(frame, ((p1[0] + p2[0]) // 2, (p1[1] + p2[1]) // 2),
+                            (max(1, (p2[0] - p1[0]) // 2), max(1, (p2[1] - p1[1]) // 2)), 0, 0, 360, (60, 90, 160), -1)
+                continue
+            v = by_id[obj_id]
+            cv2.rectangle(frame, p1, p2, v['color'], -1)
+            h, w = y2 - y1, x2 - x1
+            if cls != 3:
+                cv2.rectangle(frame, (int(x1 + w * 0.15), int(y1 + h * 0.1)), (int(x2 - w * 0.15), int(y1 + h * 0.4)),
+                              (50, 40, 40), -1)
+            pw, ph = w * 0.6, max(6, h * 0.2)
+            px, py = x1 + (w - pw) / 2, y2 - ph - h * 0.05
+            cv2.rectangle(frame, (int(px), int(py)), (int(px + pw), int(py + ph)), (240, 240, 240), -1)
+            cv2.putText(frame, v['plate'], (int(px + 1), int(py + ph * 0.8)), cv2.FONT_HERSHEY_SIMPLEX,
+                        pw / 190, (15, 15, 15), 1)
+        return frame
+
+
+def synthesize(scene, path):
+    if os.path.exists(path):
+        return path
+    tmp = path + '.tmp.avi'
+    writer = cv2.VideoWriter(tmp, cv2.VideoWriter_fourcc(*'MJPG'), FPS, (scene.width, scene.height))
+    for t in range(scene.frames):
+        writer.write(scene.render(t))
+    writer.release()
+    os.replace(tmp, path)
+    return path
+
+
+class OracleDetector:
+    """Ground-truth boxes of a Scene as tracked detections (for the frames analyze_frames processes)."""
+    names = COCO_NAMES
+    backend = 'oracle'
+
+    def __init__(self, scene, skip_step):
+        self.scene = scene
+        self.skip_step = skip_step
+        self.calls = 0
+
+    def track(self, frame, classes=None, **kwargs):
+        return self._detections(frame, classes, tracked=True)
+
+    def predict(self, frames, classes=None, **kwargs):
+        """The same boxes without their ids, for the per-stream trackers."""
+        return [self._detections(frame, classes, tracked=False) for frame in frames]
+
+    def _detections(self, frame, classes, tracked):
+        import runtime
+
+        self.calls += 1
+        # analyze_frames processes 1-based frame numbers divisible by SKIP_STEP
+        objects = [o for o in self.scene.objects_at(self.calls * self.skip_step - 1)
+                   if classes is None or o[1] in classes]
+        if not objects:
+            return runtime.Detections.empty()
+        scale = frame.shape[1] / self.scene.width
+        return runtime.Detections(np.array([box for _, _, box in objects], np.float32) * scale,
+                                  np.full(len(objects), 0.9, np.float32),
+                                  np.array([cls for _, cls, _ in objects], np.int64),
+                                  ids=np.array([abs(obj_id) for obj_id, _, _ in objects], np.int64) if tracked else None)
+
+
+class BlankReader:
+    """Plate reader that reads nothing (--ocr skip)."""
+
+    def readtext(self, image, allowlist=None):
+        return []
+
+
+def fixed_plate(crop, fallback_min_score=0.4, stats=None):
+    """util.read_license_plate stand-in that reads TN01AB1234 from every crop (--ocr fixed)."""
+    return 'TN01AB1234', 0.9
+
+
+def percentiles(values):
+    ms = np.array(values) * 1000
+    return {'count': len(ms), 'mean': round(float(ms.mean()), 3),
+            **{f'p{p}': round(float(np.percentile(ms, p)), 3) for p in (50, 90, 99)}}
+
+
+def run_one(name, config, args):
+    """Child process: run one config, return its result dict."""
+    workdir = tempfile.mkdtemp(prefix='anpr_bench_')
+    os.environ.update({'RESULT_CACHE': '0', 'RECORD_RESULTS': '0',
+                       'PLATE_INDEX_PATH': os.path.join(workdir, 'plates.db')})
+    os.chdir(workdir)
+    os.makedirs('processed', exist_ok=True)
+    if args.tracker:
+        with open('cameras.json', 'w') as f:
+            json.dump({'version': 1, 'cameras': {'default': {'tracker': args.tracker}}}, f)
+    sys.path.insert(0, HERE)
+    import app
+    import metrics
+    import runtime
+    import util
+    from broadcast import SharedFrame
+
+    scene = None
+    if args.clip:
+        clip = args.clip
+    else:
+        scene = Scene(config['width'], config['height'], config['frames'], config['vehicles'], seed=args.seed)
+        os.makedirs(args.clip_dir, exist_ok=True)
+        clip = synthesize(scene, os.path.join(args.clip_dir, 'synthetic_{width}x{height}_{frames}f_{vehicles}v_s{seed}.avi'
+                                              .format(seed=args.seed, **config)))
+    if args.detector == 'oracle':
+        if scene is None or config['tiled']:
+            raise SystemExit("--detector oracle needs a synthetic clip and an untiled config")
+        runtime._detector = OracleDetector(scene, app.SKIP_STEP)
+    if args.ocr == 'skip':
+        runtime._plate_reader = BlankReader()
+    elif args.ocr == 'fixed':
+        util.read_license_plate = fixed_plate
+
+    reports = []  # plate of every report ('' without one)
+    app.report_async = lambda video_id, v_type, track_id, frame, speed, plate, *rest: reports.append(plate or '')
+    metrics.STAGE_SECONDS.record_samples()
+    # Load (and warm) the models before timing
+    runtime.get_detector()
+
+    tracks, violations, frames = set(), {}, 0
+    start = time.perf_counter()
+    for frame, metadata in app.analyze_frames(clip, f'bench-{name}', tiled=config['tiled'], draw=False):
+        # Same per-frame work as generate_frames: overlays + JPEG for the viewers
+        SharedFrame(frame, metadata, render=app.draw_overlays).jpeg()
+        frames += 1
+        tracks.update(obj['id'] for obj in metadata['objects'])
+        for event in metadata['events']:
+            violations[event['type']] = violations.get(event['type'], 0) + 1
+    wall = time.perf_counter() - start
+    source_frames = frames * app.SKIP_STEP
+
+    ocr = util.OCR_STATS.snapshot()
+    return {
+        'config': name, **config, 'clip': clip, 'detector': args.detector, 'ocr_mode': args.ocr,
+        'tracker': args.tracker or 'default',
+        'frames_source': source_frames, 'frames_processed': frames, 'wall_s': round(wall, 3),
+        'fps_source': round(source_frames / wall, 2), 'fps_processed': round(frames / wall, 2),
+        'stages_ms': {key[0]: percentiles(values) for key, values in sorted(metrics.STAGE_SECONDS.raw.items())},
+        'tracks': len(tracks), 'ocr_calls': ocr['ocr_calls'], 'ocr_crops_rejected': ocr['ocr_calls_saved'],
+        'ocr_calls_per_track': round(ocr['ocr_calls'] / max(1, len(tracks)), 2),
+        'plates_read': metrics.OCR_READS.value(result='plate'),
+        'violations': violations, 'reports': len(reports), 'reports_with_plate': sum(1 for p in reports if p),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r['config']: r for r in json.load(f)['results'] if 'error' not in r}
+    print(f"\nvs {baseline_path}:")
+    for r in results:
+        old = baseline.get(r['config'])
+        if not old or 'error' in r:
+            continue
+        print(f"  {r['config']}: fps {old['fps_processed']} -> {r['fps_processed']} "
+              f"({r['fps_processed'] / old['fps_processed'] - 1:+.0%})")
+        for stage, stats in r['stages_ms'].items():
+            if stage in old['stages_ms'] and old['stages_ms'][stage]['p50'] > 0:
+                before = old['stages_ms'][stage]['p50']
+                print(f"    {stage:<7} p50 {before:.2f} -> {stats['p50']:.2f} ms ({stats['p50'] / before - 1:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end pipeline benchmark')
+    parser.add_argument('--configs', default='small,hd', help=f"Comma-separated, from {', '.join(CONFIGS)}")
+    parser.add_argument('--detector', choices=['model', 'oracle'], default='model')
+    parser.add_argument('--ocr', choices=['model', 'skip', 'fixed'], default='model')
+    parser.add_argument('--tracker', choices=['detector', 'iou', 'byte'], help='Camera tracker setting (default: the config default)')
+    parser.add_argument('--clip', help='Real video to use instead of the synthetic clip')
+    parser.add_argument('--clip-dir', default=os.path.join(tempfile.gettempdir(), 'anpr_bench_clips'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=f"bench_pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.clip = os.path.abspath(args.clip) if args.clip else None
+    args.clip_dir = os.path.abspath(args.clip_dir)
+
+    if args.child:
+        name, result_path = args.child.split(':', 1)
+        result = run_one(name, CONFIGS[name], args)
+        with open(result_path, 'w') as f:
+            json.dump(result, f)
+        return
+
+    results = []
+    for name in args.configs.split(','):
+        if name not in CONFIGS:
+            parser.error(f"unknown config {name}")
+        fd, result_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        cmd = [sys.executable, os.path.abspath(__file__), '--child', f'{name}:{result_path}',
+               '--detector', args.detector, '--ocr', args.ocr, '--clip-dir', args.clip_dir, '--seed', str(args.seed)]
+        if args.clip:
+            cmd += ['--clip', args.clip]
+        if args.tracker:
+            cmd += ['--tracker', args.tracker]
+        print(f"Running {name}...", flush=True)
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        try:
+            with open(result_path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            result = {'config': name, 'error': (proc.stderr or proc.stdout).strip().splitlines()[-5:]}
+        finally:
+            os.remove(result_path)
+        results.append(result)
+        if 'error' in result:
+            print(f"  failed: {' / '.join(result['error'])}")
+            continue
+        print(f"  {result['frames_source']} frames in {result['wall_s']:.1f}s: {result['fps_source']} fps source, "
+              f"{result['fps_processed']} fps processed, peak RSS {result['peak_rss_mb']} MB")
+        for stage, stats in result['stages_ms'].items():
+            print(f"    {stage:<7} n={stats['count']:<5} p50 {stats['p50']:8.2f}  p90 {stats['p90']:8.2f}  "
+                  f"p99 {stats['p99']:8.2f} ms")
+        print(f"  tracks {result['tracks']}, OCR calls {result['ocr_calls']} ({result['ocr_calls_per_track']}/track, "
+              f"{result['ocr_crops_rejected']} crops rejected), violations {result['violations']}")
+        print(f"  reports {result['reports']}, {result['reports_with_plate']} with a plate")
+        if args.ocr == 'fixed' and result['reports_with_plate'] < result['reports']:
+            print("  WARNING: reports without a plate although every OCR call reads one")
+
+    with open(args.output, 'w') as f:
+        json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'revision': git_revision(),
+                   'host': {'python': platform.python_version(), 'machine': platform.machine(),
+                            'cpus': os.cpu_count(), 'opencv': cv2.__version__},
+                   'results': results}, f, indent=2)
+    print(f"Saved {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
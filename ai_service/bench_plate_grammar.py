@@ -0,0 +1,131 @@
+"""
+Golden corpus check and micro-benchmark for the plate grammar in util.
+
+Usage:
+    python bench_plate_grammar.py [--golden plate_golden.tsv] [--n 200000]
+
+1. Every line of the golden corpus (raw OCR text, expected plate, expected
+   format) must parse as listed; mismatches are printed and the script exits
+   with status 1, so it can gate changes to the grammar.
+2. util.format_license must agree with the original per-character version on
+   random OCR-like strings.
+3. Times the original normalise + validate path (per-character dict lookups,
+   regex compiled per call) against util.parse_plate and util.best_plate.
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+import util
+
+ALPHABET = string.ascii_uppercase + string.digits
+
+
+def random_reading(rng):
+    """A plate-like OCR reading: state, district, series, number, with separators and confusions."""
+    text = '{}{:02d}{}{:04d}'.format(rng.choice(['TN', 'KA', 'MH', 'DL', 'XY']), rng.randint(1, 99),
+                                     ''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(0, 2))),
+                                     rng.randint(0, 9999))
+    text = ''.join(rng.choice(ALPHABET) if rng.random() < 0.05 else c for c in text)
+    return rng.choice(['', ' ', '-']).join([text[:4], text[4:]])
+
+
+def legacy_format_license(text):
+    license_plate_ = ''
+    for j in range(len(text)):
+        if j in [0, 1]:
+            license_plate_ += util.dict_int_to_char.get(text[j], text[j])
+        elif j in [2, 3]:
+            license_plate_ += util.dict_char_to_int.get(text[j], text[j])
+        elif j >= len(text) - 4:
+            license_plate_ += util.dict_char_to_int.get(text[j], text[j])
+        else:
+            license_plate_ += util.dict_int_to_char.get(text[j], text[j])
+    return license_plate_
+
+
+def legacy_validate(text):
+    text = legacy_format_license(text.upper().replace(" ", "").replace(".", "").replace("-", ""))
+    if len(text) < 6 or len(text) > 12:
+        return None
+    pattern = r'^[A-Z]{2}[0-9]{1,2}[A-Z]{0,3}[0-9]{3,4}$'
+    return text if re.match(pattern, text) else None
+
+
+def load_golden(path):
+    cases = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            raw, expected, fmt = (line.rstrip('\n').split('\t') + ['', ''])[:3]
+            cases.append((raw, expected or None, fmt or None))
+    return cases
+
+
+def check_golden(cases):
+    failures = 0
+    for raw, expected, fmt in cases:
+        plate, name, _ = util.parse_plate(raw)
+        if (plate, name) != (expected, fmt):
+            failures += 1
+            print(f"  FAIL {raw!r}: got {plate!r} ({name}), expected {expected!r} ({fmt})")
+    print(f"Golden corpus: {len(cases) - failures}/{len(cases)} passed")
+    return failures
+
+
+def check_format_license(rng, n=20000):
+    for _ in range(n):
+        text = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 12)))
+        if util.format_license(text) != legacy_format_license(text):
+            print(f"  FAIL format_license({text!r}): {util.format_license(text)!r} != {legacy_format_license(text)!r}")
+            return 1
+    print(f"format_license matches the per-character version on {n} random strings")
+    return 0
+
+
+def timed(fn, items, repeat=3, setup=None):
+    """Best of repeat runs, in microseconds per item; setup() runs before each."""
+    best = float('inf')
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--golden', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plate_golden.tsv'))
+    parser.add_argument('--n', type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    failures = check_golden(load_golden(args.golden)) + check_format_license(rng)
+
+    # Mostly distinct texts (cold memo cache), then the repetitive stream a
+    # tracked plate produces (a few hundred distinct readings)
+    texts = [random_reading(rng) for _ in range(args.n)]
+    repeated = [rng.choice(texts[:300]) for _ in range(args.n)]
+    legacy_us = timed(legacy_validate, texts)
+    parse_us = timed(util.parse_plate, texts, setup=util.parse_plate.cache_clear)
+    cached_us = timed(util.parse_plate, repeated)
+    # OCR usually returns a few fragments per crop
+    batches = [[(None, rng.choice(texts), rng.random()) for _ in range(3)] for _ in range(args.n // 3)]
+    best_us = timed(util.best_plate, batches)
+    print(f"legacy validate:      {legacy_us:.2f} us/text")
+    print(f"parse_plate (cold):   {parse_us:.2f} us/text ({legacy_us / parse_us:.1f}x)")
+    print(f"parse_plate (stream): {cached_us:.2f} us/text ({legacy_us / cached_us:.1f}x)")
+    print(f"best_plate:           {best_us:.2f} us per 3 detections")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
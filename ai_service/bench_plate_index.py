@@ -0,0 +1,94 @@
+"""
+Benchmark for plate_index.PlateIndex.
+
+Usage:
+    python bench_plate_index.py [--sightings 1000000] [--plates 100000] [--db /tmp/plates_bench.db]
+
+Fills a fresh index with synthetic sightings (Indian-format plates read with
+random OCR confusions and occasional dropped characters, spread over many
+videos), then times exact, confusion-tolerant and fuzzy lookups and the
+repeat-offender query.
+"""
+import argparse
+import os
+import random
+import string
+import time
+
+import numpy as np
+
+from plate_index import PlateIndex
+
+STATES = ['TN', 'KA', 'KL', 'MH', 'DL', 'AP', 'TS', 'GJ']
+CONFUSIONS = {'0': 'O', '8': 'B', '5': 'S', '1': 'I', '2': 'Z', 'O': '0', 'B': '8', 'S': '5'}
+
+
+def random_plate(rng):
+    return '{}{:02d}{}{:04d}'.format(rng.choice(STATES), rng.randint(1, 99),
+                                     ''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.choice([1, 2]))),
+                                     rng.randint(0, 9999))
+
+
+def misread(plate, rng):
+    chars = [CONFUSIONS.get(c, c) if rng.random() < 0.1 else c for c in plate]
+    if rng.random() < 0.05:
+        del chars[rng.randrange(len(chars))]
+    return ''.join(chars)
+
+
+def timed(fn, queries, repeat=1):
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(q)
+        times.append((time.perf_counter() - start) * 1000 / repeat)
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sightings', type=int, default=1_000_000)
+    parser.add_argument('--plates', type=int, default=100_000)
+    parser.add_argument('--videos', type=int, default=5000)
+    parser.add_argument('--db', default='/tmp/plates_bench.db')
+    args = parser.parse_args()
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+
+    rng = random.Random(0)
+    plates = [random_plate(rng) for _ in range(args.plates)]
+    index = PlateIndex(args.db)
+
+    start = time.perf_counter()
+    batch = 50_000
+    for offset in range(0, args.sightings, batch):
+        index.add_many({'plate': misread(rng.choice(plates), rng), 'video_id': f'video-{rng.randrange(args.videos)}',
+                        'camera_id': f'cam-{rng.randrange(50)}', 'track_id': rng.randrange(1000),
+                        'frame': rng.randrange(10000), 'score': rng.random()}
+                       for _ in range(min(batch, args.sightings - offset)))
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {args.sightings:,} sightings of {args.plates:,} plates in {elapsed:.1f}s "
+          f"({args.sightings / elapsed:,.0f}/s), db {os.path.getsize(args.db) / 1e6:.0f} MB")
+
+    queries = [rng.choice(plates) for _ in range(200)]
+    misreads = [misread(q, rng) for q in queries]
+    for name, fn, qs in [
+        ('exact text', lambda q: index.lookup(q, exact=True), queries),
+        ('confusion-tolerant', lambda q: index.lookup(q), misreads),
+        ('fuzzy (+1 edit)', lambda q: index.lookup(q, max_distance=1), misreads),
+    ]:
+        p50, p95 = timed(fn, qs)
+        print(f"  {name:<20} p50 {p50:6.2f} ms | p95 {p95:6.2f} ms")
+    p50, p95 = timed(lambda _: index.repeat_offenders(min_videos=5), range(20))
+    print(f"  {'repeat offenders':<20} p50 {p50:6.2f} ms | p95 {p95:6.2f} ms")
+
+    hits = sum(any(r['canon'] == index.matching_keys(q)[0] for r in index.lookup(m, max_distance=1))
+               for q, m in zip(queries, misreads))
+    print(f"Misread queries that still find the true plate: {hits}/{len(queries)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark for the OCR preprocessing stage in util (quality gate + filter chains).
+
+Usage:
+    python bench_preprocess.py [--crops 2000] [--ocr]
+
+Generates synthetic bumper-zone crops (a plate on a car body, with random
+size, blur, contrast and sensor noise; a share of them hopeless: tiny, flat
+or heavily blurred) and compares, per crop:
+- the original preprocess_image (cubic upscale, sharpen, bilateral, a new
+  CLAHE every call) run on every crop, and
+- util.assess_crop + the chain util.choose_chain picks, with rejected crops
+  skipping preprocessing and OCR.
+
+Reports the chains used, the OCR calls saved and the preprocessing time per
+crop. With --ocr (needs the OCR model) the saved OCR time is measured too.
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+import util
+
+KINDS = {
+    # name: (width range, blur sigma range, contrast range, hopeless)
+    'clean': ((120, 320), (0.0, 0.5), (0.8, 1.0), False),
+    'dim': ((120, 320), (0.0, 0.5), (0.25, 0.4), False),
+    'soft': ((80, 320), (0.8, 1.6), (0.6, 1.0), False),
+    'tiny': ((15, 38), (0.0, 1.0), (0.6, 1.0), True),
+    'flat': ((80, 320), (0.0, 1.0), (0.05, 0.1), True),
+    'smeared': ((60, 200), (5.0, 9.0), (0.3, 0.8), True),
+}
+
+
+def legacy_preprocess(image):
+    h, w = image.shape[:2]
+    if w < 400:
+        scale = 400 / w
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    kernel = np.array([[0, -1, 0],
+                       [-1, 5, -1],
+                       [0, -1, 0]])
+    gray = cv2.filter2D(gray, -1, kernel)
+    gray = cv2.bilateralFilter(gray, 11, 17, 17)
+    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    return clahe.apply(gray)
+
+
+def make_crop(rng, kind):
+    (w_lo, w_hi), (s_lo, s_hi), (c_lo, c_hi), _ = KINDS[kind]
+    w = rng.randint(w_lo, w_hi)
+    h = max(6, int(w * rng.uniform(0.35, 0.6)))
+    img = np.full((h, w, 3), rng.randint(40, 160), np.uint8)
+    pw, ph = int(w * 0.7), max(2, int(h * 0.35))
+    x, y = (w - pw) // 2, int(h * 0.5)
+    cv2.rectangle(img, (x, y), (x + pw, y + ph), (235, 235, 235), -1)
+    plate = '{}{:02d}{}{:04d}'.format(rng.choice(['TN', 'KA', 'MH', 'DL']), rng.randint(1, 99),
+                                      rng.choice(['A', 'AB', 'CZ']), rng.randint(0, 9999))
+    cv2.putText(img, plate, (x + 2, y + int(ph * 0.8)), cv2.FONT_HERSHEY_SIMPLEX, pw / 300,
+                (20, 20, 20), max(1, pw // 150))
+    contrast = rng.uniform(c_lo, c_hi)
+    noise = np.random.default_rng(rng.randrange(1 << 30)).normal(0, 3, img.shape)
+    img = np.clip((img.astype(np.float32) - 128) * contrast + 128 + noise, 0, 255).astype(np.uint8)
+    sigma = rng.uniform(s_lo, s_hi)
+    return cv2.GaussianBlur(img, (0, 0), sigma) if sigma > 0.3 else img
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--crops', type=int, default=2000)
+    parser.add_argument('--ocr', action='store_true', help='Also run the OCR model on the kept crops')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    names = list(KINDS)
+    crops = [(kind, make_crop(rng, kind)) for kind in (rng.choice(names) for _ in range(args.crops))]
+
+    start = time.perf_counter()
+    for _, crop in crops:
+        legacy_preprocess(crop)
+    legacy_ms = (time.perf_counter() - start) * 1000 / len(crops)
+
+    per_kind = {kind: Counter() for kind in names}
+    kept = []
+    start = time.perf_counter()
+    for kind, crop in crops:
+        gray, quality = util.assess_crop(crop)
+        if quality['reject']:
+            per_kind[kind][quality['reject']] += 1
+            continue
+        chain = util.choose_chain(quality)
+        kept.append(util.apply_chain(gray, chain))
+        per_kind[kind][chain] += 1
+    new_ms = (time.perf_counter() - start) * 1000 / len(crops)
+
+    print(f"{'kind':<8} {'crops':>6}  outcome")
+    for kind in names:
+        counts = per_kind[kind]
+        print(f"{kind:<8} {sum(counts.values()):>6}  {dict(counts)}  {'(hopeless)' if KINDS[kind][3] else ''}")
+    saved = len(crops) - len(kept)
+    lost = sum(sum(v for k, v in per_kind[kind].items() if k not in ('plain', 'clahe', 'full'))
+               for kind in names if not KINDS[kind][3])
+    print(f"OCR calls: {len(kept)} of {len(crops)} ({saved} saved, {lost} readable crops rejected)")
+    print(f"Preprocessing: original {legacy_ms:.3f} ms/crop, gated {new_ms:.3f} ms/crop "
+          f"({legacy_ms / new_ms:.1f}x)")
+
+    if args.ocr:
+        import runtime
+
+        reader = runtime.get_plate_reader()
+        start = time.perf_counter()
+        for image in kept[:200]:
+            reader.readtext(image, allowlist=runtime.OCR_ALLOWLIST)
+        ocr_ms = (time.perf_counter() - start) * 1000 / max(1, min(200, len(kept)))
+        print(f"OCR: {ocr_ms:.1f} ms/call, ~{saved * ocr_ms / 1000:.1f} s saved on this set")
+
+
+if __name__ == '__main__':
+    main()
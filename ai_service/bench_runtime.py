@@ -0,0 +1,161 @@
+"""
+Accuracy parity and latency: ONNX Runtime backend vs the PyTorch path.
+
+Usage:
+    python bench_runtime.py --video uploads/sample.mp4 [--frames 50]
+
+Detections from the PyTorch detector are the reference. An ONNX box matches
+when it has the same class and IoU >= 0.5. Plate parity compares the text both
+recognisers read from the same plate-zone crops. Exits non-zero when parity is
+below --min-recall / --min-ocr-agreement so it can gate a model export.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import runtime
+from tracker import iou_matrix
+
+CLASSES = [0, 2, 3, 5, 7]
+
+
+def sample_frames(video_path, count, width=640):
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    wanted = set(np.linspace(0, total - 1, num=min(count, total), dtype=int).tolist())
+    frames = []
+    idx = 0
+    while len(frames) < len(wanted):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if idx in wanted:
+            h, w = frame.shape[:2]
+            if w > width:
+                frame = cv2.resize(frame, (width, int(h * width / w)))
+            frames.append(frame)
+        idx += 1
+    cap.release()
+    return frames
+
+
+def plate_zones(frame, dets):
+    crops = []
+    for (x1, y1, x2, y2), cls in zip(dets.xyxy.astype(int), dets.cls):
+        if cls == 0:
+            continue
+        ratio = 0.60 if cls == 3 else 0.40
+        zone = frame[max(0, y1 + int((1 - ratio) * (y2 - y1))):max(0, y2), max(0, x1):max(0, x2)]
+        if zone.size > 0:
+            crops.append(zone)
+    return crops
+
+
+def match_detections(ref, cand, iou_threshold=0.5):
+    if len(ref) == 0 or len(cand) == 0:
+        return 0, []
+    iou = iou_matrix(ref.xyxy, cand.xyxy)
+    iou[ref.cls[:, None] != cand.cls[None, :]] = 0
+    matched, ious = 0, []
+    used = set()
+    for r in range(len(ref)):
+        c = int(iou[r].argmax())
+        if iou[r, c] >= iou_threshold and c not in used:
+            used.add(c)
+            matched += 1
+            ious.append(float(iou[r, c]))
+    return matched, ious
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, (time.perf_counter() - start) * 1000
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    return f"mean {values.mean():7.2f} ms | p50 {np.percentile(values, 50):7.2f} | p95 {np.percentile(values, 95):7.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', help='Video to sample (default: first file in uploads/)')
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--min-recall', type=float, default=0.95)
+    parser.add_argument('--min-ocr-agreement', type=float, default=0.90)
+    args = parser.parse_args()
+
+    video = args.video
+    if not video:
+        uploads = sorted(os.listdir('uploads')) if os.path.isdir('uploads') else []
+        if not uploads:
+            sys.exit("No video given and uploads/ is empty")
+        video = os.path.join('uploads', uploads[0])
+
+    frames = sample_frames(video, args.frames)
+    print(f"Sampled {len(frames)} frames from {video}")
+
+    torch_det, onnx_det = runtime.load_detector('torch'), runtime.load_detector('onnx')
+    torch_ocr, onnx_ocr = runtime.load_plate_reader('torch'), runtime.load_plate_reader('onnx')
+    if onnx_det.backend != 'onnx' or getattr(onnx_ocr, 'backend', None) != 'onnx':
+        sys.exit("ONNX models not available - run export_models.py first")
+
+    # Warm up both paths so first-call overheads don't skew latency
+    for det in (torch_det, onnx_det):
+        det.predict(frames[:1], classes=CLASSES)
+
+    lat = {'torch_det': [], 'onnx_det': [], 'torch_ocr': [], 'onnx_ocr': []}
+    ref_total, matched_total, cand_total, all_ious = 0, 0, 0, []
+    ocr_total, ocr_agree = 0, 0
+
+    for frame in frames:
+        ref, t = timed(torch_det.predict, [frame], classes=CLASSES)
+        lat['torch_det'].append(t)
+        cand, t = timed(onnx_det.predict, [frame], classes=CLASSES)
+        lat['onnx_det'].append(t)
+        ref, cand = ref[0], cand[0]
+
+        matched, ious = match_detections(ref, cand)
+        ref_total += len(ref)
+        cand_total += len(cand)
+        matched_total += matched
+        all_ious.extend(ious)
+
+        for crop in plate_zones(frame, ref):
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+            a, t = timed(torch_ocr.readtext, gray, allowlist=runtime.OCR_ALLOWLIST)
+            lat['torch_ocr'].append(t)
+            b, t = timed(onnx_ocr.readtext, gray, allowlist=runtime.OCR_ALLOWLIST)
+            lat['onnx_ocr'].append(t)
+            best_a = max(a, key=lambda d: d[2])[1] if a else ''
+            best_b = max(b, key=lambda d: d[2])[1] if b else ''
+            ocr_total += 1
+            ocr_agree += int(best_a == best_b)
+
+    recall = matched_total / ref_total if ref_total else 1.0
+    precision = matched_total / cand_total if cand_total else 1.0
+    agreement = ocr_agree / ocr_total if ocr_total else 1.0
+
+    print("\n--- Parity (ONNX vs PyTorch reference) ---")
+    print(f"Detection recall    {recall:.3f}  ({matched_total}/{ref_total})")
+    print(f"Detection precision {precision:.3f}  ({matched_total}/{cand_total})")
+    print(f"Mean matched IoU    {np.mean(all_ious) if all_ious else 0:.3f}")
+    print(f"OCR text agreement  {agreement:.3f}  ({ocr_agree}/{ocr_total})")
+
+    print("\n--- Latency ---")
+    for key, values in lat.items():
+        if values:
+            print(f"{key:<10} {percentiles(values)}")
+
+    if recall < args.min_recall or agreement < args.min_ocr_agreement:
+        sys.exit("Parity check FAILED")
+    print("\nParity check passed")
+
+
+if __name__ == '__main__':
+    main()
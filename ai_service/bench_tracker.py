@@ -0,0 +1,206 @@
+"""
+Tracker overhead and identity quality: the per-stream trackers of
+tracker.py against the one behind the detector's built-in tracking.
+
+Usage:
+    python bench_tracker.py [--frames 3000 --vehicles 150 --skip 3] [--miss 0.1 --low 0.15 --false 0.5]
+
+Detections come from a bench_pipeline.Scene without rendering: ground-truth
+boxes with jitter, randomly missed ones, some scored low (occluded), plus
+low-score false positives. Each tracker sees the same frames, filtered to
+the confidence it asks the detector for (min_conf).
+
+- ultralytics-byte is ultralytics' BYTETracker with its default
+  bytetrack.yaml, i.e. the association model.track(persist=True) runs after
+  inference (only when ultralytics is installed). The built-in path
+  additionally converts the results to and from torch tensors.
+- Identity: id switches (a ground-truth track changing id between frames),
+  ids per ground-truth track, ids covering more than one ground-truth track,
+  and the share of true detections that got an id, for vehicles only. The
+  synthetic riders sit side by side on one bike, closer together than the
+  bike moves between processed frames; they are tracked but not scored.
+- Isolation: two streams interleaved through one shared tracker (what
+  model.track(persist=True) on the shared detector does with two cameras)
+  versus one tracker per stream.
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from bench_pipeline import Scene
+from runtime import Detections
+from tracker import ByteTracker, IouTracker
+
+
+def synthetic_stream(scene, skip, seed, jitter=0.02, miss=0.1, low=0.15, false=0.5):
+    """
+    [(Detections, ground-truth ids)] for every skip-th frame; ids are the
+    Scene's (riders negative), 0 for false positives.
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for t in range(skip - 1, scene.frames, skip):
+        objects = [o for o in scene.objects_at(t) if rng.random() >= miss]
+        boxes = np.array([box for _, _, box in objects], np.float32).reshape(-1, 4)
+        size = np.tile(boxes[:, 2:] - boxes[:, :2], 2)
+        boxes = boxes + rng.normal(0, jitter, boxes.shape).astype(np.float32) * size
+        conf = np.where(rng.random(len(objects)) < low, rng.uniform(0.1, 0.25, len(objects)),
+                        rng.uniform(0.4, 0.95, len(objects)))
+        cls = [c for _, c, _ in objects]
+        truth = [obj_id for obj_id, _, _ in objects]
+        for _ in range(rng.poisson(false)):
+            x, y = rng.uniform(0, scene.width - 60), rng.uniform(0, scene.height - 40)
+            boxes = np.vstack([boxes, np.array([[x, y, x + 60, y + 40]], np.float32)])
+            conf = np.append(conf, rng.uniform(0.1, 0.3))
+            cls.append(int(rng.choice([2, 3])))
+            truth.append(0)
+        frames.append((Detections(boxes, conf.astype(np.float32), np.array(cls, np.int64)), np.array(truth)))
+    return frames
+
+
+def above(dets, min_conf):
+    keep = dets.conf >= min_conf
+    return Detections(dets.xyxy[keep], dets.conf[keep], dets.cls[keep]), keep
+
+
+class Local:
+    """A tracker.py tracker: update() returns the kept detections with their ids."""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.min_conf = tracker.min_conf
+
+    def update(self, dets):
+        """(indices into dets, ids)"""
+        out = self.tracker.update(dets)
+        rows = {row.tobytes(): i for i, row in enumerate(dets.xyxy)}
+        return np.array([rows[row.tobytes()] for row in out.xyxy], np.int64), out.ids
+
+
+class UltralyticsByte:
+    """ultralytics.trackers.BYTETracker fed numpy arrays."""
+    min_conf = 0.1  # model.track predicts with conf=0.1 unless told otherwise
+
+    def __init__(self):
+        from ultralytics.trackers.byte_tracker import BYTETracker
+        from ultralytics.utils import IterableSimpleNamespace
+        from ultralytics.utils.checks import check_yaml
+        try:
+            from ultralytics.utils import YAML
+            cfg = YAML.load(check_yaml('bytetrack.yaml'))
+        except ImportError:
+            from ultralytics.utils import yaml_load
+            cfg = yaml_load(check_yaml('bytetrack.yaml'))
+        self.tracker = BYTETracker(IterableSimpleNamespace(**cfg), frame_rate=30)
+
+    def update(self, dets):
+        results = SimpleNamespace(conf=dets.conf, cls=dets.cls, xyxy=dets.xyxy, xywh=dets.xywh)
+        out = self.tracker.update(results)
+        if not len(out):
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        return out[:, -1].astype(np.int64), out[:, 4].astype(np.int64)
+
+
+def run(tracker, frames):
+    """Per-update seconds and the (truth id, track id) pairs of every frame."""
+    times, assigned = [], []
+    for dets, truth in frames:
+        dets, keep = above(dets, tracker.min_conf)
+        start = time.perf_counter()
+        index, ids = tracker.update(dets)
+        times.append(time.perf_counter() - start)
+        assigned.append(list(zip(truth[keep][index].tolist(), ids.tolist())))
+    return np.array(times), assigned
+
+
+def identity(frames, assigned):
+    """Identity scores of one run (see the module docstring)."""
+    history, truths_of = {}, {}
+    for pairs in assigned:
+        for truth, track_id in pairs:
+            if truth > 0:
+                history.setdefault(truth, []).append(track_id)
+            truths_of.setdefault(track_id, set()).add(truth)
+    true_dets = sum(int((truth > 0).sum()) for _, truth in frames)
+    switches = sum(int(np.count_nonzero(np.diff(ids))) for ids in history.values())
+    return {
+        'truth_tracks': len(history),
+        'id_switches': switches,
+        'ids_per_track': round(float(np.mean([len(set(ids)) for ids in history.values()])), 2) if history else 0.0,
+        'merged_ids': sum(1 for truths in truths_of.values() if sum(1 for t in truths if t > 0) > 1),
+        'false_tracks': sum(1 for truths in truths_of.values() if truths == {0}),
+        'coverage': round(sum(len(ids) for ids in history.values()) / max(1, true_dets), 3),
+    }
+
+
+def report(name, frames, make):
+    try:
+        tracker = make()
+    except Exception as e:  # ultralytics missing or an incompatible version
+        print(f"  {name:<17} unavailable ({type(e).__name__}: {e})")
+        return
+    times, assigned = run(tracker, frames)
+    us = times * 1e6
+    dets = sum(len(above(d, tracker.min_conf)[0]) for d, _ in frames)
+    scores = identity(frames, assigned)
+    print(f"  {name:<17} {us.mean():7.1f} us/frame (p99 {np.percentile(us, 99):7.1f}), "
+          f"{times.sum() * 1e6 / max(1, dets):5.2f} us/det | "
+          f"switches {scores['id_switches']:4d}, ids/track {scores['ids_per_track']:.2f}, "
+          f"merged {scores['merged_ids']:3d}, false tracks {scores['false_tracks']:3d}, "
+          f"coverage {scores['coverage']:.3f}")
+
+
+def isolation(scene_a, scene_b, args):
+    """Identity of two interleaved streams: one shared ByteTracker vs one per stream."""
+    a = synthetic_stream(scene_a, args.skip, 10, args.jitter, args.miss, args.low, args.false)
+    b = synthetic_stream(scene_b, args.skip, 11, args.jitter, args.miss, args.low, args.false)
+    shared = Local(ByteTracker())
+    per_stream = [Local(ByteTracker()), Local(ByteTracker())]
+    for mode in ('shared', 'per-stream'):
+        assigned = ([], [])
+        for frame_a, frame_b in zip(a, b):
+            for stream, (dets, truth) in enumerate((frame_a, frame_b)):
+                tracker = shared if mode == 'shared' else per_stream[stream]
+                dets, keep = above(dets, tracker.min_conf)
+                index, ids = tracker.update(dets)
+                # Keep the streams' ground-truth ids apart
+                assigned[stream].append([(truth_id * 2 + stream if truth_id else 0, track_id)
+                                         for truth_id, track_id in zip(truth[keep][index].tolist(), ids.tolist())])
+        merged = [(dets, np.where(truth != 0, truth * 2 + stream, 0))
+                  for stream, frames in enumerate((a, b)) for dets, truth in frames]
+        if mode == 'per-stream':  # ids are only unique within a stream
+            assigned = (assigned[0], [[(truth_id, -track_id) for truth_id, track_id in pairs] for pairs in assigned[1]])
+        scores = identity(merged, assigned[0] + assigned[1])
+        print(f"  {mode:<10} switches {scores['id_switches']:4d}, ids/track {scores['ids_per_track']:.2f}, "
+              f"merged {scores['merged_ids']:3d}, coverage {scores['coverage']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tracker overhead and identity quality')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--frames', type=int, default=3000, help='Source frames')
+    parser.add_argument('--vehicles', type=int, default=150)
+    parser.add_argument('--skip', type=int, default=3, help='Track every N-th frame')
+    parser.add_argument('--jitter', type=float, default=0.02, help='Box noise, fraction of the box size')
+    parser.add_argument('--miss', type=float, default=0.1, help='Share of boxes not detected')
+    parser.add_argument('--low', type=float, default=0.15, help='Share of boxes scored 0.1-0.25')
+    parser.add_argument('--false', type=float, default=0.5, help='Low-score false positives per frame')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    scene = Scene(args.width, args.height, args.frames, args.vehicles, seed=args.seed)
+    frames = synthetic_stream(scene, args.skip, args.seed, args.jitter, args.miss, args.low, args.false)
+    print(f"{len(frames)} frames (every {args.skip}), {sum(len(d) for d, _ in frames) / len(frames):.1f} detections/frame")
+    report('iou', frames, lambda: Local(IouTracker()))
+    report('byte', frames, lambda: Local(ByteTracker()))
+    report('ultralytics-byte', frames, UltralyticsByte)
+
+    print("Two streams through one detector:")
+    isolation(scene, Scene(args.width, args.height, args.frames, args.vehicles, seed=args.seed + 1), args)
+
+
+if __name__ == '__main__':
+    main()
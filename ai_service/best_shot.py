@@ -0,0 +1,174 @@
+"""
+Per-track best-shot selection for plate OCR.
+
+Instead of running OCR on whatever view a track happens to have every 5-10
+frames, every processed frame offers the track's plate-zone crop to a small
+per-track ring of candidates, ranked by
+
+    size x sharpness x frontal-ness
+
+(sharpness from util.assess_crop, frontal-ness from the left/right symmetry
+of the crop: a bumper seen head-on mirrors itself, one seen at an angle does
+not). Crops util would reject anyway are never kept.
+
+OCR then runs only on the top_k candidates, at these moments:
+- maturity: the track has been offered for mature_after frames, so the
+  plate shows up while the vehicle is still on screen;
+- on demand (read_now): the plate is needed before maturity, e.g. for a
+  violation reported on this frame;
+- exit: the track was not seen for lost_after frames (or the video ended),
+  if the maturity read left it without a confident plate; only candidates
+  better than the ones already read are tried.
+
+    selector = BestShotSelector()
+    shots = selector.offer(track_id, frame_count, crop)   # every processed frame; [] until maturity
+    for frame, crop in shots: ...read crop...               # frame: where that crop was cut
+    selector.done(track_id, best_score)
+    for track_id, shots in selector.expired(frame_count): ...   # once per frame: tracks that left
+    for track_id, shots in selector.flush(): ...                # end of video
+"""
+import heapq
+
+import cv2
+import numpy as np
+
+import util
+
+SYMMETRY_WIDTH = 64
+
+
+def frontalness(gray):
+    """1.0 for a left/right symmetric crop, towards 0 for an oblique one."""
+    h, w = gray.shape[:2]
+    small = cv2.resize(gray, (SYMMETRY_WIDTH, max(1, h * SYMMETRY_WIDTH // w)), interpolation=cv2.INTER_AREA)
+    diff = cv2.absdiff(small, cv2.flip(small, 1))
+    return max(0.0, 1.0 - float(np.mean(diff)) / max(float(np.std(small)), 1.0) / 2)
+
+
+def shot_score(gray, quality):
+    size = min(quality['width'], util.OCR_TARGET_WIDTH) * min(quality['height'], util.OCR_TARGET_WIDTH // 2)
+    sharp = min(1.0, quality['sharpness'] / util.OCR_SHARP)
+    return size ** 0.5 * sharp * (0.5 + 0.5 * frontalness(gray))
+
+
+class _Track:
+    __slots__ = ('ring', 'offered', 'last_frame', 'read_floor', 'matured', 'confident', 'read', 'seq')
+
+    def __init__(self, frame):
+        self.ring = []  # min-heap of (score, seq, frame, crop)
+        self.offered = 0
+        self.last_frame = frame
+        self.read_floor = 0.0  # best shot score already sent to OCR
+        self.matured = False
+        self.confident = False
+        self.read = False  # counted in tracks_read
+        self.seq = 0
+
+
+class BestShotSelector:
+    """
+    capacity: candidates kept per track; top_k: crops read per OCR round;
+    mature_after: offers before the maturity read; lost_after: frames
+    without an offer before a track counts as gone; confident: a plate score
+    at or above this needs no exit read.
+    """
+
+    def __init__(self, capacity=5, top_k=2, mature_after=6, lost_after=15, confident=0.8):
+        self.capacity = capacity
+        self.top_k = top_k
+        self.mature_after = mature_after
+        self.lost_after = lost_after
+        self.confident = confident
+        self._tracks = {}
+        self.offered = 0
+        self.kept = 0
+        self.crops_read = 0
+        self.tracks_read = 0
+
+    def offer(self, track_id, frame, crop):
+        """
+        Consider one plate-zone crop (copied only if it enters the ring).
+        Returns the (frame, crop) shots to read now, best first: the top_k
+        once the track matures, otherwise [].
+        """
+        track = self._tracks.get(track_id)
+        if track is None:
+            track = self._tracks[track_id] = _Track(frame)
+        track.last_frame = frame
+        track.offered += 1
+        self.offered += 1
+        if not track.confident and crop.size:
+            self._keep(track, frame, crop)
+        if not track.matured and track.offered >= self.mature_after and track.ring:
+            track.matured = True
+            return self._take(track)
+        return []
+
+    def _keep(self, track, frame, crop):
+        gray, quality = util.assess_crop(crop)
+        if quality['reject']:
+            return
+        score = shot_score(gray, quality)
+        if score <= track.read_floor:
+            return
+        track.seq += 1
+        item = (score, track.seq, frame, crop.copy())
+        if len(track.ring) < self.capacity:
+            heapq.heappush(track.ring, item)
+        elif score > track.ring[0][0]:
+            heapq.heapreplace(track.ring, item)
+        else:
+            return
+        self.kept += 1
+
+    def _take(self, track):
+        best = heapq.nlargest(self.top_k, track.ring)
+        track.ring = []
+        if best:
+            track.read_floor = max(track.read_floor, best[0][0])
+            self.crops_read += len(best)
+            if not track.read:
+                track.read = True
+                self.tracks_read += 1
+        return [(frame, crop) for _, _, frame, crop in best]
+
+    def read_now(self, track_id):
+        """
+        The track's best shots so far, for a plate needed before maturity;
+        [] for unknown or confident tracks and when nothing better than the
+        shots already read has been kept. Counts as the maturity read.
+        """
+        track = self._tracks.get(track_id)
+        if track is None or track.confident or not track.ring:
+            return []
+        track.matured = True
+        return self._take(track)
+
+    def expired(self, frame):
+        """(track_id, shots) for tracks not seen for lost_after frames that still need a read."""
+        out = []
+        for track_id, track in list(self._tracks.items()):
+            if frame - track.last_frame > self.lost_after:
+                del self._tracks[track_id]
+                if not track.confident and track.ring:
+                    out.append((track_id, self._take(track)))
+        return out
+
+    def done(self, track_id, plate_score):
+        """Report the track's best plate score so far; confident tracks stop collecting."""
+        track = self._tracks.get(track_id)
+        if track is not None and plate_score is not None and plate_score >= self.confident:
+            track.confident = True
+            track.ring = []
+
+    def flush(self):
+        """Final reads for every remaining track (end of video)."""
+        out = [(track_id, self._take(track)) for track_id, track in self._tracks.items()
+               if not track.confident and track.ring]
+        self._tracks = {}
+        return out
+
+    def stats(self):
+        tracks = self.tracks_read
+        return {'offered': self.offered, 'kept': self.kept, 'crops_read': self.crops_read, 'tracks_read': tracks,
+                'reads_per_track': round(self.crops_read / tracks, 2) if tracks else 0.0}
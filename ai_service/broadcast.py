@@ -0,0 +1,241 @@
+"""
+One analysis per video, shared by every viewer.
+
+Without this, each browser opening a stream starts its own analysis loop:
+inference runs once per viewer, and since track state lives in the loop,
+every viewer files the same violation reports again.
+
+    hub = BroadcastHub()
+    with hub.subscribe(video_id, lambda: analyze_frames(...)) as sub:
+        while (item := sub.get()) is not None:
+            shared, events = item
+            send(shared.jpeg(quality=70))
+
+The first subscriber for a key starts a producer thread that iterates the
+source; later subscribers attach to it and start at the live position (the
+next published frame). Each subscriber holds only the newest frame, so a slow
+viewer skips frames without slowing the others. When the last subscriber
+leaves, the producer stops and the source generator is closed.
+"""
+import asyncio
+import threading
+
+import cv2
+
+import logs
+import metrics
+
+log = logs.get_logger("broadcast")
+
+
+class SharedFrame:
+    """
+    One published frame plus metadata. Rendered and encoded variants are made
+    on first request and cached, so N viewers asking for the same
+    quality/width cost a single encode.
+    """
+
+    def __init__(self, frame, metadata, render=None):
+        self.frame = frame
+        self.metadata = metadata
+        self._render = render
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def image(self, draw=True):
+        if not draw or self._render is None:
+            return self.frame
+        with self._lock:
+            if 'drawn' not in self._cache:
+                self._cache['drawn'] = self._render(self.frame.copy(), self.metadata)
+            return self._cache['drawn']
+
+    def jpeg(self, quality=95, width=None, draw=True):
+        key = (quality, width, draw)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        image = self.image(draw)
+        with metrics.stage("encode"):
+            if width and 0 < width < image.shape[1]:
+                height = max(1, int(image.shape[0] * width / image.shape[1]))
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        data = buffer.tobytes() if ok else None
+        with self._lock:
+            self._cache[key] = data
+        return data
+
+
+class Subscription:
+    """
+    A viewer's single-slot mailbox. get() blocks (threads), get_async()
+    awaits (asyncio); both return (SharedFrame, events) or None once the
+    stream ended or the subscription was closed. Violation events of frames
+    that were skipped are carried over to the next delivered frame.
+    """
+
+    def __init__(self, channel):
+        self._channel = channel
+        self._cond = threading.Condition()
+        self._item = None
+        self._carried_events = []
+        self._ended = False
+        self._loop = None
+        self._wakeup = None
+        self.dropped = 0
+
+    def _deliver(self, shared):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+                self._carried_events += self._item.metadata.get('events', [])
+            self._item = shared
+            self._cond.notify_all()
+        self._wake_async()
+
+    def _end(self):
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+        self._wake_async()
+
+    def _wake_async(self):
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass  # event loop already closed
+
+    def _take(self):
+        shared, self._item = self._item, None
+        events, self._carried_events = self._carried_events + shared.metadata.get('events', []), []
+        return shared, events
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._item is not None or self._ended, timeout):
+                return None
+            if self._item is None:
+                return None
+            return self._take()
+
+    async def get_async(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            with self._cond:
+                if self._item is not None:
+                    return self._take()
+                if self._ended:
+                    return None
+            await self._wakeup.wait()
+
+    def close(self):
+        if not self._ended:
+            self._end()
+            self._channel.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Channel:
+    def __init__(self, hub, key, source, render):
+        self.hub = hub
+        self.key = key
+        self.render = render
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.frames_published = 0
+        self.thread = threading.Thread(target=self._run, args=(source,), name=f"broadcast-{key}", daemon=True)
+
+    def _run(self, source):
+        try:
+            for frame, metadata in source:
+                if self.stop.is_set():
+                    break
+                shared = SharedFrame(frame, metadata, self.render)
+                with self.lock:
+                    subscribers = list(self.subscribers)
+                for sub in subscribers:
+                    sub._deliver(shared)
+                self.frames_published += 1
+        except Exception as e:
+            log.error("Broadcast %s failed: %s", self.key, e)
+        finally:
+            source.close()
+            self.hub._remove(self)
+            with self.lock:
+                subscribers, self.subscribers = self.subscribers, []
+            for sub in subscribers:
+                sub._end()
+
+    def unsubscribe(self, sub):
+        # Under the hub lock, so no subscribe() attaches between the last viewer leaving and the channel stopping
+        with self.hub._lock:
+            with self.lock:
+                if sub in self.subscribers:
+                    self.subscribers.remove(sub)
+                last = not self.subscribers
+            if last:
+                # Last viewer left: stop the analysis at the next frame boundary
+                self.stop.set()
+                if self.hub._channels.get(self.key) is self:
+                    del self.hub._channels[self.key]
+
+
+class BroadcastHub:
+    """Registry of running channels, keyed by video id (or any hashable key)."""
+
+    def __init__(self, render=None):
+        self.render = render
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key, source_factory):
+        """
+        Attach to the channel for key, starting it with source_factory() (an
+        iterator of (frame, metadata)) if nothing is running for that key yet.
+        """
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None or channel.stop.is_set():
+                channel = _Channel(self, key, source_factory(), self.render)
+                self._channels[key] = channel
+                start = True
+            else:
+                start = False
+            sub = Subscription(channel)
+            with channel.lock:
+                channel.subscribers.append(sub)
+        if start:
+            channel.thread.start()
+        return sub
+
+    def _remove(self, channel):
+        with self._lock:
+            if self._channels.get(channel.key) is channel:
+                del self._channels[channel.key]
+
+    def stats(self):
+        """
+        Per key: subscribers, frames published, frames dropped for slow
+        subscribers, and frames waiting in their mailboxes (queue depth).
+        """
+        with self._lock:
+            channels = list(self._channels.items())
+        out = {}
+        for key, c in channels:
+            with c.lock:
+                subscribers = list(c.subscribers)
+            out[key] = {'subscribers': len(subscribers), 'frames': c.frames_published,
+                        'dropped': sum(s.dropped for s in subscribers),
+                        'pending': sum(s._item is not None for s in subscribers)}
+        return out
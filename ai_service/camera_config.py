@@ -0,0 +1,313 @@
+"""
+Per-camera analysis settings, validated and versioned, applied to running
+streams at the next frame boundary.
+
+The store is one JSON document (CAMERA_CONFIG_PATH, default cameras.json):
+
+    {"version": 4,
+     "cameras": {"default": {"speed_limit": 60},
+                 "junction-3": {"speed_limit": 40, "pixel_scale": 0.03}}}
+
+A camera's settings are FIELDS defaults < "default" < its own entry. Every
+change (PUT /cameras/<id>/config, or an edit of the file, picked up within
+check_interval seconds) is validated as a whole and, if valid, becomes a
+new version; the previous documents are kept in <path>.history.jsonl for
+rollback. An invalid file edit is logged and ignored.
+
+    settings = store.watch(camera_id)
+    config = settings.current          # resolved dict
+    ...per frame: changed = settings.poll()   # new dict, or None
+
+Only analysis parameters live here (frame skipping, resize width, rule
+thresholds, OCR scheduling); nothing that needs the models reloaded.
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+
+import logs
+from signal_rules import check_source
+from tracker import TRACKERS
+
+log = logs.get_logger("camera_config")
+
+DEFAULT_CAMERA = "default"
+
+# name -> (type, default, min, max, description). str settings list their choices
+# as min (None: any text), or give a check(value) raising ValueError; list
+# settings are [] or 4 numbers, each in [min, max].
+FIELDS = {
+    'skip_step': (int, 3, 1, 30, "analyse every N-th frame"),
+    'analysis_width': (int, 640, 160, 3840, "analysis/display frame width (px)"),
+    'tiled': (bool, False, None, None, "tiled full-resolution detection (see tiling.py)"),
+    'tracker': (str, 'byte', TRACKERS, None, "per-stream tracker (see tracker.py)"),
+    'speed_limit': (float, 60.0, 1.0, 300.0, "OVERSPEEDING above this (km/h)"),
+    'pixel_scale': (float, 0.05, 0.001, 10.0, "metres per analysis-frame pixel"),
+    'speed_window': (int, 5, 1, 50, "frames in the speed moving average"),
+    'ocr_mature_after': (int, 6, 1, 300, "processed frames before a track's first plate read"),
+    'ocr_lost_after': (int, 5, 1, 300, "processed frames unseen before a track's exit read"),
+    'ocr_top_k': (int, 2, 1, 10, "crops read per OCR round"),
+    'ocr_confident': (float, 0.8, 0.0, 1.0, "plate score that ends reading a track"),
+    'ocr_min_score': (float, 0.4, 0.0, 1.0, "minimum score of an unformatted plate read"),
+    'stop_line': (list, [], 0.0, 1.0, "stop line [x1, y1, x2, y2], fractions of the frame (see signal_rules.py)"),
+    'signal_source': (str, "", check_source, None,
+                      "signal timeline JSON file under SIGNAL_TIMELINE_DIR or URL in SIGNAL_URL_PREFIXES"),
+    'signal_lamp': (list, [], 0.0, 1.0, "signal lamp ROI [x1, y1, x2, y2], fractions of the frame"),
+}
+
+
+def defaults():
+    return {name: copy.copy(spec[1]) for name, spec in FIELDS.items()}
+
+
+def validate(settings):
+    """
+    Checked and normalised copy of one camera's (partial) settings.
+    Raises ValueError listing every problem.
+    """
+    if not isinstance(settings, dict):
+        raise ValueError("settings must be an object")
+    out, errors = {}, []
+    for name, value in settings.items():
+        spec = FIELDS.get(name)
+        if spec is None:
+            errors.append(f"{name}: unknown setting")
+            continue
+        kind, _, low, high, _ = spec
+        # bool is an int subclass, and JSON has no int/float distinction for whole numbers
+        if kind is bool:
+            ok = isinstance(value, bool)
+        elif kind is str:
+            ok = isinstance(value, str)
+        elif kind is list:
+            ok = isinstance(value, list) and len(value) in (0, 4) and \
+                all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+        elif kind is int:
+            ok = isinstance(value, int) and not isinstance(value, bool)
+        else:
+            ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if not ok:
+            expected = "[] or [x1, y1, x2, y2]" if kind is list else kind.__name__
+            errors.append(f"{name}: expected {expected}, got {value!r}")
+            continue
+        if kind is list:
+            value = [float(v) for v in value]
+            if not all(low <= v <= high for v in value):
+                errors.append(f"{name}: values outside [{low}, {high}]")
+                continue
+        elif kind is str:
+            if callable(low):
+                try:
+                    low(value)
+                except ValueError as e:
+                    errors.append(f"{name}: {e}")
+                    continue
+            elif low is not None and value not in low:
+                errors.append(f"{name}: {value!r} not one of {', '.join(low)}")
+                continue
+        else:
+            value = kind(value)
+            if low is not None and not low <= value <= high:
+                errors.append(f"{name}: {value} outside [{low}, {high}]")
+                continue
+        out[name] = value
+    if errors:
+        raise ValueError("; ".join(errors))
+    return out
+
+
+def validate_document(document):
+    """Checked copy of a whole store document ({"version": n, "cameras": {...}})."""
+    if not isinstance(document, dict) or not isinstance(document.get('cameras', {}), dict):
+        raise ValueError("expected {\"version\": n, \"cameras\": {camera_id: settings}}")
+    cameras, errors = {}, []
+    for camera_id, settings in document.get('cameras', {}).items():
+        try:
+            cameras[str(camera_id)] = validate(settings)
+        except ValueError as e:
+            errors.append(f"{camera_id}: {e}")
+    if errors:
+        raise ValueError("; ".join(errors))
+    version = document.get('version', 0)
+    if not isinstance(version, int) or isinstance(version, bool) or version < 0:
+        raise ValueError(f"version: expected a non-negative int, got {version!r}")
+    return {'version': version, 'cameras': cameras}
+
+
+def fingerprint(config):
+    """Short stable hash of a resolved config (for result-cache keys)."""
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class CameraSettings:
+    """
+    One stream's view of its camera's settings. poll() is cheap enough for
+    every frame: an int comparison, plus a file stat every check_interval.
+    overrides (e.g. a per-stream tiled=True) always win over the store.
+    """
+
+    def __init__(self, store, camera_id, overrides=None):
+        self.store = store
+        self.camera_id = camera_id
+        self.overrides = validate(overrides or {})
+        self.version = store.version
+        self.current = self._resolve()
+        self.changes = 0
+
+    def _resolve(self):
+        return {**self.store.get(self.camera_id), **self.overrides}
+
+    def poll(self):
+        """The new settings if they changed since the last call, else None."""
+        self.store.check()
+        if self.store.version == self.version:
+            return None
+        self.version = self.store.version
+        config = self._resolve()
+        if config == self.current:
+            return None  # another camera changed
+        self.current = config
+        self.changes += 1
+        return config
+
+
+class FixedSettings:
+    """Settings that never change (offline runs, see evaluate.py): FIELDS defaults plus config."""
+    version = 0
+    changes = 0
+
+    def __init__(self, config=None):
+        self.current = {**defaults(), **validate(config or {})}
+
+    def poll(self):
+        return None
+
+
+class CameraConfigStore:
+
+    def __init__(self, path, check_interval=2.0, base=None):
+        """
+        base(camera_id): extra defaults under "default" (e.g. tiled for
+        cameras listed in TILED_CAMERAS).
+        """
+        self.path = path
+        self.history_path = f"{path}.history.jsonl"
+        self.check_interval = check_interval
+        self.base = base
+        self._lock = threading.Lock()
+        self._document = {'version': 0, 'cameras': {}}
+        self._mtime = None
+        self._next_check = 0.0
+        if os.path.exists(path):
+            try:
+                self._load()
+            except (OSError, ValueError) as e:
+                log.error("Ignoring invalid camera config %s: %s", path, e)
+
+    @property
+    def version(self):
+        return self._document['version']
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path) as f:
+            document = validate_document(json.load(f))
+        self._mtime = mtime
+        if document != self._document:
+            # A hand edit need not bump the version; it is a new one all the same
+            document['version'] = max(document['version'], self._document['version'] + 1)
+            self._document = document
+            latest = self.history(1)
+            if not latest or (latest[0]['version'], latest[0]['cameras']) != (document['version'], document['cameras']):
+                self._append_history(document, "file")
+            log.info("Loaded camera config version %s from %s", document['version'], self.path)
+
+    def check(self):
+        """Reload the file if it changed on disk (at most every check_interval seconds)."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            try:
+                self._load()
+            except (OSError, ValueError) as e:
+                self._mtime = mtime  # do not retry until it changes again
+                log.error("Ignoring invalid camera config %s: %s", self.path, e)
+
+    def get(self, camera_id=None):
+        """Resolved settings of a camera."""
+        cameras = self._document['cameras']
+        config = defaults()
+        if self.base:
+            config.update(self.base(camera_id or DEFAULT_CAMERA))
+        config.update(cameras.get(DEFAULT_CAMERA, {}))
+        if camera_id:
+            config.update(cameras.get(camera_id, {}))
+        return config
+
+    def document(self):
+        return copy.deepcopy(self._document)
+
+    def watch(self, camera_id=None, overrides=None):
+        return CameraSettings(self, camera_id, overrides)
+
+    def update(self, camera_id, changes, replace=False, source="api"):
+        """
+        Merge changes into a camera's entry (or replace it, or remove it with
+        replace=True and no changes). Returns the new version; raises
+        ValueError (nothing changed) if the settings are invalid.
+        """
+        changes = validate(changes)
+        with self._lock:
+            document = copy.deepcopy(self._document)
+            cameras = document['cameras']
+            entry = changes if replace else {**cameras.get(camera_id, {}), **changes}
+            if entry:
+                cameras[camera_id] = entry
+            else:
+                cameras.pop(camera_id, None)
+            return self._commit(document, source)
+
+    def rollback(self, version):
+        """Restore the cameras of an earlier version, as a new version."""
+        for entry in self.history():
+            if entry['version'] == version:
+                with self._lock:
+                    return self._commit({'version': self.version, 'cameras': entry['cameras']}, f"rollback:{version}")
+        raise KeyError(version)
+
+    def _commit(self, document, source):
+        document['version'] = self.version + 1
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._append_history(document, source)
+        self._mtime = os.stat(self.path).st_mtime_ns
+        self._document = document
+        log.info("Camera config version %s (%s)", document['version'], source)
+        return document['version']
+
+    def _append_history(self, document, source):
+        with open(self.history_path, 'a') as f:
+            f.write(json.dumps({**document, 'time': time.time(), 'source': source}, sort_keys=True) + "\n")
+
+    def history(self, limit=None):
+        """Committed versions, newest first."""
+        try:
+            with open(self.history_path) as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            return []
+        entries.reverse()
+        return entries[:limit] if limit else entries
@@ -0,0 +1,93 @@
+"""
+Cold-start check for the AI service.
+
+Usage:
+    python check_startup.py [--budget 3.0] [--top 15] [--models]
+
+Imports app.py in a fresh interpreter with `-X importtime`, prints the
+slowest modules it imports and fails (exit 1) if importing the app takes
+longer than --budget seconds. Importing must not load models: that is what
+lets /healthz answer while weights load in the background.
+
+--models additionally times runtime.warmup() (model load + first inference)
+so the full cold-start breakdown is visible in one place.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Modules that must never be imported by `import app` alone
+HEAVY_MODULES = ('torch', 'ultralytics', 'easyocr', 'onnxruntime')
+
+
+def profile_import(module):
+    code = (f"import sys, time; t = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - t); print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=HERE, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    stdout = proc.stdout.splitlines()
+    elapsed = float(stdout[-2])
+    heavy = [m for m in stdout[-1].split(',') if m]
+
+    # Lines look like: "import time:   self [us] | cumulative |   package.sub"
+    # Nesting depth is two extra spaces per level; children are printed before
+    # their parent, so the direct imports of `module` are the depth-1 lines
+    # just before its own depth-0 line.
+    children, breakdown = [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative_us), name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                breakdown = children
+            children = []
+    breakdown.sort(reverse=True)
+    return elapsed, heavy, breakdown
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, default=3.0, help='Max seconds for `import app`')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--models', action='store_true', help='Also time model load and warm-up')
+    args = parser.parse_args()
+
+    elapsed, heavy, breakdown = profile_import('app')
+
+    print(f"import app: {elapsed:.3f}s (budget {args.budget:.1f}s)")
+    print("\nSlowest imports made by app.py:")
+    for cumulative_us, name in breakdown[:args.top]:
+        print(f"  {cumulative_us / 1e6:8.3f}s  {name}")
+
+    failed = False
+    if heavy:
+        print(f"\nFAIL: model frameworks imported eagerly: {', '.join(heavy)}")
+        failed = True
+    if elapsed > args.budget:
+        print(f"\nFAIL: import took {elapsed:.3f}s, over the {args.budget:.1f}s budget")
+        failed = True
+
+    if args.models:
+        sys.path.insert(0, HERE)
+        import runtime
+        start = time.perf_counter()
+        runtime.warmup()
+        print(f"\nModel warm-up: {time.perf_counter() - start:.3f}s")
+        for step, seconds in runtime.load_timings.items():
+            print(f"  {step:<22} {seconds:8.3f}s")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
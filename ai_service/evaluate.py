@@ -0,0 +1,431 @@
+"""
+Offline evaluation: run the pipeline over a video with given camera
+settings and score its output against annotated ground truth, next to
+throughput.
+
+Usage:
+    python evaluate.py synth clip.avi [--width 1280 --height 720 --frames 300 --vehicles 24 --seed 0]
+    python evaluate.py run clip.avi clip.truth.json [--set skip_step=2 ...]
+                       [--grid skip_step=1,2,3 --grid analysis_width=480,640]
+                       [--floor violations.f1=0.9 --floor tracks.recall=0.95]
+                       [--detector model|truth] [--ocr model|skip] [--jobs N] [--output results.json]
+
+Ground truth (JSON; boxes in source pixels, frames 1-based as in the
+stream metadata):
+
+    {"video": "clip.avi", "width": 1280, "height": 720, "frames": 300, "fps": 30,
+     "tracks": [{"id": 1, "class": "car", "plate": "TN38AB1234",
+                 "boxes": [[frame, x1, y1, x2, y2], ...]}, ...],
+     "violations": [{"id": 1, "type": "OVERSPEEDING"}, ...],
+     "annotated": [frames...]}            # optional, default every frame
+
+Person tracks (riders) are only used by --detector truth. `synth` writes a
+deterministic synthetic clip (see bench_pipeline.Scene) and its truth file.
+
+Scores (precision / recall / f1):
+- detection: vehicle boxes per processed frame, matched at IoU >= 0.5;
+- tracks: a predicted track counts for the ground-truth track it overlaps
+  most; every annotated track should get at least one;
+- plates: the final plate of a ground-truth track's main predicted track;
+- violations: reported events, mapped to ground-truth tracks; a second
+  report of the same violation counts as a false positive.
+Denominators cover every annotated frame, so tracks a coarse skip_step
+never sees count as missed.
+
+Each config runs in a fresh process; --grid sweeps the product of the
+values --jobs at a time and picks the fastest config (source frames/sec)
+that meets every --floor. Parallel runs share the CPU: use --jobs 1 when the
+absolute fps matters.
+"""
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+import camera_config  # noqa: E402
+from tracker import iou_matrix  # noqa: E402
+
+COCO_NAMES = {0: 'person', 2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+CLASS_IDS = {name: cls for cls, name in COCO_NAMES.items()}
+VEHICLES = {'car', 'motorcycle', 'bus', 'truck'}
+
+
+def load_truth(path):
+    with open(path) as f:
+        truth = json.load(f)
+    for track in truth['tracks']:
+        if track['class'] not in CLASS_IDS:
+            raise ValueError(f"track {track['id']}: unknown class {track['class']!r}")
+    return truth
+
+
+def truth_boxes(truth):
+    """frame -> [(track id, class name, (x1, y1, x2, y2))]"""
+    frames = {}
+    for track in truth['tracks']:
+        for frame, *box in track['boxes']:
+            frames.setdefault(int(frame), []).append((track['id'], track['class'], box))
+    return frames
+
+
+class TruthDetector:
+    """
+    Annotated boxes as tracked detections (--detector truth): scores the
+    stages after detection with perfect detection and tracking. With
+    --set tracker=iou|byte the boxes are tracked by that tracker instead, which
+    scores the tracker alone. Frames are counted, so the skip step must not
+    change during the run.
+    """
+    names = COCO_NAMES
+    backend = 'truth'
+
+    def __init__(self, truth, skip_step):
+        self.frames = truth_boxes(truth)
+        self.scale_base = truth['width']
+        self.skip_step = skip_step
+        self.calls = 0
+
+    def track(self, frame, classes=None, **kwargs):
+        return self._detections(frame, classes, tracked=True)
+
+    def predict(self, frames, classes=None, **kwargs):
+        """The same boxes without their ids, for the per-stream trackers."""
+        return [self._detections(frame, classes, tracked=False) for frame in frames]
+
+    def _detections(self, frame, classes, tracked):
+        import runtime
+
+        self.calls += 1
+        objects = [(track_id, CLASS_IDS[name], box) for track_id, name, box in
+                   self.frames.get(self.calls * self.skip_step, ())
+                   if classes is None or CLASS_IDS[name] in classes]
+        if not objects:
+            return runtime.Detections.empty()
+        scale = frame.shape[1] / self.scale_base
+        return runtime.Detections(np.array([box for _, _, box in objects], np.float32) * scale,
+                                  np.full(len(objects), 0.9, np.float32),
+                                  np.array([cls for _, cls, _ in objects], np.int64),
+                                  ids=np.array([track_id for track_id, _, _ in objects], np.int64) if tracked else None)
+
+
+def _prf(tp, fp, fn):
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': round(precision, 4), 'recall': round(recall, 4), 'f1': round(f1, 4),
+            'tp': tp, 'fp': fp, 'fn': fn}
+
+
+def _plate(text):
+    return ''.join(c for c in (text or '').upper() if c.isalnum())
+
+
+def score(truth, frames, iou_threshold=0.5):
+    """
+    frames: per processed frame, its metadata (frame, width, objects,
+    events, optionally plates). Returns the detection / tracks / plates / violations scores.
+    """
+    boxes = truth_boxes(truth)
+    annotated = set(truth.get('annotated') or range(1, truth['frames'] + 1))
+    tracks = {t['id']: t for t in truth['tracks'] if t['class'] in VEHICLES}
+    visible = {track_id for frame in annotated for track_id, _, _ in boxes.get(frame, ())
+               if track_id in tracks}
+
+    # Detection: greedy IoU matching per processed, annotated frame
+    tp = fp = fn = 0
+    overlaps = {}  # (predicted id, truth id) -> matched frames
+    predicted_tracks = set()
+    for metadata in frames:
+        objects = metadata['objects']
+        predicted_tracks.update(obj['id'] for obj in objects)
+        if metadata['frame'] not in annotated:
+            continue
+        scale = metadata['width'] / truth['width']
+        gt = [(track_id, box) for track_id, name, box in boxes.get(metadata['frame'], ()) if name in VEHICLES]
+        iou = iou_matrix(np.array([obj['box'] for obj in objects], np.float32).reshape(-1, 4),
+                         np.array([box for _, box in gt], np.float32).reshape(-1, 4) * scale)
+        pairs = np.argwhere(iou >= iou_threshold)
+        used_pred, used_gt = set(), set()
+        for p, g in pairs[np.argsort(-iou[pairs[:, 0], pairs[:, 1]])]:
+            if p in used_pred or g in used_gt:
+                continue
+            used_pred.add(p)
+            used_gt.add(g)
+            key = (objects[p]['id'], gt[g][0])
+            overlaps[key] = overlaps.get(key, 0) + 1
+        tp += len(used_pred)
+        fp += len(objects) - len(used_pred)
+        fn += len(gt) - len(used_gt)
+    detection = _prf(tp, fp, fn)
+
+    # Tracks: each predicted track stands for the truth track it overlaps most
+    assigned, support = {}, {}
+    for (pred, gt_id), n in overlaps.items():
+        if n > support.get(pred, 0):
+            assigned[pred], support[pred] = gt_id, n
+    covered = set(assigned.values())
+    track_scores = _prf(len(assigned), len(predicted_tracks) - len(assigned), len(visible - covered))
+    track_scores['fragmentation'] = round(len(assigned) / len(covered), 3) if covered else 0.0
+
+    # Plates: final read of the truth track's best-supported predicted track
+    final_plate = {}
+    for metadata in frames:
+        for obj in metadata['objects']:
+            if obj['plate']:
+                final_plate[obj['id']] = obj['plate']
+        for read in metadata.get('plates', ()):  # exit reads, after the track left the scene
+            final_plate[read['id']] = read['plate']
+    main_track = {}
+    for pred, gt_id in assigned.items():
+        if support[pred] > support.get(main_track.get(gt_id), 0):
+            main_track[gt_id] = pred
+    with_plate = {track_id for track_id in visible if tracks[track_id].get('plate')}
+    read = {gt_id: final_plate[pred] for gt_id, pred in main_track.items() if pred in final_plate}
+    correct = sum(1 for gt_id, text in read.items()
+                  if gt_id in with_plate and _plate(text) == _plate(tracks[gt_id]['plate']))
+    plates = _prf(correct, len(read) - correct, len(with_plate) - correct)
+
+    # Violations: events mapped to truth tracks
+    expected = {(v['id'], v['type']) for v in truth.get('violations', []) if v['id'] in visible}
+    found, spurious = set(), []
+    for metadata in frames:
+        for event in metadata['events']:
+            key = (assigned.get(event['id']), event['type'])
+            if key in expected and key not in found:
+                found.add(key)
+            else:
+                spurious.append({'id': event['id'], 'type': event['type'], 'frame': metadata['frame']})
+    violations = _prf(len(found), len(spurious), len(expected - found))
+    violations['missed'] = [{'id': track_id, 'type': v_type} for track_id, v_type in sorted(expected - found)]
+    violations['spurious'] = spurious
+    return {'detection': detection, 'tracks': track_scores, 'plates': plates, 'violations': violations}
+
+
+def evaluate_config(video, truth_path, config, detector='model', ocr='model'):
+    """Run one config through the pipeline (call in a fresh process) and score it."""
+    import metrics
+    import runtime
+    import util
+    from bench_pipeline import BlankReader
+    from pipeline import (Pipeline, VideoSource, ResizeStage, DetectStage, SpeedStage, RulesStage, SignalStage,
+                          PlateStage, ViolationStage)
+
+    truth = load_truth(truth_path)
+    if detector == 'truth':
+        config = {'tracker': 'detector', **config}  # the annotated ids, unless a tracker is asked for
+    settings = camera_config.FixedSettings(config)
+    if detector == 'truth':
+        runtime._detector = TruthDetector(truth, settings.current['skip_step'])
+    if ocr == 'skip':
+        runtime._plate_reader = BlankReader()
+    # Model loading is not part of the throughput
+    model = runtime.get_detector()
+    if ocr == 'model':
+        runtime.get_plate_reader()
+
+    pipeline = Pipeline(VideoSource(video), [ResizeStage(), DetectStage(model), SpeedStage(), RulesStage(), SignalStage(),
+                                             PlateStage(), ViolationStage()], settings=settings)
+    frames = []
+    start = time.perf_counter()
+    for ctx in pipeline.run():
+        metadata = ctx.metadata()
+        frames.append({'frame': metadata['frame'], 'width': metadata['width'],
+                       'objects': metadata['objects'], 'events': metadata['events'],
+                       'plates': metadata.get('plates', [])})
+    wall = time.perf_counter() - start
+    stream = pipeline.stream
+    if not frames:
+        raise RuntimeError(f"no frames analysed from {video}")
+
+    result = {'config': config, 'settings': settings.current, 'detector': detector, 'ocr_mode': ocr}
+    result['throughput'] = {
+        'frames_source': stream.position, 'frames_processed': len(frames), 'wall_s': round(wall, 3),
+        'fps_source': round(stream.position / wall, 2), 'fps_processed': round(len(frames) / wall, 2),
+        'realtime_x': round(stream.position / stream.fps / wall, 2),
+        'ocr_calls': util.OCR_STATS.snapshot()['ocr_calls'],
+        'stage_ms': {key[0]: round(float(np.sum(values)) * 1000 / len(frames), 3)
+                     for key, values in sorted((metrics.STAGE_SECONDS.raw or {}).items())},
+    }
+    result.update(score(truth, frames))
+    return result
+
+
+def _child(video, truth_path, config, detector, ocr):
+    import metrics
+    metrics.STAGE_SECONDS.record_samples()  # per-stage cost per frame in the result
+    try:
+        return evaluate_config(video, truth_path, config, detector, ocr)
+    except Exception as e:
+        return {'config': config, 'error': f"{type(e).__name__}: {e}"}
+
+
+def flatten(result, prefix=''):
+    """{'violations': {'f1': 0.9}} -> {'violations.f1': 0.9} (numbers only)."""
+    out = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[f"{prefix}{key}"] = value
+    return out
+
+
+def parse_value(name, text):
+    if name not in camera_config.FIELDS:
+        raise argparse.ArgumentTypeError(f"unknown setting {name} (one of {', '.join(camera_config.FIELDS)})")
+    kind = camera_config.FIELDS[name][0]
+    if kind is list:  # x1:y1:x2:y2, as commas separate --grid values
+        return [float(v) for v in text.split(':')] if text else []
+    if kind is bool:
+        return text.lower() in ('1', 'true', 'yes', 'on')
+    return kind(text)
+
+
+def parse_assignment(text):
+    name, _, value = text.partition('=')
+    if not value:
+        raise argparse.ArgumentTypeError(f"expected name=value, got {text!r}")
+    return name.strip(), value.strip()
+
+
+def sweep(video, truth_path, base, grid, detector, ocr, jobs):
+    """Results of every combination of the grid values on top of base, in grid order."""
+    names = list(grid)
+    configs = [{**base, **dict(zip(names, values))} for values in itertools.product(*grid.values())]
+    for config in configs:
+        camera_config.validate(config)  # fail before starting any process
+    # A fresh interpreter per config: no model, tracker, metric or OCR state carried over
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, jobs), mp_context=context,
+                                                max_tasks_per_child=1) as pool:
+        futures = [pool.submit(_child, video, truth_path, config, detector, ocr) for config in configs]
+        for config, future in zip(configs, futures):
+            result = future.result()
+            print(summary(result), flush=True)
+            yield result
+
+
+def summary(result):
+    label = ' '.join(f"{k}={v}" for k, v in result['config'].items()) or 'defaults'
+    if 'error' in result:
+        return f"  {label}: failed: {result['error']}"
+    t = result['throughput']
+    return (f"  {label}: {t['fps_source']} fps ({t['realtime_x']}x realtime), "
+            f"det P/R {result['detection']['precision']:.2f}/{result['detection']['recall']:.2f}, "
+            f"tracks P/R {result['tracks']['precision']:.2f}/{result['tracks']['recall']:.2f}, "
+            f"plates P/R {result['plates']['precision']:.2f}/{result['plates']['recall']:.2f}, "
+            f"violations P/R {result['violations']['precision']:.2f}/{result['violations']['recall']:.2f}, "
+            f"OCR calls {t['ocr_calls']}")
+
+
+def fastest(results, floors):
+    """The result with the highest source fps among those meeting every floor (or None)."""
+    passing = [r for r in results if 'error' not in r
+               and all(flatten(r).get(metric, float('-inf')) >= value for metric, value in floors.items())]
+    return max(passing, key=lambda r: r['throughput']['fps_source'], default=None)
+
+
+def synthesize_truth(path, width, height, frames, vehicles, seed):
+    """Synthetic clip (bench_pipeline.Scene) plus its ground truth; returns the truth path."""
+    from bench_pipeline import FPS, Scene, synthesize
+
+    scene = Scene(width, height, frames, vehicles, seed=seed)
+    synthesize(scene, path)
+    tracks = {}
+    for t in range(frames):
+        for obj_id, cls, (x1, y1, x2, y2) in scene.objects_at(t):
+            # Annotations cover the visible part of the object
+            x1, x2 = max(0.0, x1), min(float(width), x2)
+            if x2 - x1 < 1:
+                continue
+            track_id = obj_id if obj_id > 0 else 1000 - obj_id  # riders: 1000 + vehicle id * 10 + seat
+            track = tracks.setdefault(track_id, {'id': track_id, 'class': COCO_NAMES[cls], 'boxes': []})
+            track['boxes'].append([t + 1, round(x1, 1), round(y1, 1), round(x2, 1), round(y2, 1)])
+    violations = []
+    for v in scene.vehicles:
+        if v['id'] not in tracks:
+            continue
+        tracks[v['id']]['plate'] = v['plate']
+        # Scene speeds: 13-16 px/frame at 640 px for speeders, 3-8 for the rest
+        if v['cls'] != 3 and abs(v['speed']) * 640 / width > 10:
+            violations.append({'id': v['id'], 'type': 'OVERSPEEDING'})
+        if v['riders'] >= 3:
+            violations.append({'id': v['id'], 'type': 'TRIPLE RIDING'})
+        if v['riders']:
+            # No helmets are drawn
+            violations.append({'id': v['id'], 'type': 'NO HELMET'})
+    truth_path = os.path.splitext(path)[0] + '.truth.json'
+    with open(truth_path, 'w') as f:
+        json.dump({'video': os.path.basename(path), 'width': width, 'height': height, 'frames': frames, 'fps': FPS,
+                   'tracks': sorted(tracks.values(), key=lambda t: t['id']), 'violations': violations}, f)
+    return truth_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score the pipeline against ground truth, next to throughput')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    synth = commands.add_parser('synth', help='Write a synthetic clip and its ground truth')
+    synth.add_argument('video')
+    synth.add_argument('--width', type=int, default=1280)
+    synth.add_argument('--height', type=int, default=720)
+    synth.add_argument('--frames', type=int, default=300)
+    synth.add_argument('--vehicles', type=int, default=24)
+    synth.add_argument('--seed', type=int, default=0)
+
+    run = commands.add_parser('run', help='Evaluate one config or sweep a grid')
+    run.add_argument('video')
+    run.add_argument('truth')
+    run.add_argument('--set', type=parse_assignment, action='append', default=[], metavar='NAME=VALUE',
+                     help='Camera setting for every run (see camera_config.FIELDS)')
+    run.add_argument('--grid', type=parse_assignment, action='append', default=[], metavar='NAME=V1,V2',
+                     help='Setting to sweep')
+    run.add_argument('--floor', type=parse_assignment, action='append', default=[], metavar='METRIC=VALUE',
+                     help='Minimum score for a config to qualify, e.g. violations.f1=0.9')
+    run.add_argument('--detector', choices=['model', 'truth'], default='model')
+    run.add_argument('--ocr', choices=['model', 'skip'], default='model')
+    run.add_argument('--jobs', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    run.add_argument('--output', default=f"evaluate_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    args = parser.parse_args()
+
+    if args.command == 'synth':
+        truth_path = synthesize_truth(os.path.abspath(args.video), args.width, args.height, args.frames,
+                                      args.vehicles, args.seed)
+        print(f"Wrote {args.video} and {truth_path}")
+        return
+
+    try:
+        base = {name: parse_value(name, value) for name, value in args.set}
+        grid = {name: [parse_value(name, v) for v in values.split(',')] for name, values in args.grid}
+        floors = {metric: float(value) for metric, value in args.floor}
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+
+    video, truth_path = os.path.abspath(args.video), os.path.abspath(args.truth)
+    results = list(sweep(video, truth_path, base, grid, args.detector, args.ocr, args.jobs))
+    best = fastest(results, floors)
+    if floors:
+        floor_text = ', '.join(f"{metric} >= {value}" for metric, value in floors.items())
+        if best:
+            print(f"Fastest config with {floor_text}: {best['config'] or 'defaults'} ({best['throughput']['fps_source']} fps)")
+        else:
+            print(f"No config reaches {floor_text}")
+    with open(args.output, 'w') as f:
+        json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'video': video, 'truth': truth_path,
+                   'detector': args.detector, 'ocr': args.ocr, 'jobs': args.jobs, 'floors': floors,
+                   'best': best['config'] if best else None, 'results': results}, f, indent=2)
+    print(f"Saved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
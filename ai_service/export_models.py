@@ -0,0 +1,71 @@
+"""
+Export the vehicle detector and the plate recogniser to ONNX for MODEL_BACKEND=onnx.
+
+Usage:
+    python export_models.py [--imgsz 640] [--static-batch]
+
+Writes into MODELS_DIR:
+    yolov8n.onnx              - YOLOv8n detector (dynamic batch by default)
+    plate_recognizer.onnx     - EasyOCR english_g2 CRNN recogniser
+    plate_recognizer.json     - character set / input height for decoding
+
+The same ONNX files run on OpenVINO through ONNX Runtime's OpenVINO execution
+provider (ORT_PROVIDER=openvino), so no separate OpenVINO IR export is needed.
+This script needs the full PyTorch stack; the service running the exports does not.
+"""
+import argparse
+import json
+import os
+import shutil
+
+from runtime import DETECTOR_ONNX, DETECTOR_WEIGHTS, MODELS_DIR, RECOGNIZER_META, RECOGNIZER_ONNX
+
+
+def export_detector(imgsz, dynamic):
+    from ultralytics import YOLO
+
+    model = YOLO(DETECTOR_WEIGHTS)
+    exported = model.export(format='onnx', imgsz=imgsz, dynamic=dynamic, simplify=True, opset=12)
+    shutil.move(exported, DETECTOR_ONNX)
+    print(f"Detector exported to {DETECTOR_ONNX}")
+
+
+def export_recognizer():
+    import easyocr
+    import torch
+
+    reader = easyocr.Reader(['en'], gpu=False)
+    recognizer = reader.recognizer.eval()
+
+    class _Recognizer(torch.nn.Module):
+        # easyocr's forward(input, text) ignores text for CTC models
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, image):
+            return self.model(image, None)
+
+    dummy = torch.zeros(1, 1, 64, 256)
+    torch.onnx.export(_Recognizer(recognizer), dummy, RECOGNIZER_ONNX,
+                      input_names=['image'], output_names=['logits'],
+                      dynamic_axes={'image': {0: 'batch', 3: 'width'}, 'logits': {0: 'batch', 1: 'steps'}},
+                      opset_version=12)
+    with open(RECOGNIZER_META, 'w') as f:
+        json.dump({'characters': reader.character, 'imgH': 64}, f)
+    print(f"Recogniser exported to {RECOGNIZER_ONNX}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--static-batch', action='store_true', help='Fixed batch of 1 (some accelerators need it)')
+    parser.add_argument('--skip-detector', action='store_true')
+    parser.add_argument('--skip-recognizer', action='store_true')
+    args = parser.parse_args()
+
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    if not args.skip_detector:
+        export_detector(args.imgsz, dynamic=not args.static_batch)
+    if not args.skip_recognizer:
+        export_recognizer()
@@ -0,0 +1,167 @@
+import multiprocessing as mp
+import os
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedFrameRing:
+    """
+    Fixed-size ring of frames living in multiprocessing.shared_memory.
+
+    Frames never travel through a pipe: the producer decodes straight into a
+    free slot, and only the slot index (plus a small metadata object) is sent
+    over a queue. Each slot carries a reference count so the same frame can be
+    handed to several consumers; the slot goes back to the free list when the
+    last holder releases it.
+
+    Typical use:
+        ring = SharedFrameRing(slots=8, shape=(1080, 1920, 3))
+        # producer
+        slot = ring.acquire()
+        ok, _ = cap.read(image=ring.view(slot))   # decode in place, no copy
+        ring.publish(slot, meta={'frame': n})
+        # consumer (any process the ring was passed to)
+        slot, meta = ring.get()
+        frame = ring.view(slot)
+        ...
+        ring.release(slot)
+    """
+
+    def __init__(self, slots, shape, dtype=np.uint8, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.slots = int(slots)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.frame_bytes)
+        # Tracked by pid: with the fork start method children inherit this object as-is.
+        self._owner_pid = os.getpid()
+        self._refcounts = ctx.Array('i', self.slots)
+        self._free = ctx.Queue()
+        self._ready = ctx.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        self._build_views()
+
+    # --- Pickling (ring is passed as a Process argument) ---
+
+    def __getstate__(self):
+        return {
+            'slots': self.slots,
+            'shape': self.shape,
+            'dtype': self.dtype.str,
+            'frame_bytes': self.frame_bytes,
+            'shm_name': self._shm.name,
+            'refcounts': self._refcounts,
+            'free': self._free,
+            'ready': self._ready,
+        }
+
+    def __setstate__(self, state):
+        self.slots = state['slots']
+        self.shape = state['shape']
+        self.dtype = np.dtype(state['dtype'])
+        self.frame_bytes = state['frame_bytes']
+        self._refcounts = state['refcounts']
+        self._free = state['free']
+        self._ready = state['ready']
+        self._shm = _attach(state['shm_name'])
+        self._owner_pid = None
+        self._build_views()
+
+    def _build_views(self):
+        flat = np.ndarray((self.slots,) + self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        self._views = [flat[i] for i in range(self.slots)]
+
+    # --- Producer side ---
+
+    def acquire(self, timeout=None):
+        """
+        Take a free slot for writing. Blocks until a consumer releases one.
+        Returns None on timeout.
+        """
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def publish(self, slot, meta=None, refs=1):
+        """
+        Make a written slot visible to consumers.
+        refs is the number of release() calls needed before the slot is reused.
+        """
+        with self._refcounts.get_lock():
+            self._refcounts[slot] = refs
+        self._ready.put((slot, meta))
+
+    def write(self, frame, meta=None, refs=1, timeout=None):
+        """
+        Copy an existing frame into the ring (one memcpy, no pickling).
+        Returns the slot used, or None if no slot freed up in time.
+        """
+        slot = self.acquire(timeout=timeout)
+        if slot is None:
+            return None
+        np.copyto(self._views[slot], frame, casting='no')
+        self.publish(slot, meta, refs)
+        return slot
+
+    def close_stream(self, consumers=1):
+        """Signal end of stream: every consumer's get() returns (None, None)."""
+        for _ in range(consumers):
+            self._ready.put((None, None))
+
+    # --- Consumer side ---
+
+    def get(self, timeout=None):
+        """
+        Wait for the next published slot. Returns (slot, meta),
+        (None, None) at end of stream, or raises queue.Empty on timeout.
+        """
+        return self._ready.get(timeout=timeout)
+
+    def view(self, slot):
+        """Numpy view of a slot (no copy). Valid until the slot is released."""
+        return self._views[slot]
+
+    def retain(self, slot, refs=1):
+        """Add holders to a slot, e.g. before forwarding it to another stage."""
+        with self._refcounts.get_lock():
+            self._refcounts[slot] += refs
+
+    def release(self, slot):
+        """Drop one reference; the slot returns to the free list at zero."""
+        with self._refcounts.get_lock():
+            self._refcounts[slot] -= 1
+            remaining = self._refcounts[slot]
+        if remaining == 0:
+            self._free.put(slot)
+        elif remaining < 0:
+            raise RuntimeError(f"Slot {slot} released more times than it was published")
+
+    # --- Lifetime ---
+
+    def close(self):
+        """Detach this process from the shared block. The creator also unlinks it."""
+        self._views = []
+        self._shm.close()
+        if self._owner_pid == os.getpid():
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(name):
+    # Python 3.13+ lets attaching processes opt out of the resource tracker,
+    # which would otherwise treat the block as leaked by the worker.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
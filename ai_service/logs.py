@@ -0,0 +1,65 @@
+"""
+Levelled, rate-limited logging for the AI service.
+
+    log = logs.get_logger(__name__)
+    log.debug("Updated plate %s: %s", track_id, text)
+
+LOG_LEVEL (default INFO) sets the threshold; the per-frame DEBUG lines of the
+analysis loop cost nothing unless it is lowered. Each call site may emit at
+most LOG_RATE records per LOG_RATE_WINDOW seconds; the rest are dropped and
+counted, and the next record let through says how many were suppressed. So a
+backend outage or a busy junction cannot flood stdout, whatever the level.
+"""
+import logging
+import os
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_RATE = int(os.getenv("LOG_RATE", "10"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "10"))
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class RateLimitFilter(logging.Filter):
+
+    def __init__(self, rate=LOG_RATE, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.rate = rate
+        self.window = window
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        self._sites = {}  # (pathname, lineno) -> [window start, records emitted, records suppressed]
+
+    def filter(self, record):
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                if site and site[2]:
+                    record.msg = f"{record.msg} [{site[2]} similar suppressed]"
+                self._sites[key] = [now, 1, 0]
+                return True
+            if site[1] < self.rate:
+                site[1] += 1
+                return True
+            site[2] += 1
+            self.suppressed += 1
+            return False
+
+
+rate_limit = RateLimitFilter()
+_root = logging.getLogger("anpr")
+if not _root.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _handler.addFilter(rate_limit)
+    _root.addHandler(_handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+
+def get_logger(name):
+    """Logger under the service's 'anpr' hierarchy (one handler, one rate limiter)."""
+    return logging.getLogger(f"anpr.{name}")
@@ -0,0 +1,184 @@
+"""
+Per-stage instrumentation for the AI service, served by app.py at /metrics
+in the Prometheus text exposition format.
+
+    with metrics.stage("track"):
+        dets = model.track(frame)
+
+The analysis pipeline (pipeline/) times its stages (decode, resize, track,
+speed, rules, signal, ocr, draw, report) into one histogram; broadcast.py times the JPEG encodes it
+actually performs. Counters cover frames, OCR outcomes and violations;
+gauges can also be computed at scrape time from a function (stream and
+subscriber counts, queue depths, cache size), so nothing has to be kept in
+sync by hand.
+
+Metrics are plain in-process objects with a lock each: cheap enough to
+update from the per-frame loop, no client library needed.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a cached JPEG (sub-ms) to a slow CPU detector pass
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REGISTRY = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        """
+        function: called at scrape time instead of keeping values; returns a
+        number, or a dict of label-value tuples to numbers.
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def samples(self):
+        if self.function is not None:
+            values = self.function()
+            return values.items() if isinstance(values, dict) else [((), values)]
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.samples()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self.raw = None
+
+    def record_samples(self):
+        """Also keep every observed value (for exact percentiles in benchmarks; unbounded)."""
+        with self._lock:
+            self.raw = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, +Inf last; then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+            if self.raw is not None:
+                self.raw.setdefault(key, []).append(value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, ([*counts], total, n)) for key, (counts, total, n) in self._values.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+def render():
+    """All registered metrics in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        try:
+            lines += metric.render()
+        except Exception as e:
+            lines.append(f"# {metric.name} unavailable: {e}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = Histogram("anpr_stage_seconds", "Latency of one pipeline stage (per frame, per OCR call or per report)",
+                          ["stage"])
+FRAMES = Counter("anpr_frames_total", "Frames analysed (after frame skipping)")
+ACTIVE_TRACKS = Gauge("anpr_active_tracks", "Vehicles tracked in the latest analysed frame", ["video_id"])
+OCR_READS = Counter("anpr_ocr_reads_total", "Plate OCR attempts by outcome (plate, none)", ["result"])
+VIOLATIONS = Counter("anpr_violations_total", "Violations reported, by type", ["type"])
+REPORTS = Counter("anpr_reports_total", "Violation reports sent to the backend, by result (ok, failed)", ["result"])
+REPORTS_IN_FLIGHT = Gauge("anpr_reports_in_flight", "Violation reports being saved/sent")
+
+
+def stage(name):
+    """Context manager timing one stage into STAGE_SECONDS."""
+    return STAGE_SECONDS.time(stage=name)
@@ -0,0 +1,34 @@
+"""
+The analysis pipeline shared by the streaming service (app.py) and the batch
+CLI (main.py in the repository root):
+
+    source -> stages -> sinks
+
+A source decodes frames; each stage reads and extends the frame's
+FrameContext in order (resize, detect + track, speed, rules, signal rules,
+plates, violations); sinks consume finished frames (results file, annotated video).
+Pipeline.run() yields every context, so a front-end can stream it as well.
+
+    pipeline = Pipeline(VideoSource(path, skip_step=3),
+                        [ResizeStage(), DetectStage(runtime.get_detector()), SpeedStage(),
+                         RulesStage(), SignalStage(), PlateStage(), ViolationStage()],
+                        [VideoSink('out.mp4')])
+    for ctx in pipeline.run():
+        ...ctx.metadata()...
+
+Front-ends only choose and configure the pieces; any change to a stage
+(batching, caching, OCR scheduling) applies to both.
+"""
+from pipeline.core import FrameContext, Pipeline, Sink, Stage, Stream, Vehicle
+from pipeline.sinks import ResultsSink, VideoSink, draw_overlays
+from pipeline.sources import VideoSource
+from pipeline.stages import (DetectStage, PlateStage, ResizeStage, RulesStage, SignalStage, SpeedStage,
+                             ViolationStage, calculate_speed, check_no_helmet, check_triple_riding, resize_for_display)
+
+__all__ = [
+    'FrameContext', 'Pipeline', 'Sink', 'Stage', 'Stream', 'Vehicle',
+    'ResultsSink', 'VideoSink', 'draw_overlays',
+    'VideoSource',
+    'DetectStage', 'PlateStage', 'ResizeStage', 'RulesStage', 'SignalStage', 'SpeedStage', 'ViolationStage',
+    'calculate_speed', 'check_no_helmet', 'check_triple_riding', 'resize_for_display',
+]
@@ -0,0 +1,191 @@
+"""
+Pipeline skeleton: the per-stream state, the per-frame context and the loop
+driving stages and sinks.
+"""
+import logs
+import metrics
+
+log = logs.get_logger("pipeline")
+
+
+class Stream:
+    """What stages and sinks know about the video being analysed."""
+
+    def __init__(self, path, video_id=None, camera_id=None):
+        self.path = path
+        self.video_id = video_id
+        self.camera_id = camera_id
+        self.fps = 30.0
+        self.width = 0
+        self.height = 0
+        self.skip_step = 1
+        self.position = 0  # frames decoded so far (1-based index of the latest)
+
+    def pts(self, index):
+        """Seconds into the source video of frame `index` (1-based)."""
+        return round((index - 1) / self.fps, 3)
+
+
+class Vehicle:
+    """One tracked vehicle on one frame; filled in by the stages in turn."""
+    __slots__ = ('id', 'cls', 'class_name', 'xyxy', 'center', 'box', 'speed', 'plate', 'plate_score', 'violations')
+
+    def __init__(self, track_id, cls, class_name, xyxy, center):
+        self.id = track_id
+        self.cls = cls
+        self.class_name = class_name
+        self.xyxy = xyxy  # float box in the analysis frame
+        self.center = center
+        self.box = [int(v) for v in xyxy]
+        self.speed = 0
+        self.plate = ""
+        self.plate_score = None
+        self.violations = []
+
+    def as_dict(self):
+        return {'id': self.id, 'cls': self.cls, 'class': self.class_name, 'box': self.box,
+                'speed': self.speed, 'plate': self.plate, 'violations': self.violations}
+
+
+class FrameContext:
+    """
+    One processed frame on its way through the stages.
+    frame: the decoded source frame; image: the analysis (display) frame and
+    scale its size relative to frame. Box coordinates are in image.
+    """
+
+    def __init__(self, stream, index, frame):
+        self.stream = stream
+        self.index = index
+        self.frame = frame
+        self.image = frame
+        self.scale = 1.0
+        self.dets = None
+        self.persons = []  # person boxes (xyxy) seen on this frame
+        self.vehicles = []
+        self.events = []  # violations reported for the first time on this frame
+        self.signal = None  # {'state', 'line'} at cameras with a stop line (see SignalStage)
+        self.plates = []  # improved plate reads of tracks that left the scene (see PlateStage)
+
+    @property
+    def pts(self):
+        return self.stream.pts(self.index)
+
+    def metadata(self):
+        """The per-frame record streamed to clients and cached (see app.py, streaming.py)."""
+        metadata = {'frame': self.index, 'pts': self.pts,
+                    'width': self.image.shape[1], 'height': self.image.shape[0], 'source_width': self.frame.shape[1],
+                    'objects': [v.as_dict() for v in self.vehicles], 'events': self.events}
+        if self.signal:
+            metadata['signal'] = self.signal
+        if self.plates:
+            metadata['plates'] = self.plates
+        return metadata
+
+
+class Stage:
+    """
+    One step of the per-frame analysis. name: label under which process() is
+    timed in metrics.STAGE_SECONDS (None: not timed per frame).
+    """
+    name = None
+
+    def start(self, stream):
+        """Called once before the first frame."""
+
+    def configure(self, config):
+        """Apply camera settings (see camera_config.py); before start() and then between frames."""
+
+    def process(self, ctx):
+        raise NotImplementedError
+
+    def finish(self):
+        """Called once after the last frame when the stream ran to its end."""
+
+
+class Sink:
+    """Consumes finished frames."""
+
+    def start(self, stream):
+        """Called once before the first frame."""
+
+    def configure(self, config):
+        """Apply camera settings (see camera_config.py); before start() and then between frames."""
+
+    def consume(self, ctx):
+        raise NotImplementedError
+
+    def close(self, complete):
+        """Called once at the end; complete is False when the consumer stopped early."""
+
+
+class Pipeline:
+    """
+    settings: a camera_config.CameraSettings; its settings are applied to
+    the source, stages and sinks before the first frame, and changes to them
+    between two frames (no models are reloaded).
+    """
+
+    def __init__(self, source, stages, sinks=(), video_id=None, camera_id=None, settings=None):
+        self.source = source
+        self.stages = list(stages)
+        self.sinks = list(sinks)
+        self.settings = settings
+        self.stream = Stream(source.path, video_id=video_id, camera_id=camera_id)
+
+    def configure(self, config):
+        for part in [self.source] + self.stages + self.sinks:
+            part.configure(config)
+
+    def run(self):
+        """
+        Generator of FrameContext, one per processed frame, after all stages
+        and sinks have seen it. Closing it early (a viewer went away) still
+        closes the source and the sinks.
+        """
+        stream = self.stream
+        if not self.source.open(stream):
+            log.error("Error opening video %s", stream.path)
+            return
+        settings = self.settings
+        if settings:
+            self.configure(settings.current)
+        for part in self.stages + self.sinks:
+            part.start(stream)
+        complete = False
+        try:
+            for index, frame in self.source.frames():
+                if settings and (config := settings.poll()) is not None:
+                    self.configure(config)
+                    log.info("Applied camera config version %s to %s", settings.version, stream.video_id)
+                ctx = FrameContext(stream, index, frame)
+                for stage in self.stages:
+                    if stage.name:
+                        with metrics.stage(stage.name):
+                            stage.process(ctx)
+                    else:
+                        stage.process(ctx)
+                metrics.FRAMES.inc()
+                metrics.ACTIVE_TRACKS.set(len(ctx.vehicles), video_id=stream.video_id)
+                for sink in self.sinks:
+                    sink.consume(ctx)
+                yield ctx
+            for stage in self.stages:
+                stage.finish()
+            complete = True
+        finally:
+            # Every sink gets closed (its file finalised) even if another one
+            # fails; the first failure is re-raised afterwards
+            error = None
+            try:
+                self.source.close()
+            finally:
+                for sink in self.sinks:
+                    try:
+                        sink.close(complete)
+                    except Exception as e:
+                        log.error("Closing %s for %s failed: %s", type(sink).__name__, stream.video_id, e)
+                        error = error or e
+                metrics.ACTIVE_TRACKS.remove(video_id=stream.video_id)
+            if error is not None:
+                raise error
@@ -0,0 +1,124 @@
+"""
+Sinks for finished frames: the per-frame results file and the annotated
+video. Streaming to viewers is not a sink: app.py iterates Pipeline.run()
+and hands each frame to the broadcast hub.
+"""
+import time
+
+import cv2
+
+import logs
+import metrics
+import results_io
+from pipeline.core import Sink
+from pipeline.stages import MOTORCYCLE_CLASS
+from video_writer import AsyncVideoWriter
+
+log = logs.get_logger("pipeline")
+
+
+SIGNAL_COLORS = {'red': (0, 0, 255), 'amber': (0, 191, 255), 'green': (0, 255, 0)}  # BGR
+
+
+def draw_overlays(frame, metadata):
+    """
+    Server-side visualization of one frame's metadata (boxes, plate, speed,
+    violations, stop line and signal state). Text size follows the source video width.
+    """
+    start = time.perf_counter()
+    width = metadata['source_width']
+    font_scale = max(0.5, width / 1500.0)
+    thickness = max(1, int(width / 600.0))
+    signal = metadata.get('signal')
+    if signal:
+        x1, y1, x2, y2 = signal['line']
+        color = SIGNAL_COLORS.get(signal['state'], (200, 200, 200))
+        cv2.line(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, (signal['state'] or 'signal ?').upper(), (x1 + 5, max(y1 - 5, int(25 * font_scale))),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+    for obj in metadata['objects']:
+        x1, y1, x2, y2 = obj['box']
+        color = (0, 0, 255) if obj['violations'] else (0, 255, 0)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        info_text = f"{obj['plate']}"
+        if obj['speed'] > 10: info_text += f" | {obj['speed']} km/h"
+        if obj['violations']: info_text += f" | {', '.join(obj['violations'])}"
+
+        (tw, th), _ = cv2.getTextSize(info_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+        cv2.rectangle(frame, (x1, y1 - th - 10), (x1 + tw, y1), color, -1)
+        cv2.putText(frame, info_text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="draw")
+    return frame
+
+
+class ResultsSink(Sink):
+    """
+    Per-frame vehicle/plate rows (see results_io.py) for vehicles with a
+    plate, in original-resolution coordinates with the 0-based frame index
+    visualize.py reads the video with.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def start(self, stream):
+        self.writer = results_io.ResultsWriter(self.path)
+
+    def consume(self, ctx):
+        scale = ctx.scale
+        for vehicle in ctx.vehicles:
+            if not vehicle.plate:
+                continue
+            x1, y1, x2, y2 = vehicle.box
+            zone_ratio = 0.60 if vehicle.cls == MOTORCYCLE_CLASS else 0.40
+            zone_y1 = y1 + (1 - zone_ratio) * (y2 - y1)
+            self.writer.add(ctx.index - 1, vehicle.id,
+                            [v / scale for v in (x1, y1, x2, y2)],
+                            [v / scale for v in (x1, zone_y1, x2, y2)],
+                            vehicle.plate_score, vehicle.plate, vehicle.plate_score)
+
+    def close(self, complete):
+        # Also on an early stop: the rows so far are still a valid file
+        if self.writer:
+            self.writer.close()
+            if complete:
+                log.info("Saved %s result rows to %s", self.writer.rows_written, self.writer.path)
+
+
+class VideoSink(Sink):
+    """
+    Annotated output video, encoded on a background thread (see
+    video_writer.py). full_resolution=True draws on the source frames,
+    otherwise on the analysis frames. The output runs at fps / skip_step.
+    """
+
+    def __init__(self, path, codec='mp4v', backend='opencv', preset='veryfast', full_resolution=True):
+        self.path = path
+        self.codec = codec
+        self.backend = backend
+        self.preset = preset
+        self.full_resolution = full_resolution
+        self.writer = None
+
+    def start(self, stream):
+        self.fps = stream.fps / stream.skip_step
+
+    def consume(self, ctx):
+        metadata = ctx.metadata()
+        if self.full_resolution and ctx.scale != 1.0:
+            scale = ctx.scale
+            metadata['objects'] = [dict(obj, box=[int(v / scale) for v in obj['box']]) for obj in metadata['objects']]
+            if 'signal' in metadata:
+                metadata['signal'] = dict(metadata['signal'], line=[int(v / scale) for v in metadata['signal']['line']])
+        frame = draw_overlays((ctx.frame if self.full_resolution else ctx.image).copy(), metadata)
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = AsyncVideoWriter(self.path, self.fps, (width, height), codec=self.codec,
+                                           backend=self.backend, preset=self.preset)
+        self.writer.write(frame)
+
+    def close(self, complete):
+        if self.writer:
+            self.writer.close()
+            log.info("Saved video to %s: %s", self.path, self.writer.report())
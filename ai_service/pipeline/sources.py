@@ -0,0 +1,55 @@
+"""
+Frame sources. A source has a path, open(stream) (fills in fps and size,
+False if the video cannot be read), frames() yielding (index, frame) for the
+frames to analyse, configure(config) and close().
+"""
+import cv2
+
+import metrics
+
+
+class VideoSource:
+    """
+    A video file (or anything cv2.VideoCapture opens).
+    PERFORMANCE: skip_step > 1 analyses only every skip_step-th frame; the
+    frames in between are still decoded, as seeking is slower than reading.
+    """
+
+    def __init__(self, path, skip_step=1):
+        self.path = path
+        self.skip_step = max(1, int(skip_step))
+        self.cap = None
+        self.stream = None
+
+    def open(self, stream):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            return False
+        stream.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        stream.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        stream.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        stream.skip_step = self.skip_step
+        self.stream = stream
+        return True
+
+    def configure(self, config):
+        self.skip_step = config['skip_step']
+        if self.stream:
+            self.stream.skip_step = self.skip_step
+
+    def frames(self):
+        since = 0  # frames since the last one analysed (skip_step may change between frames)
+        while True:
+            with metrics.stage("decode"):
+                ret, frame = self.cap.read()
+            if not ret:
+                return
+            self.stream.position += 1
+            since += 1
+            if since >= self.skip_step:
+                since = 0
+                yield self.stream.position, frame
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
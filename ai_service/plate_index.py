@@ -0,0 +1,248 @@
+"""
+Persistent index of plate sightings across videos and cameras.
+
+Every time the analysis settles on a plate for a track, a sighting (plate,
+video, camera, track, frame/pts, OCR score, wall time) is stored in SQLite,
+so "where else has TN38AB1234 appeared?" is an indexed lookup instead of a
+scan over per-run dicts and violation payloads.
+
+Lookups are tolerant of OCR errors at two levels:
+- canonical key: characters the OCR confuses (util.dict_char_to_int, e.g.
+  O/0, B/8, S/5) are folded to one symbol, so TN38AB1234 and TN3BA81234
+  share a key and match at distance 0;
+- fuzzy: keys within one further edit (a misread, dropped or extra
+  character) are found through a symmetric-deletion index: each key is
+  stored with all its single-character deletions, and two keys are within
+  one edit only if their deletion sets intersect. Candidates are verified
+  with an exact edit distance.
+
+Per-plate totals (sightings, distinct videos) are maintained on insert, so
+repeat-offender queries read a small indexed table.
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+import util
+
+CANONICAL = str.maketrans(util.dict_char_to_int)
+MAX_FUZZY_DISTANCE = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sightings (
+    id INTEGER PRIMARY KEY,
+    plate TEXT NOT NULL,
+    canon TEXT NOT NULL,
+    video_id TEXT,
+    camera_id TEXT,
+    track_id INTEGER,
+    frame INTEGER,
+    pts REAL,
+    score REAL,
+    seen_at REAL
+);
+CREATE INDEX IF NOT EXISTS sightings_canon ON sightings (canon, seen_at);
+CREATE INDEX IF NOT EXISTS sightings_plate ON sightings (plate);
+CREATE TABLE IF NOT EXISTS plates (
+    canon TEXT PRIMARY KEY,
+    sightings INTEGER NOT NULL,
+    videos INTEGER NOT NULL,
+    first_seen REAL,
+    last_seen REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS plates_videos ON plates (videos, sightings);
+CREATE TABLE IF NOT EXISTS plate_videos (
+    canon TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    PRIMARY KEY (canon, video_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS plate_variants (
+    variant TEXT NOT NULL,
+    canon TEXT NOT NULL,
+    PRIMARY KEY (variant, canon)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = ('plate', 'video_id', 'camera_id', 'track_id', 'frame', 'pts', 'score', 'seen_at')
+
+
+def normalize(plate):
+    return plate.upper().replace(' ', '').replace('-', '').replace('.', '')
+
+
+def canonical(plate):
+    """Confusion-insensitive key: TN38AB1234 and TN3BA81234 both map to TN38481234."""
+    return normalize(plate).translate(CANONICAL)
+
+
+def deletions(key):
+    """key plus every string obtained by deleting one character."""
+    return {key} | {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class PlateIndex:
+    """
+    Thread-safe (one connection behind a lock); SQLite in WAL mode so other
+    processes can read while the service writes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def _insert(self, plate, video_id, camera_id, track_id, frame, pts, score, seen_at):
+        plate = normalize(plate)
+        canon = canonical(plate)
+        c = self._conn
+        c.execute('INSERT INTO sightings (plate, canon, video_id, camera_id, track_id, frame, pts, score, seen_at) '
+                  'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                  (plate, canon, video_id, camera_id, track_id, frame, pts, score, seen_at))
+        new_video = c.execute('INSERT OR IGNORE INTO plate_videos (canon, video_id) VALUES (?, ?)',
+                              (canon, video_id or '')).rowcount
+        if c.execute('INSERT OR IGNORE INTO plates VALUES (?, 1, 1, ?, ?)', (canon, seen_at, seen_at)).rowcount:
+            c.executemany('INSERT OR IGNORE INTO plate_variants (variant, canon) VALUES (?, ?)',
+                          [(v, canon) for v in deletions(canon)])
+        else:
+            c.execute('UPDATE plates SET sightings = sightings + 1, videos = videos + ?, '
+                      'last_seen = max(last_seen, ?) WHERE canon = ?', (new_video, seen_at, canon))
+
+    def add(self, plate, video_id=None, camera_id=None, track_id=None, frame=None, pts=None, score=None,
+            seen_at=None):
+        if not plate:
+            return
+        with self._lock:
+            self._insert(plate, video_id, camera_id, track_id, frame, pts, score,
+                         time.time() if seen_at is None else seen_at)
+            self._conn.commit()
+
+    def add_many(self, rows):
+        """Bulk insert of dicts with COLUMNS keys, in one transaction."""
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                if row.get('plate'):
+                    self._insert(row['plate'], row.get('video_id'), row.get('camera_id'), row.get('track_id'),
+                                 row.get('frame'), row.get('pts'), row.get('score'), row.get('seen_at') or now)
+            self._conn.commit()
+
+    def matching_keys(self, plate, max_distance=0):
+        """Canonical keys within max_distance (0 or 1) edits of plate's key."""
+        if max_distance > MAX_FUZZY_DISTANCE:
+            raise ValueError(f"max_distance must be <= {MAX_FUZZY_DISTANCE}")
+        key = canonical(plate)
+        if max_distance == 0:
+            return [key]
+        variants = list(deletions(key))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT canon FROM plate_variants WHERE variant IN ({','.join('?' * len(variants))})",
+                variants).fetchall()
+        return [r['canon'] for r in rows if edit_distance(r['canon'], key) <= max_distance]
+
+    def lookup(self, plate, max_distance=0, exact=False, limit=100):
+        """
+        Sightings of plate, newest first. exact=True matches the stored text
+        only; otherwise the confusion-insensitive key, widened by max_distance.
+        """
+        with self._lock:
+            if exact:
+                rows = self._conn.execute('SELECT * FROM sightings WHERE plate = ? ORDER BY seen_at DESC LIMIT ?',
+                                          (normalize(plate), limit)).fetchall()
+                return [dict(r) for r in rows]
+        keys = self.matching_keys(plate, max_distance)
+        if not keys:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM sightings WHERE canon IN ({','.join('?' * len(keys))}) "
+                f"ORDER BY seen_at DESC LIMIT ?", keys + [limit]).fetchall()
+        return [dict(r) for r in rows]
+
+    def summary(self, plate, max_distance=0):
+        """Per-key totals (sightings, distinct videos, first/last seen)."""
+        keys = self.matching_keys(plate, max_distance)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM plates WHERE canon IN ({','.join('?' * len(keys))})", keys).fetchall()
+        return [dict(r) for r in rows]
+
+    def repeat_offenders(self, min_videos=2, limit=50):
+        """Plates seen in at least min_videos different videos, most widespread first."""
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM plates WHERE videos >= ? ORDER BY videos DESC, sightings DESC '
+                                      'LIMIT ?', (min_videos, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM sightings').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def import_results(index, path, video_id, camera_id=None, fps=None):
+    """Backfill sightings from a results file (Parquet or CSV, see results_io): one per car and plate text."""
+    import results_io
+
+    df = results_io.read_results(path, columns=['frame_nmr', 'car_id', 'license_number', 'license_number_score'])
+    df = df[df['license_number'] != '0']
+    best = df.sort_values('license_number_score', ascending=False).drop_duplicates(['car_id', 'license_number'])
+    index.add_many({'plate': r.license_number, 'video_id': video_id, 'camera_id': camera_id,
+                    'track_id': int(r.car_id), 'frame': int(r.frame_nmr),
+                    'pts': r.frame_nmr / fps if fps else None, 'score': float(r.license_number_score)}
+                   for r in best.itertuples())
+    return len(best)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query or fill the plate sighting index')
+    parser.add_argument('--db', default=os.getenv('PLATE_INDEX_PATH', os.path.join('processed', 'plates.db')))
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('lookup')
+    p.add_argument('plate')
+    p.add_argument('--fuzzy', type=int, default=0, help='Extra edits allowed beyond OCR confusions (0 or 1)')
+    p.add_argument('--exact', action='store_true')
+    p = sub.add_parser('repeat')
+    p.add_argument('--min-videos', type=int, default=2)
+    p = sub.add_parser('import')
+    p.add_argument('results')
+    p.add_argument('--video-id', required=True)
+    p.add_argument('--camera-id')
+    p.add_argument('--fps', type=float)
+    args = parser.parse_args()
+
+    index = PlateIndex(args.db)
+    start = time.perf_counter()
+    if args.command == 'lookup':
+        rows = index.lookup(args.plate, max_distance=args.fuzzy, exact=args.exact)
+    elif args.command == 'repeat':
+        rows = index.repeat_offenders(args.min_videos)
+    else:
+        rows = [{'imported': import_results(index, args.results, args.video_id, args.camera_id, args.fps)}]
+    elapsed = (time.perf_counter() - start) * 1000
+    for row in rows:
+        print(row)
+    print(f"{len(rows)} rows in {elapsed:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
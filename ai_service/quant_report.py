@@ -0,0 +1,159 @@
+"""
+Accuracy / latency report: FP32 vs INT8 model profiles.
+
+Usage:
+    python quant_report.py [--frames 100] [--seed 1] [--out quant_report.json]
+
+Frames are sampled deterministically from uploads/ with a different seed than
+calibration (quantize_models.py uses 0), so the report is reproducible and not
+measured on the calibration set. We have no labelled ground truth, so the FP32
+profile is the reference:
+    mAP@0.5, mAP@0.5:0.95  - INT8 detections scored against FP32 detections
+    plate accuracy         - share of plate zones where INT8 reads the same text
+    latency                - detection + OCR per frame, single-threaded caller
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import runtime
+from quantize_models import CLASSES, sample_upload_frames
+from tracker import iou_matrix
+
+IOU_THRESHOLDS = np.arange(0.5, 0.96, 0.05)
+
+
+def average_precision(ref, cand, iou_threshold):
+    """
+    Per-class all-point-interpolated AP of cand against ref (VOC/COCO style),
+    averaged over classes present in ref. ref and cand are lists of Detections.
+    """
+    aps = []
+    classes = np.unique(np.concatenate([r.cls for r in ref])) if ref else []
+    for c in classes:
+        n_ref = sum(int((r.cls == c).sum()) for r in ref)
+        scored = []  # (score, is_true_positive)
+        for r, d in zip(ref, cand):
+            r_boxes, d_mask = r.xyxy[r.cls == c], d.cls == c
+            d_boxes, d_conf = d.xyxy[d_mask], d.conf[d_mask]
+            order = np.argsort(-d_conf)
+            iou = iou_matrix(d_boxes[order], r_boxes)
+            taken = np.zeros(len(r_boxes), dtype=bool)
+            for i, score in enumerate(d_conf[order]):
+                hit = False
+                if len(r_boxes):
+                    j = int(np.argmax(np.where(taken, -1, iou[i])))
+                    if not taken[j] and iou[i, j] >= iou_threshold:
+                        taken[j] = hit = True
+                scored.append((float(score), hit))
+        if n_ref == 0:
+            continue
+        scored.sort(key=lambda s: -s[0])
+        tp = np.cumsum([s[1] for s in scored]) if scored else np.zeros(0)
+        fp = np.cumsum([not s[1] for s in scored]) if scored else np.zeros(0)
+        recall = np.concatenate([[0], tp / n_ref, [1]])
+        precision = np.concatenate([[1], tp / np.maximum(tp + fp, 1), [0]])
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        aps.append(float(np.sum(np.diff(recall) * precision[1:])))
+    return float(np.mean(aps)) if aps else 0.0
+
+
+def read_zones(frame, dets, reader):
+    """Best OCR text for each vehicle's plate zone (None where the zone is empty)."""
+    texts = []
+    for (x1, y1, x2, y2), cls in zip(dets.xyxy.astype(int), dets.cls):
+        if cls == 0:
+            continue
+        ratio = 0.60 if cls == 3 else 0.40
+        zone = frame[max(0, y1 + int((1 - ratio) * (y2 - y1))):max(0, y2), max(0, x1):max(0, x2)]
+        if zone.size == 0:
+            texts.append(None)
+            continue
+        found = reader.readtext(cv2.cvtColor(zone, cv2.COLOR_BGR2GRAY), allowlist=runtime.OCR_ALLOWLIST)
+        texts.append(max(found, key=lambda r: r[2])[1] if found else '')
+    return texts
+
+
+def run_profile(profile, frames):
+    detector = runtime.load_detector('onnx', profile)
+    reader = runtime.load_plate_reader('onnx', profile)
+    if detector.backend != 'onnx' or getattr(reader, 'backend', None) != 'onnx':
+        sys.exit(f"{profile} ONNX models not available")
+
+    detector.predict(frames[:1], classes=CLASSES)  # warm-up
+    dets, texts, latencies = [], [], []
+    for frame in frames:
+        start = time.perf_counter()
+        d = detector.predict([frame], classes=CLASSES)[0]
+        frame_texts = read_zones(frame, d, reader)
+        latencies.append((time.perf_counter() - start) * 1000)
+        dets.append(d)
+        texts.append(frame_texts)
+    return dets, texts, latencies, reader
+
+
+def plate_agreement(frames, ref_dets, ref_texts, reader):
+    # Read INT8 on the FP32 zones so both profiles see the same crops
+    total, agree = 0, 0
+    for frame, d, expected in zip(frames, ref_dets, ref_texts):
+        for ref_text, text in zip(expected, read_zones(frame, d, reader)):
+            if ref_text is None:
+                continue
+            total += 1
+            agree += int(text == ref_text)
+    return agree / total if total else 1.0, total
+
+
+def summarise(latencies):
+    values = np.asarray(latencies)
+    return {'mean_ms': float(values.mean()), 'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)), 'fps': float(1000 / values.mean())}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', default='quant_report.json')
+    args = parser.parse_args()
+
+    frames = sample_upload_frames(args.frames, seed=args.seed)
+    if not frames:
+        sys.exit("No frames found in uploads/")
+
+    fp32_dets, fp32_texts, fp32_lat, _ = run_profile('fp32', frames)
+    int8_dets, _, int8_lat, int8_reader = run_profile('int8', frames)
+    plate_acc, plate_total = plate_agreement(frames, fp32_dets, fp32_texts, int8_reader)
+
+    report = {
+        'frames': len(frames),
+        'seed': args.seed,
+        'reference': 'fp32',
+        'map50': average_precision(fp32_dets, int8_dets, 0.5),
+        'map50_95': float(np.mean([average_precision(fp32_dets, int8_dets, t) for t in IOU_THRESHOLDS])),
+        'plate_accuracy': plate_acc,
+        'plate_zones': plate_total,
+        'latency': {'fp32': summarise(fp32_lat), 'int8': summarise(int8_lat)},
+    }
+    report['speedup'] = report['latency']['fp32']['mean_ms'] / report['latency']['int8']['mean_ms']
+
+    print(f"Frames: {report['frames']} (seed {args.seed})")
+    print(f"INT8 mAP@0.5 vs FP32:      {report['map50']:.3f}")
+    print(f"INT8 mAP@0.5:0.95 vs FP32: {report['map50_95']:.3f}")
+    print(f"Plate text agreement:      {plate_acc:.3f} over {plate_total} zones")
+    for profile in runtime.PROFILES:
+        lat = report['latency'][profile]
+        print(f"{profile}: mean {lat['mean_ms']:.1f} ms | p95 {lat['p95_ms']:.1f} ms | {lat['fps']:.1f} fps")
+    print(f"Speed-up: {report['speedup']:.2f}x")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Post-training static INT8 quantisation of the exported ONNX models.
+
+Usage:
+    python quantize_models.py [--frames 200] [--seed 0]
+
+Calibration data are frames sampled (deterministically, from --seed) from the
+videos in uploads/, so activation ranges match our own cameras rather than
+COCO. The recogniser is calibrated on the plate zones of the vehicles the FP32
+detector finds in those frames.
+
+Writes models/yolov8n.int8.onnx and models/plate_recognizer.int8.onnx next to
+the FP32 exports. Select them per deployment with MODEL_BACKEND=onnx MODEL_PROFILE=int8.
+"""
+import argparse
+import os
+import random
+import sys
+
+import cv2
+import numpy as np
+
+import runtime
+
+UPLOAD_DIR = "uploads"
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv')
+CLASSES = [0, 2, 3, 5, 7]
+
+
+def sample_upload_frames(count, seed=0, upload_dir=UPLOAD_DIR, width=640):
+    """
+    Deterministic random sample of frames across all uploaded videos,
+    resized the same way generate_frames does before inference.
+    """
+    videos = sorted(f for f in os.listdir(upload_dir) if f.lower().endswith(VIDEO_EXTS)) if os.path.isdir(upload_dir) else []
+    if not videos:
+        return []
+    rng = random.Random(seed)
+    per_video = max(1, count // len(videos))
+
+    frames = []
+    for name in videos:
+        cap = cv2.VideoCapture(os.path.join(upload_dir, name))
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total <= 0:
+            cap.release()
+            continue
+        wanted = set(rng.sample(range(total), min(per_video, total)))
+        idx = 0
+        while wanted:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if idx in wanted:
+                wanted.discard(idx)
+                h, w = frame.shape[:2]
+                if w > width:
+                    frame = cv2.resize(frame, (width, int(h * width / w)))
+                frames.append(frame)
+            idx += 1
+        cap.release()
+    return frames[:count]
+
+
+def plate_zone_lines(frames, detector, img_h):
+    """Grayscale plate-zone crops resized to the recogniser input height."""
+    lines = []
+    for frame, dets in zip(frames, detector.predict(frames, classes=CLASSES)):
+        for (x1, y1, x2, y2), cls in zip(dets.xyxy.astype(int), dets.cls):
+            if cls == 0:
+                continue
+            ratio = 0.60 if cls == 3 else 0.40
+            zone = frame[max(0, y1 + int((1 - ratio) * (y2 - y1))):max(0, y2), max(0, x1):max(0, x2)]
+            if zone.shape[0] < 8 or zone.shape[1] < 8:
+                continue
+            gray = cv2.cvtColor(zone, cv2.COLOR_BGR2GRAY)
+            new_w = max(img_h, int(np.ceil(img_h * gray.shape[1] / gray.shape[0])))
+            gray = cv2.resize(gray, (new_w, img_h))
+            lines.append((((gray.astype(np.float32) / 255.0) - 0.5) / 0.5)[None, None])
+    return lines
+
+
+class _FeedReader:
+    """CalibrationDataReader over a list of ready-made input tensors."""
+
+    def __init__(self, input_name, tensors):
+        self.input_name = input_name
+        self._iter = iter(tensors)
+
+    def get_next(self):
+        tensor = next(self._iter, None)
+        return None if tensor is None else {self.input_name: tensor}
+
+
+def quantize(fp32_path, int8_path, tensors, nodes_to_exclude=None):
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = fp32_path.replace('.onnx', '.prep.onnx')
+    quant_pre_process(fp32_path, prepared)
+    input_name = onnx.load(prepared, load_external_data=False).graph.input[0].name
+
+    quantize_static(prepared, int8_path, _FeedReader(input_name, tensors),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True,
+                    calibrate_method=CalibrationMethod.MinMax,
+                    nodes_to_exclude=nodes_to_exclude or [])
+    os.remove(prepared)
+    print(f"Wrote {int8_path}")
+
+
+def detector_head_nodes(path):
+    # The YOLOv8 Detect head (box decoding / DFL) loses too much precision in INT8
+    import onnx
+    graph = onnx.load(path, load_external_data=False).graph
+    return [n.name for n in graph.node if n.name.startswith('/model.22/')]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=200, help='Calibration frames sampled from uploads/')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quantize-head', action='store_true', help='Also quantise the detector head')
+    args = parser.parse_args()
+
+    if not os.path.exists(runtime.DETECTOR_ONNX) or not os.path.exists(runtime.RECOGNIZER_ONNX):
+        sys.exit("FP32 ONNX models missing - run export_models.py first")
+
+    frames = sample_upload_frames(args.frames, seed=args.seed)
+    if not frames:
+        sys.exit(f"No calibration frames found in {UPLOAD_DIR}/")
+    print(f"Calibrating on {len(frames)} frames")
+
+    detector = runtime.OnnxDetector(runtime.DETECTOR_ONNX)
+    det_tensors = []
+    for frame in frames:
+        padded, _, _ = runtime.letterbox(frame, detector.imgsz)
+        det_tensors.append(np.ascontiguousarray(padded[None, ..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0)
+    exclude = [] if args.quantize_head else detector_head_nodes(runtime.DETECTOR_ONNX)
+    quantize(runtime.DETECTOR_ONNX, runtime.profile_path(runtime.DETECTOR_ONNX, 'int8'), det_tensors, exclude)
+
+    reader = runtime.OnnxPlateReader(runtime.RECOGNIZER_ONNX, runtime.RECOGNIZER_META)
+    lines = plate_zone_lines(frames, detector, reader.img_h)
+    if not lines:
+        sys.exit("No vehicles found in calibration frames - cannot calibrate the recogniser")
+    print(f"Calibrating recogniser on {len(lines)} plate zones")
+    quantize(runtime.RECOGNIZER_ONNX, runtime.profile_path(runtime.RECOGNIZER_ONNX, 'int8'), lines)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+On-disk cache of analysis results for videos that were already processed.
+
+An entry is keyed by the SHA-256 of the video file plus a fingerprint of the
+pipeline (model files, backend/profile, analysis settings), so a re-uploaded
+copy of the same video hits the cache and any model or config change misses
+it. It stores the per-frame metadata records produced by app.analyze_frames
+(tracks, boxes, plates, speeds, violations) as gzipped JSON lines; replay()
+re-decodes the video and pairs each processed frame with its record, so a
+replay costs decode time only and never re-reports violations.
+
+Only complete runs become entries. Violations reported during any run are
+also remembered per key (logged/mark_logged), so a run that was cut short and
+restarted does not report them again.
+
+The directory is capped at max_bytes; least recently used files are evicted
+first: entries (each with its logged violations), .logged files of runs
+that never became an entry, and .tmp files left by writers that died. Entries for other fingerprints are simply never hit again and age out.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+
+class ResultCache:
+    HASHES_KEPT = 1024  # content hashes remembered (least recently used dropped)
+    STALE_TMP_S = 3600  # a .tmp file untouched this long belongs to a writer that died
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hashes = OrderedDict()  # (path, size, mtime_ns) -> sha256, so files are hashed once
+        os.makedirs(directory, exist_ok=True)
+
+    def content_hash(self, path):
+        st = os.stat(path)
+        memo = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if memo in self._hashes:
+                self._hashes.move_to_end(memo)
+                return self._hashes[memo]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        with self._lock:
+            self._hashes[memo] = digest.hexdigest()
+            while len(self._hashes) > self.HASHES_KEPT:
+                self._hashes.popitem(last=False)
+        return digest.hexdigest()
+
+    def key(self, video_path, fingerprint):
+        config = hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+        return f"{self.content_hash(video_path)[:32]}-{config}"
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.jsonl.gz")
+
+    def _logged_path(self, key):
+        return os.path.join(self.directory, f"{key}.logged")
+
+    def get(self, key):
+        """Entry path if cached (and marks it recently used), else None."""
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        return path
+
+    def record(self, key, source, keep=None):
+        """
+        Pass (frame, metadata) items through from source while writing the
+        metadata to a temporary file; it becomes the entry only if source runs
+        to completion (and keep(), if given, still returns true then).
+        """
+        path = self._entry_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        complete = False
+        try:
+            with gzip.open(tmp, 'wt', compresslevel=3) as f:
+                for frame, metadata in source:
+                    f.write(json.dumps(metadata, separators=(',', ':')) + '\n')
+                    yield frame, metadata
+            complete = keep is None or keep()
+        finally:
+            source.close()
+            if complete:
+                os.replace(tmp, path)
+                self.evict()
+            elif os.path.exists(tmp):
+                os.remove(tmp)
+
+    def replay(self, video_path, key, prepare=None):
+        """
+        Yield (frame, metadata) from the cache entry. Frames without a record
+        are only grab()bed, never converted; prepare(frame) (e.g. the display
+        resize) is applied to the frames that are yielded.
+        """
+        cap = cv2.VideoCapture(video_path)
+        try:
+            with gzip.open(self._entry_path(key), 'rt') as f:
+                frame_count = 0
+                for line in f:
+                    metadata = json.loads(line)
+                    # Record frame numbers are 1-based, like analyze_frames' frame_count
+                    while frame_count < metadata['frame'] - 1:
+                        if not cap.grab():
+                            return
+                        frame_count += 1
+                    ret, frame = cap.read()
+                    if not ret:
+                        return
+                    frame_count += 1
+                    yield (prepare(frame) if prepare else frame), metadata
+        finally:
+            cap.release()
+
+    def logged(self, key):
+        """Violation keys already reported for this video + pipeline."""
+        path = self._logged_path(key)
+        if not os.path.exists(path):
+            return set()
+        with open(path) as f:
+            return {line.rstrip('\n') for line in f if line.strip()}
+
+    def mark_logged(self, key, item):
+        with self._lock:
+            with open(self._logged_path(key), 'a') as f:
+                f.write(item + '\n')
+
+    def size(self):
+        return sum(e.stat().st_size for e in os.scandir(self.directory) if e.is_file())
+
+    def evict(self):
+        """
+        Delete least recently used files until the directory fits max_bytes:
+        entries (with their .logged file), .logged files without an entry, and
+        .tmp files of writers that died (older than STALE_TMP_S).
+        """
+        stale = time.time() - self.STALE_TMP_S
+        with self._lock:
+            files = {e.name: e for e in os.scandir(self.directory) if e.is_file()}
+            total = sum(e.stat().st_size for e in files.values())
+            entries = {name[:-len('.jsonl.gz')] for name in files if name.endswith('.jsonl.gz')}
+            candidates = []  # (mtime, files removed together)
+            for name, e in files.items():
+                if name.endswith('.jsonl.gz'):
+                    logged = files.get(name[:-len('.jsonl.gz')] + '.logged')
+                    candidates.append((e.stat().st_mtime, [e, logged] if logged else [e]))
+                elif name.endswith('.logged') and name[:-len('.logged')] not in entries:
+                    candidates.append((e.stat().st_mtime, [e]))
+                elif name.endswith('.tmp') and e.stat().st_mtime < stale:
+                    candidates.append((e.stat().st_mtime, [e]))
+            for _, group in sorted(candidates, key=lambda c: c[0]):
+                if total <= self.max_bytes:
+                    break
+                for e in group:
+                    total -= e.stat().st_size
+                    try:
+                        os.remove(e.path)
+                    except FileNotFoundError:
+                        pass  # a writer finished or cleaned up meanwhile
@@ -0,0 +1,202 @@
+"""
+Typed, columnar storage for per-frame detection results.
+
+util.write_csv stores boxes as strings like '[x1 y1 x2 y2]' that every reader
+has to parse back. Here boxes are four numeric columns each and the file is
+Parquet, written incrementally in row groups while a video is processed:
+
+    with ResultsWriter('processed/video_results.parquet') as writer:
+        writer.add(frame_nmr, car_id, car_bbox, plate_bbox, plate_bbox_score, text, text_score)
+
+read_results() returns a pandas DataFrame with the same columns for Parquet
+files and legacy CSVs, so consumers don't care which format they were given.
+CSV stays available as an export (export_csv / write_dataframe).
+"""
+import numpy as np
+import pandas as pd
+
+CAR_BBOX_COLS = ['car_x1', 'car_y1', 'car_x2', 'car_y2']
+PLATE_BBOX_COLS = ['license_plate_x1', 'license_plate_y1', 'license_plate_x2', 'license_plate_y2']
+COLUMNS = (['frame_nmr', 'car_id'] + CAR_BBOX_COLS + PLATE_BBOX_COLS +
+           ['license_plate_bbox_score', 'license_number', 'license_number_score'])
+CSV_HEADER = ['frame_nmr', 'car_id', 'car_bbox', 'license_plate_bbox', 'license_plate_bbox_score',
+              'license_number', 'license_number_score']
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet results need pyarrow: pip install pyarrow")
+    return pa, pq
+
+
+def schema():
+    pa, _ = _pyarrow()
+    fields = [pa.field('frame_nmr', pa.int64()), pa.field('car_id', pa.int64())]
+    fields += [pa.field(c, pa.float64()) for c in CAR_BBOX_COLS + PLATE_BBOX_COLS]
+    fields += [pa.field('license_plate_bbox_score', pa.float64()),
+               pa.field('license_number', pa.string()),
+               pa.field('license_number_score', pa.float64())]
+    return pa.schema(fields)
+
+
+def is_parquet(path):
+    return str(path).endswith(('.parquet', '.pq'))
+
+
+class ResultsWriter:
+    """
+    Appends result rows and flushes them to a Parquet file one row group at a
+    time, so a long video never holds more than row_group_size rows in memory.
+    """
+
+    def __init__(self, path, row_group_size=10000):
+        pa, pq = _pyarrow()
+        self.path = path
+        self.row_group_size = row_group_size
+        self._schema = schema()
+        self._writer = pq.ParquetWriter(path, self._schema, compression='zstd')
+        self._buffer = {c: [] for c in COLUMNS}
+        self.rows_written = 0
+
+    def add(self, frame_nmr, car_id, car_bbox, license_plate_bbox,
+            license_plate_bbox_score, license_number, license_number_score):
+        b = self._buffer
+        b['frame_nmr'].append(int(frame_nmr))
+        b['car_id'].append(int(car_id))
+        for col, value in zip(CAR_BBOX_COLS, car_bbox):
+            b[col].append(float(value))
+        for col, value in zip(PLATE_BBOX_COLS, license_plate_bbox):
+            b[col].append(float(value))
+        b['license_plate_bbox_score'].append(float(license_plate_bbox_score))
+        b['license_number'].append(str(license_number))
+        b['license_number_score'].append(float(license_number_score))
+        if len(b['frame_nmr']) >= self.row_group_size:
+            self.flush()
+
+    def add_frame(self, frame_nmr, frame_results):
+        """
+        Add one frame of the nested results dict used by util.write_csv:
+        {car_id: {'car': {'bbox': ...}, 'license_plate': {'bbox', 'bbox_score', 'text', 'text_score'}}}
+        """
+        for car_id, entry in frame_results.items():
+            if 'car' in entry and 'license_plate' in entry and 'text' in entry['license_plate']:
+                plate = entry['license_plate']
+                self.add(frame_nmr, car_id, entry['car']['bbox'], plate['bbox'],
+                         plate['bbox_score'], plate['text'], plate['text_score'])
+
+    def flush(self):
+        pa, _ = _pyarrow()
+        if not self._buffer['frame_nmr']:
+            return
+        table = pa.Table.from_pydict(self._buffer, schema=self._schema)
+        self._writer.write_table(table)
+        self.rows_written += table.num_rows
+        self._buffer = {c: [] for c in COLUMNS}
+
+    def close(self):
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_bbox_column(column):
+    """
+    Vectorised parse of '[x1 y1 x2 y2]' (or 'x1 y1 x2 y2') strings into an
+    (N, 4) array. Raises ValueError naming the first row without 4 numbers.
+    """
+    # Rows are parsed as one string, so a short or long row would shift every
+    # later box: check the count per row first (brackets only re-checked when
+    # they are split off as separate tokens)
+    counts = np.fromiter(map(len, map(str.split, column)), np.int64, len(column))
+    for i in np.flatnonzero(counts != 4).tolist():
+        if len(column[i].replace('[', ' ').replace(']', ' ').split()) != 4:
+            raise ValueError(f"row {i}: expected 4 bbox numbers, got {column[i]!r}")
+    text = ' '.join(column).replace('[', ' ').replace(']', ' ')
+    return np.array(text.split(), dtype=float).reshape(-1, 4)
+
+
+def read_results(path, columns=None):
+    """
+    Load a results file (Parquet or legacy CSV) as a DataFrame with numeric
+    bbox columns (see COLUMNS).
+    """
+    if is_parquet(path):
+        _, pq = _pyarrow()
+        return pq.read_table(path, columns=columns).to_pandas()
+
+    df = pd.read_csv(path, dtype={'license_number': str})
+    car = parse_bbox_column(df['car_bbox'].astype(str).tolist())
+    plate = parse_bbox_column(df['license_plate_bbox'].astype(str).tolist())
+    out = pd.DataFrame({'frame_nmr': df['frame_nmr'].astype(np.int64),
+                        'car_id': df['car_id'].astype(float).astype(np.int64)})
+    for i, col in enumerate(CAR_BBOX_COLS):
+        out[col] = car[:, i]
+    for i, col in enumerate(PLATE_BBOX_COLS):
+        out[col] = plate[:, i]
+    out['license_plate_bbox_score'] = df['license_plate_bbox_score'].astype(float)
+    out['license_number'] = df['license_number'].fillna('0').astype(str)
+    out['license_number_score'] = df['license_number_score'].astype(float)
+    return out[columns] if columns else out
+
+
+def iter_rows(path, batch_size=65536):
+    """
+    Stream a results file as legacy row dicts (string bboxes), one record batch
+    at a time; used by add_missing_data's streaming mode.
+    """
+    if not is_parquet(path):
+        import csv
+        with open(path, 'r') as f:
+            yield from csv.DictReader(f)
+        return
+
+    _, pq = _pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        cols = batch.to_pydict()
+        for i in range(batch.num_rows):
+            yield {
+                'frame_nmr': str(cols['frame_nmr'][i]),
+                'car_id': str(cols['car_id'][i]),
+                'car_bbox': '[{} {} {} {}]'.format(*(cols[c][i] for c in CAR_BBOX_COLS)),
+                'license_plate_bbox': '[{} {} {} {}]'.format(*(cols[c][i] for c in PLATE_BBOX_COLS)),
+                'license_plate_bbox_score': str(cols['license_plate_bbox_score'][i]),
+                'license_number': cols['license_number'][i],
+                'license_number_score': str(cols['license_number_score'][i]),
+            }
+
+
+def write_dataframe(df, path):
+    """Write a results DataFrame as Parquet, or as the legacy string-bbox CSV for .csv paths."""
+    if is_parquet(path):
+        pa, pq = _pyarrow()
+        pq.write_table(pa.Table.from_pandas(df[COLUMNS], schema=schema(), preserve_index=False), path,
+                       compression='zstd')
+        return
+
+    car = df[CAR_BBOX_COLS].to_numpy()
+    plate = df[PLATE_BBOX_COLS].to_numpy()
+    legacy = pd.DataFrame({
+        'frame_nmr': df['frame_nmr'],
+        'car_id': df['car_id'],
+        'car_bbox': ['[{} {} {} {}]'.format(*b) for b in car.tolist()],
+        'license_plate_bbox': ['[{} {} {} {}]'.format(*b) for b in plate.tolist()],
+        'license_plate_bbox_score': df['license_plate_bbox_score'],
+        'license_number': df['license_number'],
+        'license_number_score': df['license_number_score'],
+    })
+    legacy.to_csv(path, index=False, columns=CSV_HEADER)
+
+
+def export_csv(results_path, csv_path):
+    """Convert a Parquet results file to the legacy CSV layout."""
+    write_dataframe(read_results(results_path), csv_path)
@@ -0,0 +1,419 @@
+"""
+Model runtime backends for the vehicle detector and the plate recogniser.
+
+MODEL_BACKEND selects the implementation:
+    torch  - ultralytics YOLO + easyocr.Reader (original eager PyTorch path)
+    onnx   - ONNX Runtime sessions over models exported by export_models.py
+
+MODEL_PROFILE picks the ONNX weights for the deployment:
+    fp32   - plain exports (default)
+    int8   - statically quantised copies written by quantize_models.py
+
+The ONNX path never imports torch, so it also starts much faster. If the
+exported files are missing (or onnxruntime is not installed) we fall back to
+the PyTorch path so the service always comes up.
+"""
+import ast
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import logs
+from tracker import IouTracker
+
+log = logs.get_logger("runtime")
+
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch").lower()
+MODEL_PROFILE = os.getenv("MODEL_PROFILE", "fp32").lower()
+
+# ONNX Runtime tuning. 0 lets ORT pick (one thread per physical core).
+# Inter-op threads only matter for graphs with parallel branches; YOLO and the
+# CRNN recogniser are sequential, so 1 avoids oversubscribing the cores.
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+# cpu | openvino (needs the onnxruntime-openvino build)
+ORT_PROVIDER = os.getenv("ORT_PROVIDER", "cpu").lower()
+
+# The weights next to this file (./ai_service/yolov8n.pt from the repository
+# root), else the bare name, which ultralytics resolves in the cwd or downloads
+_BUNDLED_WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolov8n.pt')
+DETECTOR_WEIGHTS = _BUNDLED_WEIGHTS if os.path.exists(_BUNDLED_WEIGHTS) else 'yolov8n.pt'
+DETECTOR_ONNX = os.path.join(MODELS_DIR, 'yolov8n.onnx')
+RECOGNIZER_ONNX = os.path.join(MODELS_DIR, 'plate_recognizer.onnx')
+RECOGNIZER_META = os.path.join(MODELS_DIR, 'plate_recognizer.json')
+
+OCR_ALLOWLIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+PROFILES = ('fp32', 'int8')
+# Fail at startup rather than on every analysis (model_fingerprint) for a mistyped profile
+if MODEL_PROFILE not in PROFILES:
+    raise ValueError(f"MODEL_PROFILE must be one of {', '.join(PROFILES)}, got {MODEL_PROFILE!r}")
+
+
+def profile_path(fp32_path, profile):
+    """models/yolov8n.onnx -> models/yolov8n.int8.onnx for the int8 profile."""
+    if profile not in PROFILES:
+        raise ValueError(f"profile must be one of {', '.join(PROFILES)}, got {profile!r}")
+    if profile == 'fp32':
+        return fp32_path
+    root, ext = os.path.splitext(fp32_path)
+    return f"{root}.{profile}{ext}"
+
+
+class Detections:
+    """
+    Backend-neutral detection result for one frame.
+    xyxy: (N, 4) float32, conf: (N,) float32, cls: (N,) int64,
+    ids: (N,) int64 track IDs, or None when the frame was not tracked.
+    """
+    __slots__ = ('xyxy', 'conf', 'cls', 'ids')
+
+    def __init__(self, xyxy, conf, cls, ids=None):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.ids = ids
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64))
+
+    @property
+    def xywh(self):
+        """Center-x, center-y, width, height (same layout as ultralytics boxes.xywh)."""
+        xy = (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+        wh = self.xyxy[:, 2:] - self.xyxy[:, :2]
+        return np.hstack([xy, wh])
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+def session_options():
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ORT_INTRA_OP_THREADS > 0:
+        opts.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    opts.inter_op_num_threads = max(1, ORT_INTER_OP_THREADS)
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL if ORT_INTER_OP_THREADS <= 1 else ort.ExecutionMode.ORT_PARALLEL
+    return opts
+
+
+def session_providers():
+    import onnxruntime as ort
+
+    available = ort.get_available_providers()
+    if ORT_PROVIDER == 'openvino' and 'OpenVINOExecutionProvider' in available:
+        return ['OpenVINOExecutionProvider', 'CPUExecutionProvider']
+    return ['CPUExecutionProvider']
+
+
+# --- Vehicle detector ---
+
+def _from_ultralytics(boxes):
+    if boxes is None or len(boxes) == 0:
+        return Detections.empty()
+    ids = boxes.id.int().cpu().numpy().astype(np.int64) if boxes.id is not None else None
+    return Detections(boxes.xyxy.cpu().numpy().astype(np.float32),
+                      boxes.conf.cpu().numpy().astype(np.float32),
+                      boxes.cls.int().cpu().numpy().astype(np.int64),
+                      ids)
+
+
+class TorchDetector:
+    """Original path: eager PyTorch via ultralytics."""
+    backend = 'torch'
+
+    def __init__(self, weights=DETECTOR_WEIGHTS):
+        from ultralytics import YOLO
+        self.model = YOLO(weights)
+        self.names = self.model.names
+
+    def predict(self, frames, classes=None, imgsz=640, conf=0.25):
+        results = self.model.predict(frames, classes=classes, imgsz=imgsz, conf=conf, verbose=False)
+        return [_from_ultralytics(r.boxes) for r in results]
+
+    def track(self, frame, classes=None, imgsz=640):
+        # persist=True keeps the tracker inside self.model: one state for every
+        # stream using this detector (camera setting tracker='detector' only)
+        results = self.model.track(frame, persist=True, classes=classes, verbose=False, imgsz=imgsz)
+        return _from_ultralytics(results[0].boxes if results else None)
+
+
+def letterbox(image, size):
+    """
+    Resize keeping aspect ratio and pad to size x size (ultralytics convention).
+    Returns the padded image, the scale and the (left, top) padding.
+    """
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    if (nh, nw) != (h, w):
+        image = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    padded = cv2.copyMakeBorder(image, top, size - nh - top, left, size - nw - left,
+                                cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return padded, scale, (left, top)
+
+
+def nms(xyxy, scores, cls, iou_threshold):
+    """Class-aware NMS; returns kept indices sorted by score."""
+    if len(xyxy) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Offset boxes per class so one NMS pass never suppresses across classes
+    offset = cls[:, None].astype(np.float32) * 4096.0
+    shifted = xyxy + offset
+    rects = np.hstack([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]])
+    keep = cv2.dnn.NMSBoxes(rects.tolist(), scores.tolist(), 0.0, iou_threshold)
+    return np.asarray(keep, dtype=np.int64).reshape(-1)
+
+
+class OnnxDetector:
+    """YOLOv8 exported to ONNX, run with ONNX Runtime."""
+    backend = 'onnx'
+
+    def __init__(self, path=DETECTOR_ONNX):
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(path, sess_options=session_options(), providers=session_providers())
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.imgsz = inp.shape[2] if isinstance(inp.shape[2], int) else 640
+        # Static-batch exports can only take one image per run
+        self.max_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta['names']) if 'names' in meta else {}
+        self.tracker = IouTracker()
+
+    def _infer(self, batch):
+        if self.max_batch is None:
+            return self.session.run(None, {self.input_name: batch})[0]
+        return np.concatenate([self.session.run(None, {self.input_name: batch[i:i + self.max_batch]})[0]
+                               for i in range(0, len(batch), self.max_batch)])
+
+    def predict(self, frames, classes=None, imgsz=None, conf=0.25, iou=0.45):
+        size = self.imgsz if self.max_batch is not None or imgsz is None else imgsz
+        prepared = [letterbox(f, size) for f in frames]
+        batch = np.stack([p[0] for p in prepared])[..., ::-1].transpose(0, 3, 1, 2)  # BGR->RGB, NHWC->NCHW
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+        output = self._infer(batch)  # (B, 4 + num_classes, anchors)
+        results = []
+        for pred, (_, scale, (left, top)) in zip(output, prepared):
+            pred = pred.T
+            scores_all = pred[:, 4:]
+            cls = scores_all.argmax(axis=1)
+            scores = scores_all[np.arange(len(cls)), cls]
+            mask = scores >= conf
+            if classes is not None:
+                mask &= np.isin(cls, classes)
+            boxes, scores, cls = pred[mask, :4], scores[mask], cls[mask]
+
+            xyxy = np.empty_like(boxes)
+            xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+            xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+            keep = nms(xyxy, scores, cls, iou)
+            xyxy, scores, cls = xyxy[keep], scores[keep], cls[keep]
+
+            # Undo letterbox
+            xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - left) / scale
+            xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - top) / scale
+            results.append(Detections(xyxy.astype(np.float32), scores.astype(np.float32), cls.astype(np.int64)))
+        return results
+
+    def track(self, frame, classes=None, imgsz=640):
+        # Shared by every stream using this detector, like TorchDetector.track
+        return self.tracker.update(self.predict([frame], classes=classes, imgsz=imgsz)[0])
+
+
+# --- Plate recogniser ---
+
+class OnnxPlateReader:
+    """
+    EasyOCR's CRNN recogniser exported to ONNX.
+
+    Exposes readtext() with the same (bbox, text, score) output as
+    easyocr.Reader so util.read_license_plate works unchanged. Text lines are
+    located with a cheap morphological pass instead of the CRAFT detector.
+    """
+    backend = 'onnx'
+
+    def __init__(self, path=RECOGNIZER_ONNX, meta_path=RECOGNIZER_META):
+        import onnxruntime as ort
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.characters = ['[blank]'] + list(meta['characters'])
+        self.img_h = meta.get('imgH', 64)
+        self.session = ort.InferenceSession(path, sess_options=session_options(), providers=session_providers())
+        self.input_name = self.session.get_inputs()[0].name
+        self._ignore_cache = {}
+
+    def _ignore_idx(self, allowlist):
+        if allowlist not in self._ignore_cache:
+            self._ignore_cache[allowlist] = np.array(
+                [i for i, c in enumerate(self.characters) if i > 0 and allowlist and c not in allowlist], dtype=np.int64)
+        return self._ignore_cache[allowlist]
+
+    def _text_regions(self, gray):
+        """Candidate text-line boxes (x1, y1, x2, y2); always includes the whole crop."""
+        h, w = gray.shape[:2]
+        regions = [(0, 0, w, h)]
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, w // 40), max(3, h // 30)))
+        grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+        _, binary = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE,
+                                  cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, w // 15), 3)))
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for c in contours:
+            x, y, cw, ch = cv2.boundingRect(c)
+            if ch < 8 or cw < 2 * ch or cw > 12 * ch:
+                continue
+            regions.append((x, y, x + cw, y + ch))
+        return regions[:6]
+
+    def _recognise(self, line, ignore_idx):
+        h, w = line.shape[:2]
+        new_w = max(self.img_h, int(np.ceil(self.img_h * w / h)))
+        line = cv2.resize(line, (new_w, self.img_h), interpolation=cv2.INTER_LINEAR)
+        x = ((line.astype(np.float32) / 255.0) - 0.5) / 0.5
+        logits = self.session.run(None, {self.input_name: x[None, None]})[0][0]  # (T, C)
+
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs /= probs.sum(axis=1, keepdims=True)
+        if len(ignore_idx):
+            probs[:, ignore_idx] = 0
+            probs /= probs.sum(axis=1, keepdims=True)
+
+        idx = probs.argmax(axis=1)
+        max_probs = probs[np.arange(len(idx)), idx]
+        # Greedy CTC decode: collapse repeats, drop blanks
+        keep = (idx != 0) & np.concatenate([[True], idx[1:] != idx[:-1]])
+        text = ''.join(self.characters[i] for i in idx[keep])
+        # Same confidence as easyocr's custom_mean
+        confident = max_probs[idx != 0]
+        score = float(confident.prod() ** (2.0 / np.sqrt(len(confident)))) if len(confident) else 0.0
+        return text, score
+
+    def readtext(self, image, allowlist=None):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        ignore_idx = self._ignore_idx(allowlist)
+        detections = []
+        for x1, y1, x2, y2 in self._text_regions(gray):
+            text, score = self._recognise(gray[y1:y2, x1:x2], ignore_idx)
+            if text:
+                detections.append(([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], text, score))
+        return detections
+
+
+def _onnx_ready(*paths):
+    if not all(os.path.exists(p) for p in paths):
+        return False
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def load_detector(backend=None, profile=None):
+    backend = (backend or MODEL_BACKEND).lower()
+    profile = (profile or MODEL_PROFILE).lower()
+    if backend == 'onnx':
+        path = profile_path(DETECTOR_ONNX, profile)
+        if _onnx_ready(path):
+            log.info("Loading ONNX detector (%s) from %s", profile, path)
+            return OnnxDetector(path)
+        log.warning("%s or onnxruntime missing, falling back to PyTorch detector", path)
+    log.info("Loading %s model", DETECTOR_WEIGHTS)
+    return TorchDetector(DETECTOR_WEIGHTS)
+
+
+def load_plate_reader(backend=None, profile=None):
+    backend = (backend or MODEL_BACKEND).lower()
+    profile = (profile or MODEL_PROFILE).lower()
+    if backend == 'onnx':
+        path = profile_path(RECOGNIZER_ONNX, profile)
+        if _onnx_ready(path, RECOGNIZER_META):
+            log.info("Loading ONNX plate recogniser (%s) from %s", profile, path)
+            return OnnxPlateReader(path, RECOGNIZER_META)
+        log.warning("%s or onnxruntime missing, falling back to EasyOCR", path)
+    import easyocr
+    return easyocr.Reader(['en'], gpu=False)
+
+
+def model_fingerprint():
+    """
+    Identifies the models the service would run with: backend, profile and
+    size/mtime of every model file that can be loaded. Changes whenever a
+    model is re-exported, re-quantised or swapped. Loads nothing.
+    """
+    parts = [MODEL_BACKEND, MODEL_PROFILE]
+    paths = [DETECTOR_WEIGHTS, profile_path(DETECTOR_ONNX, MODEL_PROFILE),
+             profile_path(RECOGNIZER_ONNX, MODEL_PROFILE), RECOGNIZER_META]
+    for path in paths:
+        if os.path.exists(path):
+            st = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}")
+    return '|'.join(parts)
+
+
+# --- Shared, lazily-loaded instances used by the service ---
+#
+# Nothing heavy happens at import time: the first caller (or warmup()) loads
+# the model, later callers get the same instance. Seconds spent per step are
+# kept in load_timings for the readiness endpoint and check_startup.py.
+
+_lock = threading.Lock()
+_detector = None
+_plate_reader = None
+ready = threading.Event()
+load_timings = {}
+
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        with _lock:
+            if _detector is None:
+                start = time.perf_counter()
+                _detector = load_detector()
+                load_timings['detector_load'] = round(time.perf_counter() - start, 3)
+    return _detector
+
+
+def get_plate_reader():
+    global _plate_reader
+    if _plate_reader is None:
+        with _lock:
+            if _plate_reader is None:
+                start = time.perf_counter()
+                _plate_reader = load_plate_reader()
+                load_timings['plate_reader_load'] = round(time.perf_counter() - start, 3)
+    return _plate_reader
+
+
+def warmup():
+    """
+    Load both models and run one dummy inference each so the first real
+    frame doesn't pay for lazy allocations. Sets `ready` when done.
+    """
+    detector = get_detector()
+    start = time.perf_counter()
+    detector.predict([np.zeros((640, 640, 3), dtype=np.uint8)])
+    load_timings['detector_warmup'] = round(time.perf_counter() - start, 3)
+
+    reader = get_plate_reader()
+    start = time.perf_counter()
+    reader.readtext(np.zeros((64, 256), dtype=np.uint8), allowlist=OCR_ALLOWLIST)
+    load_timings['plate_reader_warmup'] = round(time.perf_counter() - start, 3)
+
+    ready.set()
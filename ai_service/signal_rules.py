@@ -0,0 +1,340 @@
+"""
+Red-light and stop-line rules for cameras at signals.
+
+A camera at a signal configures (camera_config.py, fractions of the frame so
+they survive analysis_width changes):
+
+    stop_line:     [x1, y1, x2, y2]; traffic approaches from the right-hand
+                   side of x1,y1 -> x2,y2 as seen on screen: from below a
+                   line drawn left to right (swap the ends to flip it)
+    signal_source: a timeline file or http(s) URL (below), or
+    signal_lamp:   [x1, y1, x2, y2] around the signal head facing the camera,
+                   whose colour is sampled when there is no signal_source
+
+Violations, each reported once per track:
+    RED LIGHT - the track's reference point (bottom centre of its box)
+                crosses the stop line, from the approach side, while red;
+    STOP LINE - a stationary vehicle stands on the stop line while red.
+
+StopLineRule keeps one small state per track and checks only the step from
+its previous point to the current one, so the per-frame cost is a handful of
+cross products per vehicle.
+
+Camera configs can be changed over the API, so signal_source is limited
+(check_source) to files under SIGNAL_TIMELINE_DIR (default signals/) and to
+URLs starting with one of SIGNAL_URL_PREFIXES (comma-separated, e.g.
+"http://signals.local/"; none by default).
+
+Timeline documents (JSON) give the state over time, in seconds into the
+video ("clock": "stream", default) or Unix time ("clock": "wall", for live
+cameras):
+
+    {"clock": "stream", "events": [[0, "green"], [25, "amber"], [28, "red"], [55, "green"]]}
+    {"clock": "wall", "start": 1760000000, "cycle": [["green", 30], ["amber", 3], ["red", 27]]}
+
+A file is re-read when it changes; a URL is re-fetched every refresh seconds
+on a background thread. Stand-in for a signal controller feed:
+
+    python signal_rules.py serve timeline.json [--port 8765]
+"""
+import argparse
+import bisect
+import hashlib
+import http.server
+import json
+import os
+import threading
+import time
+import urllib.request
+
+import cv2
+import numpy as np
+
+import logs
+
+log = logs.get_logger("signal")
+
+RED, AMBER, GREEN = 'red', 'amber', 'green'
+STATES = (RED, AMBER, GREEN)
+
+SIGNAL_TIMELINE_DIR = os.getenv("SIGNAL_TIMELINE_DIR", "signals")
+# Prefixes end at a path boundary, so http://signals.local does not allow http://signals.local.example.com
+SIGNAL_URL_PREFIXES = tuple(p.strip().rstrip('/') + '/' for p in os.getenv("SIGNAL_URL_PREFIXES", "").split(",")
+                            if p.strip())
+
+
+def side(point, line):
+    """
+    > 0 when point is right of the direction x1,y1 -> x2,y2 as seen on screen
+    (image y points down), < 0 left of it, 0 on it.
+    """
+    x1, y1, x2, y2 = line
+    return (x2 - x1) * (point[1] - y1) - (y2 - y1) * (point[0] - x1)
+
+
+def crosses(prev, curr, line):
+    """True when the step prev -> curr goes from the approach side onto or past the line segment."""
+    if side(prev, line) <= 0 or side(curr, line) > 0:
+        return False
+    # The step's ends straddle the line; it must also pass between the line's ends
+    step = (prev[0], prev[1], curr[0], curr[1])
+    return side(line[:2], step) * side(line[2:], step) <= 0
+
+
+def on_line(xyxy, line):
+    """True when the line segment passes through the box."""
+    x1, y1, x2, y2 = xyxy
+    if max(line[0], line[2]) < x1 or min(line[0], line[2]) > x2 or \
+            max(line[1], line[3]) < y1 or min(line[1], line[3]) > y2:
+        return False
+    sides = [side(corner, line) for corner in ((x1, y1), (x2, y1), (x1, y2), (x2, y2))]
+    return min(sides) <= 0 <= max(sides)
+
+
+class StopLineRule:
+    """
+    Incremental RED LIGHT / STOP LINE checks for one stream: check() every
+    vehicle of a frame, then end_frame(). line in analysis-frame pixels;
+    stationary_frames: frames a vehicle must stand still (speed 0) on the
+    line before STOP LINE; tracks unseen for max_age frames are forgotten.
+    """
+
+    def __init__(self, line, stationary_frames=3, max_age=30):
+        self.line = tuple(float(v) for v in line)
+        self.stationary_frames = stationary_frames
+        self.max_age = max_age
+        self.frame = 0  # frames checked so far
+        self.tracks = {}  # track id -> [previous point, frame last seen, frames stationary on the line, flagged]
+
+    def check(self, track_id, xyxy, speed, state):
+        """Violations of this track so far (each flagged once, then kept)."""
+        point = ((xyxy[0] + xyxy[2]) / 2, xyxy[3])
+        track = self.tracks.get(track_id)
+        if track is None:
+            track = self.tracks[track_id] = [point, self.frame, 0, []]
+        elif state == RED:
+            flagged = track[3]
+            if "RED LIGHT" not in flagged and crosses(track[0], point, self.line):
+                flagged.append("RED LIGHT")
+            if "STOP LINE" not in flagged:
+                track[2] = track[2] + 1 if speed == 0 and on_line(xyxy, self.line) else 0
+                if track[2] >= self.stationary_frames:
+                    flagged.append("STOP LINE")
+        else:
+            track[2] = 0
+        track[0], track[1] = point, self.frame
+        return track[3]
+
+    def end_frame(self):
+        self.frame += 1
+        if self.frame % self.max_age == 0:
+            for track_id in [t for t, track in self.tracks.items() if self.frame - track[1] > self.max_age]:
+                del self.tracks[track_id]
+
+
+class Timeline:
+    """Signal state at a time, from a timeline document (see the module docstring)."""
+
+    def __init__(self, document):
+        if not isinstance(document, dict):
+            raise ValueError("timeline must be an object")
+        self.clock = document.get('clock', 'stream')
+        if self.clock not in ('stream', 'wall'):
+            raise ValueError(f"clock: expected stream or wall, got {self.clock!r}")
+        self.cycle = None
+        if 'cycle' in document:
+            phases = [(str(state), float(seconds)) for state, seconds in document['cycle']]
+            if not phases or any(state not in STATES or seconds <= 0 for state, seconds in phases):
+                raise ValueError(f"cycle: expected [[state, seconds > 0], ...] with states {', '.join(STATES)}")
+            self.cycle = phases
+            self.period = sum(seconds for _, seconds in phases)
+            self.start = float(document.get('start', 0))
+            self.ends = np.cumsum([seconds for _, seconds in phases]).tolist()
+        else:
+            events = sorted((float(t), str(state)) for t, state in document.get('events', []))
+            if any(state not in STATES for _, state in events):
+                raise ValueError(f"events: states must be one of {', '.join(STATES)}")
+            self.times = [t for t, _ in events]
+            self.states = [state for _, state in events]
+
+    def state(self, t):
+        """The state at t (seconds on this timeline's clock); None before the first event."""
+        if self.cycle:
+            phase = bisect.bisect_right(self.ends, (t - self.start) % self.period)
+            return self.cycle[min(phase, len(self.cycle) - 1)][0]
+        i = bisect.bisect_right(self.times, t)
+        return self.states[i - 1] if i else None
+
+
+def check_source(source):
+    """Raises ValueError unless source is empty, an allowed URL or a file under SIGNAL_TIMELINE_DIR."""
+    if not source:
+        return
+    if source.startswith(('http://', 'https://')):
+        if not source.startswith(SIGNAL_URL_PREFIXES):
+            raise ValueError("URL not in SIGNAL_URL_PREFIXES")
+        return
+    if '://' in source:
+        raise ValueError("expected a timeline file or an http(s) URL")
+    root = os.path.realpath(SIGNAL_TIMELINE_DIR)
+    if os.path.commonpath([root, os.path.realpath(source)]) != root:
+        raise ValueError(f"timeline files must be under {SIGNAL_TIMELINE_DIR}")
+
+
+def source_fingerprint(source):
+    """
+    Result-cache fingerprint of a signal_source: a hash of the timeline
+    file's content ("" without a source or readable file), None for a URL,
+    whose timeline can change at any time (not cacheable).
+    """
+    if not source:
+        return ""
+    if source.startswith(('http://', 'https://')):
+        return None
+    try:
+        with open(source, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except OSError:
+        return ""
+
+
+class TimelineFeed:
+    """
+    A camera's signal timeline from a JSON file or an http(s) URL. state()
+    never waits on I/O: files are checked (one stat) every refresh seconds,
+    URLs fetched on a background thread. An invalid or unreachable document
+    keeps the last good timeline; the state is None until there is one.
+    """
+
+    def __init__(self, source, refresh=5.0, timeout=2.0):
+        self.source = source
+        self.remote = source.startswith(('http://', 'https://'))
+        self.refresh = refresh
+        self.timeout = timeout
+        self.timeline = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._fetching = False
+
+    def state(self, pts):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.refresh
+            if self.remote:
+                if not self._fetching:
+                    self._fetching = True
+                    threading.Thread(target=self._fetch, daemon=True).start()
+            else:
+                self._reload()
+        timeline = self.timeline
+        if timeline is None:
+            return None
+        return timeline.state(time.time() if timeline.clock == 'wall' else pts)
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.source).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+            with open(self.source) as f:
+                self._set(json.load(f))
+        except (OSError, ValueError, TypeError) as e:
+            log.error("Ignoring signal timeline %s: %s", self.source, e)
+
+    def _fetch(self):
+        try:
+            with urllib.request.urlopen(self.source, timeout=self.timeout) as response:
+                self._set(json.load(response))
+        except (OSError, ValueError, TypeError) as e:
+            log.warning("Signal timeline %s unavailable: %s", self.source, e)
+        finally:
+            self._fetching = False
+
+    def _set(self, document):
+        timeline = Timeline(document)
+        if self.timeline is None:
+            log.info("Signal timeline loaded from %s", self.source)
+        self.timeline = timeline
+
+
+class LampSignal:
+    """
+    Signal state from the colour of the lit lamp in an ROI of the frame
+    (fractions [x1, y1, x2, y2]). Only bright, saturated pixels count; the
+    state changes after `confirm` consecutive identical readings, so one
+    washed-out or compression-damaged frame does not flip it.
+    PERFORMANCE: the ROI is a few hundred pixels, one HSV conversion per frame.
+    """
+    # OpenCV hue is 0-179
+    HUES = ((RED, 0, 10), (AMBER, 11, 34), (GREEN, 35, 100), (RED, 160, 179))
+
+    def __init__(self, roi, min_value=170, min_saturation=90, min_lit=0.03, confirm=2):
+        self.roi = roi
+        self.min_value = min_value
+        self.min_saturation = min_saturation
+        self.min_lit = min_lit
+        self.confirm = confirm
+        self.current = None
+        self._candidate = None
+        self._seen = 0
+
+    def read(self, frame):
+        """The lit colour in this frame's ROI, or None."""
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = self.roi
+        crop = frame[int(y1 * height):max(int(y2 * height), int(y1 * height) + 1),
+                     int(x1 * width):max(int(x2 * width), int(x1 * width) + 1)]
+        if crop.size == 0:
+            return None
+        hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV).reshape(-1, 3)
+        lit = hsv[(hsv[:, 2] >= self.min_value) & (hsv[:, 1] >= self.min_saturation), 0]
+        if len(lit) < self.min_lit * len(hsv):
+            return None
+        votes = {}
+        for state, low, high in self.HUES:
+            votes[state] = votes.get(state, 0) + int(np.count_nonzero((lit >= low) & (lit <= high)))
+        return max(votes, key=votes.get) if any(votes.values()) else None
+
+    def state(self, frame):
+        reading = self.read(frame)
+        if reading == self._candidate:
+            self._seen += 1
+        else:
+            self._candidate, self._seen = reading, 1
+        if self._seen >= self.confirm:
+            self.current = reading
+        return self.current
+
+
+def serve(path, port):
+    """Serve the timeline file at any URL path (a stand-in for a signal controller feed)."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print(f"Serving {path} at http://127.0.0.1:{port}/")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Signal timeline tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='Serve a timeline file over HTTP')
+    serve_parser.add_argument('timeline')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    with open(args.timeline) as f:
+        Timeline(json.load(f))  # fail early on an invalid file
+    serve(args.timeline, args.port)
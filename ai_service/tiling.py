@@ -0,0 +1,158 @@
+"""
+Tiled inference for high-resolution cameras.
+
+Downscaling a 4K frame to 640 px leaves distant bikes and plates only a few
+pixels wide. TiledDetector instead runs the detector on overlapping full-res
+tiles (one batched call) plus one downscaled full-frame pass for vehicles
+larger than a tile, then merges everything with cross-tile NMS.
+
+Most tiles of a fixed camera (sky, buildings, verges) never contain traffic,
+so each tile keeps a decaying activity score fed by the detections centred
+in it, from the tiles and from the overview pass (which also sees traffic in
+tiles that were skipped on this frame). Only active tiles and their neighbours are inferred; every
+full_sweep_every frames all tiles are run so traffic appearing in a quiet
+region is still picked up.
+"""
+import cv2
+import numpy as np
+
+from runtime import Detections
+from tracker import IouTracker
+
+
+def make_tiles(width, height, tile=640, overlap=0.2):
+    """
+    Grid of (x1, y1, x2, y2) tiles covering the frame, overlapping by the given
+    fraction. Edge tiles are shifted inwards so every tile is full size.
+    """
+    stride = max(1, int(tile * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile:
+            return [0]
+        points = list(range(0, length - tile, stride))
+        points.append(length - tile)
+        return points
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def merge_detections(dets, iou_threshold=0.5, ios_threshold=0.8):
+    """
+    Greedy class-aware NMS across tiles. Besides IoU, a box is also dropped when
+    most of it lies inside a higher-scoring box of the same class: that is the
+    typical shape of a vehicle cut in half by a tile border.
+    """
+    if len(dets) == 0:
+        return dets
+    order = np.argsort(-dets.conf)
+    xyxy, cls = dets.xyxy[order], dets.cls[order]
+    areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        rest = np.arange(i + 1, len(order))
+        rest = rest[~suppressed[rest] & (cls[rest] == cls[i])]
+        if len(rest) == 0:
+            continue
+        ix1 = np.maximum(xyxy[i, 0], xyxy[rest, 0])
+        iy1 = np.maximum(xyxy[i, 1], xyxy[rest, 1])
+        ix2 = np.minimum(xyxy[i, 2], xyxy[rest, 2])
+        iy2 = np.minimum(xyxy[i, 3], xyxy[rest, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        ios = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+        suppressed[rest[(iou > iou_threshold) | (ios > ios_threshold)]] = True
+    idx = order[keep]
+    return Detections(dets.xyxy[idx], dets.conf[idx], dets.cls[idx])
+
+
+def concat_detections(parts):
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return Detections.empty()
+    return Detections(np.vstack([p.xyxy for p in parts]),
+                      np.concatenate([p.conf for p in parts]),
+                      np.concatenate([p.cls for p in parts]))
+
+
+class TiledDetector:
+    """
+    Per-camera tiled detection + tracking on full-resolution frames.
+    One instance per stream: it owns the tile activity map and the tracker
+    (an IouTracker unless the stream passes its own, see tracker.py).
+    """
+
+    def __init__(self, detector, tile=640, overlap=0.2, full_sweep_every=30,
+                 activity_decay=0.9, activity_threshold=0.05, tracker=None):
+        self.detector = detector
+        self.tile = tile
+        self.overlap = overlap
+        self.full_sweep_every = full_sweep_every
+        self.activity_decay = activity_decay
+        self.activity_threshold = activity_threshold
+        self.tracker = tracker if tracker is not None else IouTracker()
+        self.tiles = None
+        self.activity = None
+        self.neighbours = None
+        self.frames_seen = 0
+        self.last_tiles_run = 0
+
+    def _setup(self, width, height):
+        self.tiles = np.array(make_tiles(width, height, self.tile, self.overlap))
+        # The first frame is always a full sweep, which seeds the activity map
+        self.activity = np.zeros(len(self.tiles), dtype=np.float32)
+        t = self.tiles
+        overlaps = ((t[:, None, 0] <= t[None, :, 2]) & (t[None, :, 0] <= t[:, None, 2]) &
+                    (t[:, None, 1] <= t[None, :, 3]) & (t[None, :, 1] <= t[:, None, 3]))
+        self.neighbours = overlaps  # tiles touching/overlapping each other (incl. self)
+
+    def select_tiles(self):
+        """Indices of the tiles to infer on this frame."""
+        if self.frames_seen % self.full_sweep_every == 0:
+            return np.arange(len(self.tiles))
+        active = self.activity >= self.activity_threshold
+        # Vehicles move across tile borders, so neighbours of active tiles run too
+        return np.flatnonzero(self.neighbours[active].any(axis=0)) if active.any() else np.zeros(0, dtype=np.int64)
+
+    def _update_activity(self, dets):
+        self.activity *= self.activity_decay
+        if len(dets) == 0:
+            return
+        centers = (dets.xyxy[:, :2] + dets.xyxy[:, 2:]) / 2
+        t = self.tiles
+        inside = ((centers[:, None, 0] >= t[None, :, 0]) & (centers[:, None, 0] < t[None, :, 2]) &
+                  (centers[:, None, 1] >= t[None, :, 1]) & (centers[:, None, 1] < t[None, :, 3]))
+        self.activity[inside.any(axis=0)] = 1.0
+
+    def detect(self, frame, classes=None, conf=0.25):
+        """Untracked detections in full-frame coordinates."""
+        height, width = frame.shape[:2]
+        if self.tiles is None:
+            self._setup(width, height)
+
+        selected = self.select_tiles()
+        self.last_tiles_run = len(selected)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self.tiles[selected]]
+
+        # Downscaled full-frame pass catches vehicles bigger than one tile
+        scale = min(1.0, self.tile / width)
+        overview = cv2.resize(frame, (int(width * scale), int(height * scale))) if scale < 1.0 else frame
+
+        results = self.detector.predict([overview] + crops, classes=classes, imgsz=self.tile, conf=conf)
+        overview_dets, tile_dets = results[0], results[1:]
+        overview_dets.xyxy = overview_dets.xyxy / scale
+        for dets, (x1, y1, _, _) in zip(tile_dets, self.tiles[selected]):
+            dets.xyxy = dets.xyxy + np.array([x1, y1, x1, y1], dtype=np.float32)
+
+        merged = merge_detections(concat_detections([overview_dets] + list(tile_dets)))
+        self._update_activity(merged)
+        self.frames_seen += 1
+        return merged
+
+    def track(self, frame, classes=None, conf=0.25):
+        return self.tracker.update(self.detect(frame, classes=classes, conf=conf))
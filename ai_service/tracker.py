@@ -0,0 +1,222 @@
+"""
+Trackers that work directly on a Detections array (see runtime.py).
+
+Each stream owns its tracker (DetectStage makes one per stream), so the
+detector itself stays stateless and several streams can share it, or have
+their frames batched into one predict() call, without mixing track ids.
+
+    tracker = make_tracker('byte')
+    dets = tracker.update(detector.predict([frame], conf=tracker.min_conf)[0])
+
+TRACKERS, selected by the camera setting 'tracker' (camera_config.py):
+    detector - the backend's own tracking (ultralytics model.track with
+               persist=True, or the ONNX detector's IouTracker). That state
+               lives in the shared detector, so concurrent streams interfere.
+    iou      - IouTracker: greedy IoU against each track's last box.
+    byte     - ByteTracker: ByteTrack-style two-stage association with
+               constant-velocity prediction.
+"""
+import numpy as np
+
+TRACKERS = ('detector', 'iou', 'byte')
+
+
+def iou_matrix(a, b):
+    """
+    Pairwise IoU between two (N, 4) and (M, 4) arrays of xyxy boxes.
+    """
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def buffered(xyxy, ratio):
+    """Boxes grown by ratio of their width/height on each side."""
+    if not ratio:
+        return xyxy
+    pad = np.tile(xyxy[:, 2:] - xyxy[:, :2], 2) * ratio
+    return xyxy + pad * np.array([-1, -1, 1, 1], dtype=xyxy.dtype)
+
+
+def greedy_match(iou, threshold):
+    """(row, col) pairs of an IoU matrix, best first, each row and column used once."""
+    pairs = np.argwhere(iou >= threshold)
+    order = np.argsort(-iou[pairs[:, 0], pairs[:, 1]], kind='stable')
+    used_rows, used_cols = set(), set()
+    matches = []
+    for r, c in pairs[order].tolist():
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matches.append((r, c))
+    return matches
+
+
+def make_tracker(kind):
+    """A new per-stream tracker, or None for 'detector' (the backend tracks)."""
+    if kind == 'detector':
+        return None
+    if kind == 'iou':
+        return IouTracker()
+    if kind == 'byte':
+        return ByteTracker()
+    raise ValueError(f"unknown tracker {kind!r} (expected one of {', '.join(TRACKERS)})")
+
+
+class IouTracker:
+    """
+    Minimal greedy IoU tracker working directly on a Detections array.
+
+    Used by detector backends that have no built-in tracking (e.g. ONNX Runtime).
+    Each track keeps its last box; a detection of the same class that overlaps
+    it by at least iou_threshold continues the track, otherwise a new ID is
+    assigned. Tracks not seen for max_age updates are dropped.
+    """
+    min_conf = 0.25  # detector threshold to predict() with
+
+    def __init__(self, iou_threshold=0.3, max_age=30):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.next_id = 1
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.ages = np.zeros(0, dtype=np.int64)
+
+    def update(self, dets):
+        """
+        Assign track IDs to dets (in place) and return it.
+        """
+        n = len(dets)
+        det_ids = np.full(n, -1, dtype=np.int64)
+
+        if n and len(self.ids):
+            iou = iou_matrix(self.boxes, dets.xyxy)
+            # Only associate within the same class
+            iou[self.classes[:, None] != dets.cls[None, :]] = 0
+            for t, d in greedy_match(iou, self.iou_threshold):
+                det_ids[d] = self.ids[t]
+                self.boxes[t] = dets.xyxy[d]
+                self.ages[t] = 0
+
+        self.ages += 1
+        new = det_ids == -1
+        if new.any():
+            count = int(new.sum())
+            det_ids[new] = np.arange(self.next_id, self.next_id + count)
+            self.next_id += count
+            self.boxes = np.vstack([self.boxes, dets.xyxy[new]])
+            self.classes = np.concatenate([self.classes, dets.cls[new]])
+            self.ids = np.concatenate([self.ids, det_ids[new]])
+            self.ages = np.concatenate([self.ages, np.zeros(count, dtype=np.int64)])
+
+        alive = self.ages <= self.max_age
+        self.boxes, self.classes = self.boxes[alive], self.classes[alive]
+        self.ids, self.ages = self.ids[alive], self.ages[alive]
+
+        dets.ids = det_ids
+        return dets
+
+
+class ByteTracker:
+    """
+    ByteTrack-style tracker (Zhang et al., "ByteTrack: Multi-Object Tracking
+    by Associating Every Detection Box"), numpy only.
+
+    - Each track predicts its box with a constant-velocity model, so fast
+      vehicles still overlap their track after skipped frames.
+    - Detections scoring at least high_threshold are matched first; the
+      low-score ones (down to min_conf, usually occluded or blurred vehicles)
+      are then matched to the tracks left over, with a stricter IoU, instead
+      of being thrown away and breaking the track.
+    - Boxes are matched buffered (grown by buffer of their size on each side,
+      as in C-BIoU): small, fast objects such as motorcycles move more than
+      their own width between skipped frames, and a track has no velocity
+      before its second match.
+    - Only high-score detections start new tracks; low-score detections that
+      continue no track are dropped from the result.
+    - Tracks not seen for max_age updates are dropped.
+
+    Matching is greedy and within the same class, like IouTracker.
+    """
+
+    def __init__(self, high_threshold=0.25, min_conf=0.1, match_iou=0.2, low_match_iou=0.5,
+                 max_age=30, momentum=0.5, buffer=0.3):
+        self.high_threshold = high_threshold
+        self.min_conf = min_conf
+        self.match_iou = match_iou
+        self.low_match_iou = low_match_iou
+        self.max_age = max_age
+        self.momentum = momentum
+        self.buffer = buffer
+        self.next_id = 1
+        self.boxes = np.zeros((0, 4), dtype=np.float32)     # last matched box
+        self.velocity = np.zeros((0, 4), dtype=np.float32)  # per update
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.ages = np.zeros(0, dtype=np.int64)             # updates since last matched
+        self.hits = np.zeros(0, dtype=np.int64)
+
+    def update(self, dets):
+        """
+        Assign track IDs to dets and return the tracked ones (dets itself
+        when every detection was kept).
+        """
+        n = len(dets)
+        det_ids = np.full(n, -1, dtype=np.int64)
+        self.ages += 1
+        free = np.ones(len(self.ids), dtype=bool)
+
+        if n and len(self.ids):
+            predicted = buffered(self.boxes + self.velocity * self.ages[:, None], self.buffer)
+            boxes = buffered(dets.xyxy, self.buffer)
+            high = dets.conf >= self.high_threshold
+            for candidates, threshold in ((np.flatnonzero(high), self.match_iou),
+                                          (np.flatnonzero(~high), self.low_match_iou)):
+                tracks = np.flatnonzero(free)
+                if not len(candidates) or not len(tracks):
+                    continue
+                iou = iou_matrix(predicted[tracks], boxes[candidates])
+                iou[self.classes[tracks][:, None] != dets.cls[candidates][None, :]] = 0
+                for t, d in greedy_match(iou, threshold):
+                    t, d = tracks[t], candidates[d]
+                    det_ids[d] = self.ids[t]
+                    step = (dets.xyxy[d] - self.boxes[t]) / self.ages[t]
+                    # The first match has no velocity to smooth yet
+                    self.velocity[t] = step if self.hits[t] == 1 else \
+                        self.momentum * self.velocity[t] + (1 - self.momentum) * step
+                    self.boxes[t] = dets.xyxy[d]
+                    self.ages[t] = 0
+                    self.hits[t] += 1
+                    free[t] = False
+
+        new = (det_ids == -1) & (dets.conf >= self.high_threshold) if n else np.zeros(0, dtype=bool)
+        if new.any():
+            count = int(new.sum())
+            det_ids[new] = np.arange(self.next_id, self.next_id + count)
+            self.next_id += count
+            self.boxes = np.vstack([self.boxes, dets.xyxy[new]])
+            self.velocity = np.vstack([self.velocity, np.zeros((count, 4), dtype=np.float32)])
+            self.classes = np.concatenate([self.classes, dets.cls[new]])
+            self.ids = np.concatenate([self.ids, det_ids[new]])
+            self.ages = np.concatenate([self.ages, np.zeros(count, dtype=np.int64)])
+            self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int64)])
+
+        alive = self.ages <= self.max_age
+        if not alive.all():
+            self.boxes, self.velocity, self.classes = self.boxes[alive], self.velocity[alive], self.classes[alive]
+            self.ids, self.ages, self.hits = self.ids[alive], self.ages[alive], self.hits[alive]
+
+        kept = det_ids != -1
+        if kept.all():
+            dets.ids = det_ids
+            return dets
+        return type(dets)(dets.xyxy[kept], dets.conf[kept], dets.cls[kept], det_ids[kept])
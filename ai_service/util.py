@@ -1,8 +1,9 @@
 import string
-import easyocr
 
-# Initialize the OCR reader
-reader = easyocr.Reader(['en'], gpu=False)
+import runtime
+
+# The OCR reader (EasyOCR, or the ONNX recogniser with MODEL_BACKEND=onnx) is
+# loaded on first use via runtime.get_plate_reader(), not at import time.
 
 # Mapping dictionaries for character conversion
 dict_char_to_int = {'O': '0',
@@ -58,6 +59,26 @@ def write_csv(results, output_path):
         f.close()
 
 
+def write_results(results, output_path):
+    """
+    Write the results dict as typed Parquet (numeric bbox columns) when
+    output_path ends in .parquet, otherwise as the legacy CSV.
+
+    Args:
+        results (dict): Dictionary containing the results.
+        output_path (str): Path to the output file.
+    """
+    import results_io
+
+    if not results_io.is_parquet(output_path):
+        write_csv(results, output_path)
+        return
+
+    with results_io.ResultsWriter(output_path) as writer:
+        for frame_nmr in results.keys():
+            writer.add_frame(frame_nmr, results[frame_nmr])
+
+
 def license_complies_format(text):
     """
     Check if the license plate text complies with the required format.
@@ -68,42 +89,10 @@ def license_complies_format(text):
     Returns:
         bool: True if the license plate complies with the format, False otherwise.
     """
-    # stripping spaces found by OCR
-    text = text.replace(" ", "").replace("-", "")
-
     # Standard Indian Plate: 2 chars (State) + 2 nums (District) + 1-2 chars (Series) + 4 nums (Unique)
-    # Example: TN38AB1234 (10 chars) or TN38A1234 (9 chars)
-    # Some older plates might have different lengths, but standard is 9-10.
-    
-    if len(text) not in [9, 10]:
-        return False
-
-    # Check first 2 chars are letters (State Code)
-    if not (text[0].isalpha() or text[0] in dict_int_to_char.keys()) or \
-       not (text[1].isalpha() or text[1] in dict_int_to_char.keys()):
-        return False
-
-    # Check next 2 chars are digits (District Code)
-    if not (text[2].isdigit() or text[2] in dict_char_to_int.keys()) or \
-       not (text[3].isdigit() or text[3] in dict_char_to_int.keys()):
-        return False
-
-    # Check last 4 chars are digits (Unique Number)
-    if not (text[-1].isdigit() or text[-1] in dict_char_to_int.keys()) or \
-       not (text[-2].isdigit() or text[-2] in dict_char_to_int.keys()) or \
-       not (text[-3].isdigit() or text[-3] in dict_char_to_int.keys()) or \
-       not (text[-4].isdigit() or text[-4] in dict_char_to_int.keys()):
-        return False
-
-    # The middle part (index 4 to -5) should be letters
-    # Length of middle part is len(text) - 2 (start) - 2 (district) - 4 (end) = len - 8
-    # If len=10, middle=2 chars. If len=9, middle=1 char.
-    middle_len = len(text) - 8
-    for i in range(4, 4 + middle_len):
-        if not (text[i].isalpha() or text[i] in dict_int_to_char.keys()):
-             return False
-             
-    return True
+    # Example: TN38AB1234 (10 chars) or TN38A1234 (9 chars); characters the OCR
+    # confuses (see the mapping dicts) are accepted in either class.
+    return COMPLIES_PATTERN.match(text.replace(" ", "").replace("-", "")) is not None
 
 
 def format_license(text):
@@ -116,87 +105,323 @@ def format_license(text):
     Returns:
         str: Formatted license plate text.
     """
-    license_plate_ = ''
-    mapping = {0: dict_int_to_char, 1: dict_int_to_char, 
-               4: dict_int_to_char, 5: dict_int_to_char, 6: dict_int_to_char,
-               2: dict_char_to_int, 3: dict_char_to_int}
-    
     # Extensions for Indian formats
     # 0,1: State (Char)
     # 2,3: District (Int)
     # -4,-3,-2,-1: Unique (Int)
     # Middle: Series (Char)
+    # PERFORMANCE: one str.translate per segment instead of a dict lookup per character
+    tail = max(4, len(text) - 4)
+    return (text[:2].translate(TO_LETTER) + text[2:4].translate(TO_DIGIT) +
+            text[4:tail].translate(TO_LETTER) + text[tail:].translate(TO_DIGIT))
 
-    for j in range(len(text)):
-        # Normalize index for standard logic
-        # 0, 1 -> Char
-        if j in [0, 1]:
-            if text[j] in dict_int_to_char: license_plate_ += dict_int_to_char[text[j]]
-            else: license_plate_ += text[j]
-        
-        # 2, 3 -> Int
-        elif j in [2, 3]:
-            if text[j] in dict_char_to_int: license_plate_ += dict_char_to_int[text[j]]
-            else: license_plate_ += text[j]
-
-        # Last 4 -> Int
-        elif j >= len(text) - 4:
-            if text[j] in dict_char_to_int: license_plate_ += dict_char_to_int[text[j]]
-            else: license_plate_ += text[j]
-
-        # Middle part (Series) -> Char
-        else:
-            if text[j] in dict_int_to_char: license_plate_ += dict_int_to_char[text[j]]
-            else: license_plate_ += text[j]
-
-    return license_plate_
 
+import functools
+import re
+import threading
+import time
+from collections import Counter
 
 import cv2
 import numpy as np
-import re
-
-# Initialize the OCR reader
-reader = easyocr.Reader(['en'], gpu=False)
 
 # Expanded Mapping dictionaries for character conversion
 dict_char_to_int = {'O': '0', 'I': '1', 'J': '3', 'A': '4', 'G': '6', 'S': '5', 'B': '8', 'Z': '2', 'Q': '0'}
 dict_int_to_char = {'0': 'O', '1': 'I', '3': 'J', '4': 'A', '6': 'G', '5': 'S', '8': 'B', '2': 'Z'}
 
-def preprocess_image(image):
+# --- Plate grammar, compiled once at import ---
+#
+# Position classes are translated with str.translate tables built from the
+# mapping dicts above; each plate format is a precompiled regex whose
+# character classes also accept the characters the OCR confuses with that
+# class, so one match both validates and tells which segment is letters and
+# which is digits.
+
+
+def _ascii_table(mapping):
     """
-    Apply advanced preprocessing to improve OCR accuracy.
+    str.translate table covering every ASCII character.
+    PERFORMANCE: translate raises and catches a LookupError for every
+    character missing from the table; listing the identity entries too makes
+    it about 3x faster on plate-sized strings.
+    """
+    table = {i: chr(i) for i in range(128)}
+    table.update(str.maketrans(mapping))
+    return table
+
+
+TO_LETTER = _ascii_table(dict_int_to_char)
+TO_DIGIT = _ascii_table(dict_char_to_int)
+LETTER_LIKE = '[A-Z' + ''.join(dict_int_to_char) + ']'
+DIGIT_LIKE = '[0-9' + ''.join(dict_char_to_int) + ']'
+CLEANUP = _ascii_table(dict.fromkeys(' .-'))
+
+COMPLIES_PATTERN = re.compile(rf'^{LETTER_LIKE}{{2}}{DIGIT_LIKE}{{2}}{LETTER_LIKE}{{1,2}}{DIGIT_LIKE}{{4}}$')
+PLATE_PATTERN = re.compile(r'^[A-Z]{2}[0-9]{1,2}[A-Z]{0,3}[0-9]{3,4}$')
+
+# RTO state / union territory codes (incl. the older OR, DN, UA still on the road)
+STATE_CODES = frozenset('AN AP AR AS BR CG CH DD DL DN GA GJ HP HR JH JK KA KL LA LD MH ML MN MP MZ NL '
+                        'OD OR PB PY RJ SK TN TR TS UA UK UP WB'.split())
+
+
+class PlateFormat:
+    """
+    One plate layout: segments of (kind, min, max), kind being 'L' letters,
+    'D' digits, 'S' series letters, 'A' letters that must be read as letters,
+    'N' digits that must be read as digits, or a literal such as 'BH'. rank
+    orders formats when several OCR candidates validate; prefixes restricts
+    the first segment (state codes).
+
+    Two patterns are compiled: a strict one (clean reads, nothing to
+    translate) tried first, and a tolerant one whose classes also accept the
+    OCR look-alikes, whose groups are then translated to the right class.
+    """
+
+    def __init__(self, name, rank, segments, prefixes=None):
+        self.name = name
+        self.rank = rank
+        self.prefixes = prefixes
+        self.tables = []
+        # PERFORMANCE: cheap rejects before any regex runs - the length range
+        # of the layout and, for a fixed-width prefix segment, a set lookup
+        self.min_len = sum(len(kind) * lo if kind not in 'LDSAN' else lo for kind, lo, _ in segments)
+        self.max_len = sum(len(kind) * hi if kind not in 'LDSAN' else hi for kind, _, hi in segments)
+        self.prefix_len = segments[0][1] if prefixes is not None and segments[0][1] == segments[0][2] else 0
+        strict, tolerant = [], []
+        for kind, lo, hi in segments:
+            count = f'{{{lo},{hi}}}'
+            if kind in ('D', 'N'):
+                strict.append(f'([0-9]{count})')
+                tolerant.append(f'({DIGIT_LIKE if kind == "D" else "[0-9]"}{count})')
+                self.tables.append(TO_DIGIT)
+                continue
+            self.tables.append(TO_LETTER)
+            if kind == 'L':
+                strict.append(f'([A-Z]{count})')
+                tolerant.append(f'({LETTER_LIKE}{count})')
+            elif kind == 'S':
+                # Series letters before the number: lazy, so a trailing I/Z/S...
+                # stays with the digits (TN38AB1234, not TN38ABI234)
+                strict.append(f'([A-Z]{count}?)')
+                tolerant.append(f'({LETTER_LIKE}{count}?)')
+            elif kind == 'A':
+                strict.append(f'([A-Z]{count})')
+                tolerant.append(f'([A-Z]{count})')
+            else:
+                strict.append(f'({kind})')
+                tolerant.append('(' + ''.join(f'[{c}{dict_char_to_int.get(c, "")}]' for c in kind) + ')')
+        self.strict = re.compile(''.join(strict))
+        self.tolerant = re.compile(''.join(tolerant))
+
+    def parse(self, text):
+        if not self.min_len <= len(text) <= self.max_len:
+            return None
+        if self.prefix_len and text[:self.prefix_len].translate(self.tables[0]) not in self.prefixes:
+            return None
+        match = self.strict.fullmatch(text)
+        if match is not None:
+            plate = text
+            prefix = match.group(1)
+        else:
+            match = self.tolerant.fullmatch(text)
+            if match is None:
+                return None
+            plate = ''.join(map(str.translate, match.groups(), self.tables))
+            prefix = plate[:len(match.group(1))]
+        if self.prefixes is not None and prefix not in self.prefixes:
+            return None
+        return plate
+
+
+# Highest rank first
+PLATE_FORMATS = [
+    # Bharat series: YY BH #### XX (e.g. 22BH1234AB)
+    PlateFormat('bh', 3, [('D', 2, 2), ('BH', 1, 1), ('D', 4, 4), ('L', 1, 2)]),
+    # State series with a known state code: TN 38 AB 1234, DL 1 C AB 1234
+    PlateFormat('state', 3, [('L', 2, 2), ('D', 1, 2), ('S', 0, 3), ('D', 4, 4)], prefixes=STATE_CODES),
+    # Anything shaped like a plate (same layout as the original regex). With
+    # an unknown state code there is little to anchor on, so the state code
+    # must be read as real letters and the number as real digits: otherwise
+    # any run of digits would fit, and a misread series would be accepted
+    # as part of the number (TN38AB -> TN3848)
+    PlateFormat('generic', 2, [('A', 2, 2), ('D', 1, 2), ('S', 0, 3), ('N', 3, 4)]),
+]
+FALLBACK_RANK = 1
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_plate(text):
+    """
+    Match raw OCR text against PLATE_FORMATS.
+    Returns (plate, format_name, rank), or (None, None, 0) if no format fits.
+    Memoised: a tracked plate is re-read with the same text frame after frame.
+    """
+    text = text.upper().translate(CLEANUP)
+    for fmt in PLATE_FORMATS:
+        plate = fmt.parse(text)
+        if plate is not None:
+            return plate, fmt.name, fmt.rank
+    return None, None, 0
+
+
+def best_plate(detections, fallback_min_score=0.4):
+    """
+    Rank every OCR detection in one pass: highest format rank, then highest
+    OCR score. Texts that fit no format but look like a plate (6-12
+    alphanumerics) are kept as a position-formatted fallback when their score
+    is above fallback_min_score.
+    Returns (text, score) or (None, None).
+    """
+    best, best_key = None, (0, 0)
+    for detection in detections:
+        text, score = detection[1], detection[2]
+        plate, _, rank = parse_plate(text)
+        if plate is None:
+            text = text.upper().translate(CLEANUP)
+            if not (6 <= len(text) <= 12 and text.isalnum() and score > fallback_min_score):
+                continue
+            plate, rank = format_license(text), FALLBACK_RANK
+        if (rank, score) > best_key:
+            best, best_key = (plate, score), (rank, score)
+    return best if best else (None, None)
+
+# --- OCR preprocessing ---
+#
+# Crops are scored first (size, sharpness = variance of the Laplacian,
+# contrast = std of the grey levels, all on the small native crop). Crops
+# no OCR could read are rejected before any upscaling or filtering; the rest
+# get the cheapest filter chain their quality allows:
+#   plain: upscale (linear) only             sharp and contrasty
+#   clahe: upscale (linear) + CLAHE          sharp, low contrast
+#   full:  upscale (cubic) + sharpen + bilateral + CLAHE   (the original chain)
+OCR_TARGET_WIDTH = 400
+OCR_MIN_WIDTH = 40
+OCR_MIN_HEIGHT = 12
+OCR_MIN_SHARPNESS = 5.0
+OCR_MIN_CONTRAST = 8.0
+OCR_SHARP = 150.0
+OCR_CONTRASTY = 45.0
+
+SHARPEN_KERNEL = np.array([[0, -1, 0],
+                           [-1, 5, -1],
+                           [0, -1, 0]], dtype=np.float32)
+# CLAHE objects keep internal buffers and are not thread-safe: one per thread
+# (streams analyse on their own threads), created once instead of per crop
+_ocr_local = threading.local()
+
+
+def _clahe():
+    clahe = getattr(_ocr_local, 'clahe', None)
+    if clahe is None:
+        clahe = _ocr_local.clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    return clahe
+
+
+class OcrStats:
+    """Counters for the OCR stage: crops seen, rejected (by reason), chains used, time spent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.crops = 0
+            self.rejected = Counter()
+            self.chains = Counter()
+            self.preprocess_s = 0.0
+            self.ocr_calls = 0
+            self.ocr_s = 0.0
+
+    def add(self, preprocess_s, reject=None, chain=None, ocr_s=None):
+        with self._lock:
+            self.crops += 1
+            self.preprocess_s += preprocess_s
+            if reject:
+                self.rejected[reject] += 1
+            if chain:
+                self.chains[chain] += 1
+            if ocr_s is not None:
+                self.ocr_calls += 1
+                self.ocr_s += ocr_s
+
+    def snapshot(self):
+        with self._lock:
+            return {'crops': self.crops, 'ocr_calls': self.ocr_calls,
+                    'ocr_calls_saved': sum(self.rejected.values()), 'rejected': dict(self.rejected),
+                    'chains': dict(self.chains),
+                    'preprocess_ms_per_crop': round(self.preprocess_s * 1000 / max(self.crops, 1), 3),
+                    'ocr_ms_per_call': round(self.ocr_s * 1000 / max(self.ocr_calls, 1), 3)}
+
+    def report(self):
+        s = self.snapshot()
+        return (f"OCR: {s['crops']} crops, {s['ocr_calls']} OCR calls, {s['ocr_calls_saved']} saved "
+                f"{s['rejected']}, chains {s['chains']}, preprocess {s['preprocess_ms_per_crop']:.2f} ms/crop, "
+                f"OCR {s['ocr_ms_per_call']:.1f} ms/call")
+
+
+OCR_STATS = OcrStats()
+
+
+def assess_crop(image):
+    """
+    Score a plate crop before any OCR work.
+    Returns (gray, quality): the grey crop at native size and a dict with
+    width, height, sharpness, contrast and reject (None, or the reason).
     """
-    # 1. Resize (Upscale standard to width ~400px for better OCR)
     h, w = image.shape[:2]
-    if w < 400:
-        scale = 400 / w
-        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
-    
-    # 2. Grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # 3. Sharpening (Important for CCTV blur)
-    kernel = np.array([[0, -1, 0], 
-                       [-1, 5,-1], 
-                       [0, -1, 0]])
-    gray = cv2.filter2D(gray, -1, kernel)
-    
-    # 4. Bilateral Filter (Remove noise, keep edges)
-    gray = cv2.bilateralFilter(gray, 11, 17, 17)
-    
-    # 5. Adaptive Thresholding (CLAHE) - Increased contrast
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-    gray = clahe.apply(gray)
-    
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    quality = {'width': w, 'height': h, 'sharpness': 0.0, 'contrast': 0.0, 'reject': None}
+    if w < OCR_MIN_WIDTH or h < OCR_MIN_HEIGHT:
+        quality['reject'] = 'too_small'
+        return gray, quality
+    _, std = cv2.meanStdDev(gray)
+    quality['contrast'] = float(std[0, 0])
+    if quality['contrast'] < OCR_MIN_CONTRAST:
+        quality['reject'] = 'low_contrast'
+        return gray, quality
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    quality['sharpness'] = float(std[0, 0]) ** 2
+    if quality['sharpness'] < OCR_MIN_SHARPNESS:
+        quality['reject'] = 'blurry'
+    return gray, quality
+
+
+def choose_chain(quality):
+    """Cheapest filter chain that the crop's quality allows."""
+    if quality['sharpness'] < OCR_SHARP:
+        return 'full'
+    return 'plain' if quality['contrast'] >= OCR_CONTRASTY else 'clahe'
+
+
+def apply_chain(gray, chain):
+    h, w = gray.shape[:2]
+    if w < OCR_TARGET_WIDTH:
+        scale = OCR_TARGET_WIDTH / w
+        gray = cv2.resize(gray, None, fx=scale, fy=scale,
+                          interpolation=cv2.INTER_CUBIC if chain == 'full' else cv2.INTER_LINEAR)
+    if chain == 'full':
+        # Sharpening (important for CCTV blur), then bilateral filter (remove noise, keep edges)
+        gray = cv2.bilateralFilter(cv2.filter2D(gray, -1, SHARPEN_KERNEL), 11, 17, 17)
+    if chain != 'plain':
+        gray = _clahe().apply(gray)
     return gray
 
+
+def preprocess_image(image):
+    """
+    Apply advanced preprocessing to improve OCR accuracy.
+    The filter chain is picked from the crop's quality (see assess_crop).
+    """
+    gray, quality = assess_crop(image)
+    return apply_chain(gray, choose_chain(quality))
+
 def validate_indian_plate(text):
     """
     Flexible regex for Indian Plates.
     Standard: TN 38 AB 1234
     """
-    text = text.upper().replace(' ', '').replace('-', '').replace('.', '')
+    text = text.upper().translate(CLEANUP)
     
     # Relaxed Regex: 
     # Starts with 2 chars (State), followed by 1-2 digits (District), 
@@ -205,61 +430,40 @@ def validate_indian_plate(text):
     if len(text) < 6 or len(text) > 12:
         return False, text
         
-    # Basic Pattern Check using Regex
-    # ^[A-Z]{2}[0-9]{1,2}[A-Z]{0,3}[0-9]{3,4}$
-    pattern = re.compile(r'^[A-Z]{2}[0-9]{1,2}[A-Z]{0,3}[0-9]{3,4}$')
-    
-    if pattern.match(text):
+    # PERFORMANCE: PLATE_PATTERN is compiled once at import
+    if PLATE_PATTERN.match(text):
         return True, text
         
     return False, text
 
-def read_license_plate(license_plate_crop):
+def read_license_plate(license_plate_crop, fallback_min_score=0.4, stats=None):
     """
     Read the license plate text with preprocessing and multi-stage fallback.
+    Counted in OCR_STATS (process-wide) and, if given, in stats (e.g. one
+    OcrStats per stream).
     """
+    # Quality gate: hopeless crops never reach the OCR
+    start = time.perf_counter()
+    gray, quality = assess_crop(license_plate_crop)
+    if quality['reject']:
+        for counter in (OCR_STATS, stats) if stats else (OCR_STATS,):
+            counter.add(time.perf_counter() - start, reject=quality['reject'])
+        return None, None
+
     # Preprocess
-    processed_img = preprocess_image(license_plate_crop)
+    chain = choose_chain(quality)
+    processed_img = apply_chain(gray, chain)
+    ocr_start = time.perf_counter()
 
     # Allowlist: Alphanumeric only
-    detections = reader.readtext(processed_img, allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
-    
-    best_candidate = None
-    best_score = 0
-
-    for detection in detections:
-        bbox, text, score = detection[:3]
-        text = text.upper().replace(' ', '').replace('.', '').replace('-', '')
-        
-        # Debug Log to see what raw text is being found
-        # print(f"DEBUG OCR RAW: {text} ({score})") 
-
-        # Attempt to correct common OCR errors using Format Logic
-        # e.g. Convert 'B' to '8' in digit positions (Index 2, 3, etc)
-        try:
-            formatted_text = format_license(text)
-        except:
-            formatted_text = text
-
-        # Tier 1: Strict Regex Match (High Quality) on FORMATTED text
-        is_valid, final_text = validate_indian_plate(formatted_text)
-        if is_valid:
-            return final_text, score
-            
-        # Tier 2: Looks like a plate (Length 6-12, Alphanumeric)
-        if 6 <= len(text) <= 12 and text.isalnum():
-            # If we don't find a perfect regex match in ANY detection, we'll return this as fallback
-            # We keep the one with highest score
-            if score > best_score:
-                best_score = score
-                best_candidate = formatted_text # Return the formatted version as best guess
-
-    # If no perfect regex match found after checking ALL detections, return best fallback
-    # Lowered threshold to 0.4 for fallback
-    if best_candidate and best_score > 0.4:
-        return best_candidate, best_score
-
-    return None, None
+    detections = runtime.get_plate_reader().readtext(processed_img, allowlist=runtime.OCR_ALLOWLIST)
+    ocr_s = time.perf_counter() - ocr_start
+    for counter in (OCR_STATS, stats) if stats else (OCR_STATS,):
+        counter.add(ocr_start - start, chain=chain, ocr_s=ocr_s)
+
+    # Best candidate over ALL detections: state/BH formats, then any plate-shaped
+    # match, then (score > fallback_min_score) a plausible alphanumeric fallback
+    return best_plate(detections, fallback_min_score)
 
 
 def get_car(license_plate, vehicle_track_ids):
@@ -0,0 +1,148 @@
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+
+# name -> (fourcc, container) for the OpenCV backend
+CODECS = {
+    'avc1': ('avc1', '.mp4'),
+    'mp4v': ('mp4v', '.mp4'),
+    'mjpg': ('MJPG', '.avi'),
+    'xvid': ('XVID', '.avi'),
+}
+# ffmpeg encoders that take -crf; hardware encoders (h264_nvenc, h264_qsv,
+# h264_vaapi, ...) use their own rate-control flags, pass them in extra_args
+CRF_ENCODERS = ('libx264', 'libx265')
+
+
+class AsyncVideoWriter:
+    """
+    Encodes annotated frames on a background thread.
+
+    write() only puts the frame on a bounded queue, so the processing loop
+    keeps running while the previous frames are encoded. When the encoder
+    falls behind the queue fills up and write() blocks (back-pressure rather
+    than unbounded memory). Frames must not be modified after write().
+
+    backend='opencv' uses cv2.VideoWriter with a fourcc from CODECS.
+    backend='ffmpeg' pipes raw BGR frames into an ffmpeg process, e.g.
+        AsyncVideoWriter('out.mp4', fps, (w, h), codec='libx264', backend='ffmpeg', preset='veryfast')
+        AsyncVideoWriter('out.mp4', fps, (w, h), codec='h264_nvenc', backend='ffmpeg', preset='p4')
+
+    stats() tells whether the run was encoder-bound (producer waited on a
+    full queue) or inference-bound (encoder waited on an empty queue).
+    """
+
+    def __init__(self, path, fps, size, codec='mp4v', backend='opencv', preset='veryfast',
+                 crf=23, queue_size=32, extra_args=None):
+        self.path = path
+        self.size = tuple(size)
+        self.backend = backend
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._closed = False
+        self.frames = 0
+        self.producer_wait = 0.0  # write() blocked on a full queue
+        self.encoder_idle = 0.0   # encoder waiting for frames
+        self.encode_time = 0.0
+        self._started = time.perf_counter()
+
+        fps = fps or 25.0
+        if backend == 'opencv':
+            fourcc = CODECS[codec][0] if codec in CODECS else codec
+            self._out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, self.size)
+            if not self._out.isOpened():
+                raise RuntimeError(f"OpenCV could not open a '{fourcc}' writer for {path}")
+        elif backend == 'ffmpeg':
+            ffmpeg = shutil.which('ffmpeg')
+            if ffmpeg is None:
+                raise RuntimeError("backend='ffmpeg' needs the ffmpeg binary on PATH")
+            width, height = self.size
+            cmd = [ffmpeg, '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps),
+                   '-i', '-', '-c:v', codec]
+            if preset:
+                cmd += ['-preset', preset]
+            if codec in CRF_ENCODERS and crf is not None:
+                cmd += ['-crf', str(crf)]
+            cmd += list(extra_args or []) + ['-pix_fmt', 'yuv420p', path]
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _encode(self, frame):
+        if self.backend == 'opencv':
+            self._out.write(frame)
+        else:
+            self._proc.stdin.write(frame.tobytes())
+
+    def _run(self):
+        while True:
+            start = time.perf_counter()
+            frame = self._queue.get()
+            self.encoder_idle += time.perf_counter() - start
+            if frame is None:
+                break
+            if self._error is not None:
+                continue  # keep draining so write() never blocks forever
+            start = time.perf_counter()
+            try:
+                self._encode(frame)
+            except Exception as e:
+                self._error = e
+            self.encode_time += time.perf_counter() - start
+
+    def write(self, frame):
+        if self._error is not None:
+            raise self._error
+        if frame.shape[1::-1] != self.size:
+            raise ValueError(f"Frame size {frame.shape[1::-1]} does not match writer size {self.size}")
+        start = time.perf_counter()
+        self._queue.put(frame)
+        self.producer_wait += time.perf_counter() - start
+        self.frames += 1
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self.backend == 'opencv':
+            self._out.release()
+        else:
+            self._proc.stdin.close()
+            if self._proc.wait() != 0 and self._error is None:
+                self._error = RuntimeError(f"ffmpeg exited with code {self._proc.returncode}")
+        self.wall_time = time.perf_counter() - self._started
+        if self._error is not None:
+            raise self._error
+
+    def stats(self):
+        wall = getattr(self, 'wall_time', time.perf_counter() - self._started)
+        return {
+            'frames': self.frames,
+            'wall_s': wall,
+            'encode_s': self.encode_time,
+            'producer_wait_s': self.producer_wait,
+            'encoder_idle_s': self.encoder_idle,
+            'bound': 'encoder' if self.producer_wait > self.encoder_idle else 'inference',
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"Writer: {s['frames']} frames in {s['wall_s']:.1f}s | encode {s['encode_s']:.1f}s | "
+                f"producer waited {s['producer_wait_s']:.1f}s | encoder idle {s['encoder_idle_s']:.1f}s "
+                f"-> {s['bound']}-bound")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,8 +1,13 @@
-import ast
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
-import pandas as pd
+
+import results_io
+from video_writer import AsyncVideoWriter
 
 
 def draw_border(img, top_left, bottom_right, color=(0, 255, 0), thickness=10, line_length_x=200, line_length_y=200):
@@ -24,95 +29,159 @@ def draw_border(img, top_left, bottom_right, color=(0, 255, 0), thickness=10, li
     return img
 
 
-# This script is designed to run standalone on a CSV. 
-# It might need adjustments to be integrated into the pipeline.
-if __name__ == "__main__":
-    results = pd.read_csv('./test_interpolated.csv')
-
-    # load video
-    video_path = 'sample.mp4'
+def build_frame_index(results):
+    """
+    Group detections by frame once: {frame_nmr: (car_ids, car_boxes, plate_boxes)}
+    with int boxes, instead of a full DataFrame scan per rendered frame.
+    """
+    frames = results['frame_nmr'].to_numpy()
+    order = np.argsort(frames, kind='stable')
+    frames = frames[order]
+    car_ids = results['car_id'].to_numpy()[order]
+    car_boxes = results[results_io.CAR_BBOX_COLS].to_numpy()[order].astype(int)
+    plate_boxes = results[results_io.PLATE_BBOX_COLS].to_numpy()[order].astype(int)
+
+    index = {}
+    starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+    ends = np.r_[starts[1:], len(frames)]
+    for s, e in zip(starts, ends):
+        index[int(frames[s])] = (car_ids[s:e], car_boxes[s:e], plate_boxes[s:e])
+    return index
+
+
+def best_plates(results):
+    """
+    Per car: the row with the highest license_number_score (first one on ties).
+    Returns {car_id: (frame_nmr, plate_bbox, license_number)}.
+    """
+    scores = results['license_number_score'].to_numpy()
+    car_ids = results['car_id'].to_numpy()
+    # Sort by car, then score descending; stable so ties keep file order
+    order = np.lexsort((-scores, car_ids))
+    first = order[np.r_[True, car_ids[order][1:] != car_ids[order][:-1]]]
+    best = results.iloc[first]
+    return {int(car_id): (int(frame_nmr), bbox, text) for car_id, frame_nmr, bbox, text in
+            zip(best['car_id'], best['frame_nmr'], best[results_io.PLATE_BBOX_COLS].to_numpy(),
+                best['license_number'])}
+
+
+def collect_plate_crops(video_path, plates):
+    """
+    First pass: decode sequentially up to the last frame holding a best plate
+    and crop each plate at 400 px height. grab() skips the colour conversion
+    of frames nobody needs; there are no seeks, which would re-decode from the
+    previous keyframe once per car.
+    """
+    wanted = {}
+    for car_id, (frame_nmr, bbox, _) in plates.items():
+        wanted.setdefault(frame_nmr, []).append((car_id, bbox))
+
+    crops = {}
     cap = cv2.VideoCapture(video_path)
+    last = max(wanted) if wanted else -1
+    frame_nmr = -1
+    while frame_nmr < last and cap.grab():
+        frame_nmr += 1
+        if frame_nmr not in wanted:
+            continue
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        for car_id, (x1, y1, x2, y2) in wanted[frame_nmr]:
+            crop = frame[max(0, int(y1)):int(y2), max(0, int(x1)):int(x2), :]
+            if crop.size == 0:
+                continue
+            crops[car_id] = cv2.resize(crop, (int((x2 - x1) * 400 / (y2 - y1)), 400))
+    cap.release()
+    return crops
+
+
+def draw_frame(frame, detections, plates, crops):
+    """Car borders, plate boxes and the best plate crop + text above each car."""
+    if detections is None:
+        return frame
+    for car_id, (car_x1, car_y1, car_x2, car_y2), (x1, y1, x2, y2) in zip(*detections):
+        draw_border(frame, (car_x1, car_y1), (car_x2, car_y2), (0, 255, 0), 25,
+                    line_length_x=200, line_length_y=200)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 12)
+
+        license_crop = crops.get(int(car_id))
+        if license_crop is None:
+            continue
+        text = plates[int(car_id)][2]
+        H, W, _ = license_crop.shape
+
+        try:
+            frame[car_y1 - H - 100:car_y1 - 100,
+                  int((car_x2 + car_x1 - W) / 2):int((car_x2 + car_x1 + W) / 2), :] = license_crop
+
+            frame[car_y1 - H - 400:car_y1 - H - 100,
+                  int((car_x2 + car_x1 - W) / 2):int((car_x2 + car_x1 + W) / 2), :] = (255, 255, 255)
+
+            (text_width, text_height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 4.3, 17)
+
+            cv2.putText(frame, text,
+                        (int((car_x2 + car_x1 - text_width) / 2), int(car_y1 - H - 250 + (text_height / 2))),
+                        cv2.FONT_HERSHEY_SIMPLEX, 4.3, (0, 0, 0), 17)
+        except ValueError:
+            # Overlay falls partly outside the frame (car near the top edge)
+            pass
+    return frame
+
+
+def render(results, video_path, output_path, workers=4, codec='mp4v', backend='opencv', preset='veryfast'):
+    """
+    Second pass: decode sequentially, draw overlays on a thread pool and hand
+    frames in order to an AsyncVideoWriter that encodes on its own thread.
+    OpenCV releases the GIL in drawing and encoding, so decode, draw and
+    encode overlap.
+    """
+    index = build_frame_index(results)
+    plates = best_plates(results)
+    crops = collect_plate_crops(video_path, plates)
 
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Specify the codec
+    cap = cv2.VideoCapture(video_path)
     fps = cap.get(cv2.CAP_PROP_FPS)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    out = cv2.VideoWriter('./out.mp4', fourcc, fps, (width, height))
-
-    license_plate = {}
-    for car_id in np.unique(results['car_id']):
-        max_ = np.amax(results[results['car_id'] == car_id]['license_number_score'])
-        license_plate[car_id] = {'license_crop': None,
-                                 'license_plate_number': results[(results['car_id'] == car_id) &
-                                                                 (results['license_number_score'] == max_)]['license_number'].iloc[0]}
-        cap.set(cv2.CAP_PROP_POS_FRAMES, results[(results['car_id'] == car_id) &
-                                                 (results['license_number_score'] == max_)]['frame_nmr'].iloc[0])
-        ret, frame = cap.read()
-
-        x1, y1, x2, y2 = ast.literal_eval(results[(results['car_id'] == car_id) &
-                                                  (results['license_number_score'] == max_)]['license_plate_bbox'].iloc[0].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
-
-        license_crop = frame[int(y1):int(y2), int(x1):int(x2), :]
-        license_crop = cv2.resize(license_crop, (int((x2 - x1) * 400 / (y2 - y1)), 400))
-
-        license_plate[car_id]['license_crop'] = license_crop
-
+    out = AsyncVideoWriter(output_path, fps, (width, height), codec=codec, backend=backend, preset=preset)
 
+    # Bounded so drawing never runs far ahead of the encoder
+    in_flight = deque()
     frame_nmr = -1
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frame_nmr += 1
+                in_flight.append(pool.submit(draw_frame, frame, index.get(frame_nmr), plates, crops))
+                if len(in_flight) >= workers * 2:
+                    out.write(in_flight.popleft().result())
+            while in_flight:
+                out.write(in_flight.popleft().result())
+    finally:
+        cap.release()
+        out.close()
+    print(out.report())
+    return frame_nmr + 1
 
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
-    # read frames
-    ret = True
-    while ret:
-        ret, frame = cap.read()
-        frame_nmr += 1
-        if ret:
-            df_ = results[results['frame_nmr'] == frame_nmr]
-            for row_indx in range(len(df_)):
-                # draw car
-                car_x1, car_y1, car_x2, car_y2 = ast.literal_eval(df_.iloc[row_indx]['car_bbox'].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
-                draw_border(frame, (int(car_x1), int(car_y1)), (int(car_x2), int(car_y2)), (0, 255, 0), 25,
-                            line_length_x=200, line_length_y=200)
-
-                # draw license plate
-                x1, y1, x2, y2 = ast.literal_eval(df_.iloc[row_indx]['license_plate_bbox'].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 12)
-
-                # crop license plate
-                license_crop = license_plate[df_.iloc[row_indx]['car_id']]['license_crop']
-
-                H, W, _ = license_crop.shape
-
-                try:
-                    frame[int(car_y1) - H - 100:int(car_y1) - 100,
-                          int((car_x2 + car_x1 - W) / 2):int((car_x2 + car_x1 + W) / 2), :] = license_crop
-
-                    frame[int(car_y1) - H - 400:int(car_y1) - H - 100,
-                          int((car_x2 + car_x1 - W) / 2):int((car_x2 + car_x1 + W) / 2), :] = (255, 255, 255)
-
-                    (text_width, text_height), _ = cv2.getTextSize(
-                        license_plate[df_.iloc[row_indx]['car_id']]['license_plate_number'],
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        4.3,
-                        17)
-
-                    cv2.putText(frame,
-                                license_plate[df_.iloc[row_indx]['car_id']]['license_plate_number'],
-                                (int((car_x2 + car_x1 - text_width) / 2), int(car_y1 - H - 250 + (text_height / 2))),
-                                cv2.FONT_HERSHEY_SIMPLEX,
-                                4.3,
-                                (0, 0, 0),
-                                17)
-
-                except:
-                    pass
-
-            out.write(frame)
-            frame = cv2.resize(frame, (1280, 720))
-
-            # cv2.imshow('frame', frame)
-            # cv2.waitKey(0)
-
-    out.release()
-    cap.release()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # Parquet (numeric bbox columns) or legacy CSV, see results_io
+    parser.add_argument('--input', default='./test_interpolated.csv')
+    parser.add_argument('--video', default='sample.mp4')
+    parser.add_argument('--output', default='./out.mp4')
+    parser.add_argument('--workers', type=int, default=4, help='Overlay drawing threads')
+    parser.add_argument('--codec', default='mp4v', help='OpenCV fourcc name or ffmpeg encoder (libx264, h264_nvenc, ...)')
+    parser.add_argument('--backend', choices=['opencv', 'ffmpeg'], default='opencv')
+    parser.add_argument('--preset', default='veryfast', help='ffmpeg encoder preset')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    frames = render(results_io.read_results(args.input), args.video, args.output, args.workers,
+                    args.codec, args.backend, args.preset)
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {frames} frames to {args.output} in {elapsed:.1f}s ({frames / max(elapsed, 1e-6):.1f} fps)")
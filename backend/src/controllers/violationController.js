@@ -49,7 +49,9 @@ exports.generateChallan = async (req, res) => {
         const fines = {
             'NO HELMET': 1000,
             'TRIPLE RIDING': 2000,
-            'OVERSPEEDING': 5000
+            'OVERSPEEDING': 5000,
+            'RED LIGHT': 5000,
+            'STOP LINE': 1000
         };
         const amount = fines[violation.violation_type] || 500;
 
@@ -78,6 +78,8 @@ const Admin = () => {
                         <option value="NO HELMET">No Helmet</option>
                         <option value="TRIPLE RIDING">Triple Riding</option>
                         <option value="OVERSPEEDING">Overspeeding</option>
+                        <option value="RED LIGHT">Red Light</option>
+                        <option value="STOP LINE">Stop Line</option>
                     </select>
                 </div>
             </div>
@@ -1,12 +1,36 @@
-from ultralytics import YOLO
-import cv2
-import util
-import numpy as np
+"""
+Batch mode: analyse one video and write it back with overlays (boxes,
+plates, speeds, violations), plus an optional per-frame results file for
+add_missing_data.py / visualize.py.
+
+    python main.py [--video PATH] [--output PATH] [--skip N] [--width PX] [--tiled] [--tracker byte|iou|detector]
+                   [--results PATH]
+                   [--stop-line X1,Y1,X2,Y2 (--signal-source FILE|URL | --signal-lamp X1,Y1,X2,Y2)]
+
+This is a thin front-end over the same pipeline the streaming service runs
+(ai_service/pipeline): same detector backend (MODEL_BACKEND, see
+ai_service/runtime.py), tracking, speed and violation rules and best-shot
+plate OCR. Violations are listed, not sent to the backend. Unlike the
+service, frames are analysed at full resolution unless --width is given.
+"""
+import argparse
 import os
+import sys
+import time
+
+# ai_service goes first so its modules (util, visualize, ...) are the ones imported
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_service'))
+
+import logs  # noqa: E402
+import runtime  # noqa: E402
+from pipeline import (Pipeline, VideoSource, ResizeStage, DetectStage, SpeedStage, RulesStage,  # noqa: E402
+                      SignalStage, PlateStage, ViolationStage, ResultsSink, VideoSink)
+
+log = logs.get_logger("main")
 
 # Configuration
 # Using a specific video found in the system or fallback to sample.mp4
-VIDEO_PATH = './ai_service/uploads/video-1767777024089-171070048.mp4' 
+VIDEO_PATH = './ai_service/uploads/video-1767777024089-171070048.mp4'
 if not os.path.exists(VIDEO_PATH):
     # Fallback search or default
     found_videos = [f for f in os.listdir('.') if f.endswith('.mp4')]
@@ -16,126 +40,66 @@ if not os.path.exists(VIDEO_PATH):
         VIDEO_PATH = 'sample.mp4'
 
 OUTPUT_PATH = 'output_with_number_plate.mp4'
+# Encoding runs on a background thread (see ai_service/video_writer.py).
+# OUTPUT_BACKEND=ffmpeg with e.g. OUTPUT_CODEC=libx264 / h264_nvenc pipes frames to ffmpeg.
+OUTPUT_BACKEND = os.getenv('OUTPUT_BACKEND', 'opencv')
+OUTPUT_CODEC = os.getenv('OUTPUT_CODEC', 'avc1' if OUTPUT_BACKEND == 'opencv' else 'libx264')
+OUTPUT_PRESET = os.getenv('OUTPUT_PRESET', 'veryfast')
 
-# Load Models
-# Using the yolov8n.pt found in ai_service
-model_path = './ai_service/yolov8n.pt'
-if not os.path.exists(model_path):
-    model_path = 'yolov8n.pt' # Fallback
-    
-print(f"Loading vehicle model from {model_path}...")
-coco_model = YOLO(model_path)
-
-# Dictionary to store best license plate per vehicle track ID
-# { track_id: {'text': 'TN38...', 'score': 0.8} }
-vehicle_plates = {}
-vehicle_last_ocr_frame = {}
-
-# Vehicle classes in COCO: 2=car, 3=motorcycle, 5=bus, 7=truck
-VEHICLE_CLASSES = [2, 3, 5, 7]
-
-def process_video():
-    print(f"Processing video: {VIDEO_PATH}")
-    cap = cv2.VideoCapture(VIDEO_PATH)
-    
-    if not cap.isOpened():
-        print("Error: Could not open video.")
-        return
-
-    # Video Writer Setup
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    
-    fourcc = cv2.VideoWriter_fourcc(*'avc1')
-    out = cv2.VideoWriter(OUTPUT_PATH, fourcc, fps, (width, height))
 
-    frame_nmr = -1
-    ret = True
-    
-    while ret:
-        ret, frame = cap.read()
-        if not ret: 
-            break
-            
-        frame_nmr += 1
-        if frame_nmr % 10 == 0:
-            print(f"Processing frame {frame_nmr}...")
+def process_video(video_path=VIDEO_PATH, output_path=OUTPUT_PATH, skip_step=1, tiled=False, results_path=None,
+                  tracker='byte', stop_line=(), signal_source="", signal_lamp=(), width=0):
+    """
+    Runs the pipeline over video_path; returns the violation events.
+    width: analysis frame width in px (0 = full resolution).
+    stop_line / signal_source / signal_lamp: red-light rules, see ai_service/signal_rules.py.
+    """
+    log.info("Processing video: %s", video_path)
+    stages = [ResizeStage(width), DetectStage(runtime.get_detector(), tiled=tiled, tracker=tracker), SpeedStage(),
+              RulesStage(), SignalStage(stop_line, signal_source, signal_lamp), PlateStage(full_resolution=tiled),
+              ViolationStage()]
+    sinks = [VideoSink(output_path, codec=OUTPUT_CODEC, backend=OUTPUT_BACKEND, preset=OUTPUT_PRESET)]
+    if results_path:
+        sinks.append(ResultsSink(results_path))
 
-        # YOLO Tracking
-        # persist=True enables tracking (ID assignment)
-        results = coco_model.track(frame, persist=True, verbose=False)[0]
-        
-        if results.boxes.id is not None:
-            boxes = results.boxes.xyxy.cpu().tolist()
-            track_ids = results.boxes.id.int().cpu().tolist()
-            class_ids = results.boxes.cls.int().cpu().tolist()
-            
-            for box, track_id, class_id in zip(boxes, track_ids, class_ids):
-                if int(class_id) in VEHICLE_CLASSES:
-                    x1, y1, x2, y2 = map(int, box)
-                    
-                    # Draw Vehicle Bounding Box (Blue)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-                    
-                    # Store logic: If we don't have a high confidence plate, try to find one
-                    # Optimization: Skip OCR if we already have a good plate, or run periodically
-                    # For demo, we run frequently but could throttle
-                    
-                    # Optimization: OCR Throttling
-                    if track_id not in vehicle_last_ocr_frame:
-                         vehicle_last_ocr_frame[track_id] = -100 # Force first run
+    start = time.perf_counter()
+    frames = 0
+    events = []
+    for ctx in Pipeline(VideoSource(video_path, skip_step=skip_step), stages, sinks).run():
+        frames += 1
+        events += ctx.events
+        if frames % 10 == 0:
+            log.info("Processed frame %s", ctx.index)
+    elapsed = time.perf_counter() - start
+    log.info("Video processing complete: %s frames in %.1fs (%.1f fps). Saved to %s",
+             frames, elapsed, frames / max(elapsed, 1e-6), output_path)
+    for event in events:
+        log.info("%s: track %s, plate %s, %s km/h", event['type'], event['id'], event['plate'] or '-', event['speed'])
+    return events
 
-                    # Run OCR only if:
-                    # 1. We don't have a plate yet
-                    # 2. OR confidence is low AND we haven't run it recently (every 5 frames)
-                    should_run_ocr = False
-                    if track_id not in vehicle_plates:
-                        if frame_nmr - vehicle_last_ocr_frame[track_id] > 5:
-                            should_run_ocr = True
-                    elif vehicle_plates[track_id]['score'] < 0.8:
-                        if frame_nmr - vehicle_last_ocr_frame[track_id] > 5:
-                            should_run_ocr = True
-                    
-                    if should_run_ocr:
-                        # Crop vehicle
-                        vehicle_crop = frame[max(0, y1):min(height, y2), max(0, x1):min(width, x2)]
-                        
-                        # Pre-process for OCR (convert to gray, etc. handled in util usually, but let's be explicitly helpful)
-                        # util.read_license_plate expects a crop of the PLATE.
-                        # Since we don't have a plate detector, we pass the vehicle crop. 
-                        # This is a best-effort. EasyOCR might struggle with the whole car but we'll try.
-                        # Ideally we would use a plate detector + util.read_license_plate(plate_crop).
-                        
-                        plate_text, plate_score = util.read_license_plate(vehicle_crop)
-                        
-                        # Update timestamp regardless of result (to throttle failed attempts too)
-                        vehicle_last_ocr_frame[track_id] = frame_nmr
 
-                        if plate_text is not None and plate_score is not None:
-                            # Update if better score
-                            current_score = vehicle_plates.get(track_id, {'score': 0})['score']
-                            if plate_score > current_score:
-                                vehicle_plates[track_id] = {'text': plate_text, 'score': plate_score}
-                    
-                    # Display Plate Text (Green)
-                    if track_id in vehicle_plates:
-                        text = vehicle_plates[track_id]['text']
-                        # Dynamic font scale based on frame width
-                        font_scale = width / 1000.0 * 1.5 
-                        thickness = int(width / 500.0)
-                        
-                        (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-                        
-                        # Background for text
-                        cv2.rectangle(frame, (x1, y1 - text_h - 10), (x1 + text_w, y1), (0, 0, 0), -1)
-                        cv2.putText(frame, text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 255, 0), thickness)
+def fractions(text):
+    values = [float(v) for v in text.split(',')]
+    if len(values) != 4 or not all(0 <= v <= 1 for v in values):
+        raise argparse.ArgumentTypeError("expected x1,y1,x2,y2 with values in [0, 1]")
+    return values
 
-        out.write(frame)
-        
-    cap.release()
-    out.release()
-    print(f"Video processing complete. Saved to {OUTPUT_PATH}")
 
 if __name__ == '__main__':
-    process_video()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Detect vehicles, plates and violations in a video file.')
+    parser.add_argument('--video', default=VIDEO_PATH)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--skip', type=int, default=1, help='Analyse every N-th frame (the output keeps only those)')
+    parser.add_argument('--width', type=int, default=0,
+                        help='Analysis width in px (default 0: full resolution; the service uses 640)')
+    parser.add_argument('--tiled', action='store_true', help='Tiled full-resolution detection (see ai_service/tiling.py)')
+    parser.add_argument('--tracker', choices=['byte', 'iou', 'detector'], default='byte',
+                        help='Tracker (see ai_service/tracker.py); detector uses the backend\'s own tracking')
+    parser.add_argument('--results', help='Also write per-frame results to this .parquet file (see ai_service/results_io.py)')
+    parser.add_argument('--stop-line', type=fractions, default=(),
+                        help='Stop line x1,y1,x2,y2 as fractions of the frame (see ai_service/signal_rules.py)')
+    parser.add_argument('--signal-source', default="", help='Signal timeline JSON file or http(s) URL')
+    parser.add_argument('--signal-lamp', type=fractions, default=(), help='Signal lamp ROI x1,y1,x2,y2 (fractions)')
+    args = parser.parse_args()
+    process_video(args.video, args.output, args.skip, args.tiled, args.results, args.tracker,
+                  args.stop_line, args.signal_source, args.signal_lamp, args.width)